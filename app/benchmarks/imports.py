@@ -0,0 +1,96 @@
+"""Profile how long the app takes to import.
+
+Run from the app directory with `python -m benchmarks.imports` (or
+`make profile-imports`) to import `main:app` in a fresh interpreter with
+`-X importtime` and list the modules which took longest, including
+everything they imported in turn. Pass another `module:attr` to profile
+something else, and `--top` to change how many modules are listed.
+
+Every worker pays this before serving its first request, so route modules
+should import anything slow (paramiko, Celery, LDAP, MySQL, most of ocflib)
+inside the functions which need it.
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+from typing import List, NamedTuple
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_IMPORT_TIME = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)$")
+
+
+class ImportTime(NamedTuple):
+    module: str
+    # seconds spent importing the module itself, and including its imports
+    self: float
+    cumulative: float
+    # how deeply nested the import was, 0 being imported by the target itself
+    depth: int
+
+
+def import_times(target: str = "main:app") -> List[ImportTime]:
+    """Import `target` in a fresh interpreter, returning how long each module took.
+
+    Modules are listed in the order they finished importing, so `target`'s
+    module is last.
+    """
+    module, _, attr = target.partition(":")
+    statement = f"from {module} import {attr}" if attr else f"import {module}"
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        cwd=APP_DIR,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+        check=False,
+    )
+
+    times = []
+    errors = []
+    for line in result.stderr.splitlines():
+        match = _IMPORT_TIME.match(line)
+        if match is None:
+            errors.append(line)
+            continue
+        self_us, cumulative_us, indent, name = match.groups()
+        times.append(
+            ImportTime(
+                name, int(self_us) / 1e6, int(cumulative_us) / 1e6, len(indent) // 2
+            )
+        )
+
+    if result.returncode != 0:
+        raise RuntimeError(f"Unable to import {target}:\n" + "\n".join(errors))
+    return times
+
+
+def cold_import_time(target: str = "main:app") -> float:
+    """Return how many seconds importing `target` takes in a fresh interpreter."""
+    module = target.partition(":")[0]
+    return next(t.cumulative for t in import_times(target) if t.module == module)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("target", nargs="?", default="main:app")
+    parser.add_argument("--top", type=int, default=30)
+    args = parser.parse_args()
+
+    times = import_times(args.target)
+    module = args.target.partition(":")[0]
+    total = next(t.cumulative for t in times if t.module == module)
+
+    print(f"{'cumulative':>12}{'self':>10}  module")
+    for t in sorted(times, key=lambda t: t.cumulative, reverse=True)[: args.top]:
+        print(
+            f"{t.cumulative * 1e3:9.1f} ms{t.self * 1e3:7.1f} ms  "
+            f"{'  ' * t.depth}{t.module}"
+        )
+    print(f"\n{len(times)} modules imported, {module} took {total * 1e3:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
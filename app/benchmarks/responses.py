@@ -0,0 +1,115 @@
+"""Benchmark the ways a route's output can be turned into a response body.
+
+Run from the app directory with `python -m benchmarks.responses` (or
+`make bench`). The payload is shaped like /staff_hours and /lab/staff
+output: a list of entries with nested lists of models and datetimes.
+"""
+import asyncio
+import timeit
+from datetime import datetime, timedelta
+from typing import Any, Callable, List, Optional
+
+from fastapi.responses import JSONResponse, ORJSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+from pydantic import BaseModel
+
+from utils.responses import TrustedJSONResponse
+
+
+class Staff(BaseModel):
+    user_name: str
+    real_name: str
+    position: str
+
+
+class Session(BaseModel):
+    user: str
+    host: str
+    start: datetime
+    end: Optional[datetime]
+
+
+class Entry(BaseModel):
+    day: str
+    time: str
+    cancelled: bool
+    staff: List[Staff]
+    sessions: List[Session]
+
+
+class Output(BaseModel):
+    entries: List[Entry]
+
+
+def make_content(entries: int) -> Any:
+    start = datetime(2023, 10, 1, 12, 0)
+    return {
+        "entries": [
+            {
+                "day": "Monday",
+                "time": "12:00-13:00",
+                "cancelled": False,
+                "staff": [
+                    {
+                        "user_name": f"staff{i}",
+                        "real_name": f"Staff Member {i}",
+                        "position": "Staff",
+                    }
+                    for i in range(5)
+                ],
+                "sessions": [
+                    {
+                        "user": f"user{i}",
+                        "host": f"desktop{i}.ocf.berkeley.edu",
+                        "start": start + timedelta(minutes=i),
+                        "end": None,
+                    }
+                    for i in range(5)
+                ],
+            }
+            for _ in range(entries)
+        ]
+    }
+
+
+def validated(response_class: Any, content: Any) -> bytes:
+    """What FastAPI does for a route with a response_model."""
+    field = create_response_field(name="response", type_=Output)
+    encoded = asyncio.run(serialize_response(field=field, response_content=content))
+    return response_class(encoded).body
+
+
+def bench(name: str, fn: Callable[[], bytes], baseline: Optional[float]) -> float:
+    number, total = timeit.Timer(fn).autorange()
+    per_call = total / number
+    speedup = f"{baseline / per_call:5.1f}x" if baseline else "     -"
+    print(f"{name:<32}{per_call * 1e6:10.1f} us {speedup}")
+    return per_call
+
+
+def main() -> None:
+    for entries in (10, 100, 1000):
+        content = make_content(entries)
+        assert validated(JSONResponse, content) == TrustedJSONResponse(content).body
+
+        print(f"{entries} entries:")
+        baseline = bench(
+            "  validate + JSONResponse",
+            lambda: validated(JSONResponse, content),
+            None,
+        )
+        bench(
+            "  validate + ORJSONResponse",
+            lambda: validated(ORJSONResponse, content),
+            baseline,
+        )
+        bench(
+            "  TrustedJSONResponse",
+            lambda: TrustedJSONResponse(content).body,
+            baseline,
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""Benchmark serializing account task messages and results.
+
+Run from the app directory with `python -m benchmarks.task_serialization`.
+This compares pickle (what the Celery workers accept by default) with our
+msgpack serializer from utils/celery.py. It encodes the messages and results
+that registration and password resets actually send, through kombu, the way
+Celery does.
+"""
+import os
+import timeit
+import uuid
+from typing import Any, Callable, Dict, Optional
+
+from kombu.serialization import dumps, loads
+
+from ocflib.account.creation import NewAccountRequest
+from ocflib.account.submission import NewAccountResponse
+
+from utils.celery import SERIALIZER, register_serializer
+
+# Celery's protocol 2 message body is (args, kwargs, embed)
+_EMBED = {"callbacks": None, "errbacks": None, "chain": None, "chord": None}
+
+
+def make_payloads() -> Dict[str, Any]:
+    request = NewAccountRequest(
+        user_name="exampleuser",
+        real_name="Example User",
+        is_group=False,
+        calnet_uid=1234567,
+        callink_oid=None,
+        email="example@berkeley.edu",
+        # what a password encrypted with a 2048-bit RSA key looks like
+        encrypted_password=os.urandom(256),
+        handle_warnings=NewAccountRequest.WARNINGS_WARN,
+    )
+
+    def result(value: Any, status: Optional[str] = "SUCCESS") -> Dict[str, Any]:
+        return {
+            "status": status,
+            "result": value,
+            "traceback": None,
+            "children": [],
+            "date_done": "2023-10-01T12:00:00.000000",
+            "task_id": str(uuid.uuid4()),
+        }
+
+    return {
+        "validate_then_create_account": ((request,), {}, _EMBED),
+        "change_password": (
+            ("exampleuser", "correct horse battery staple"),
+            {"comment": "Your password was reset online by Example User."},
+            _EMBED,
+        ),
+        "progress result": result(
+            {"status": ["Validating request", "Validated request"]}, None
+        ),
+        "flagged result": result(
+            NewAccountResponse(
+                status=NewAccountResponse.FLAGGED,
+                errors=["Username is similar to an existing account"],
+            )
+        ),
+        "created result": result(
+            NewAccountResponse(status=NewAccountResponse.CREATED, errors=[])
+        ),
+    }
+
+
+def bench(name: str, fn: Callable[[], Any], baseline: Optional[float]) -> float:
+    number, total = timeit.Timer(fn).autorange()
+    per_call = total / number
+    speedup = f"{baseline / per_call:5.1f}x" if baseline else "     -"
+    print(f"{name:<32}{per_call * 1e6:10.1f} us {speedup}")
+    return per_call
+
+
+def main() -> None:
+    register_serializer()
+
+    for name, payload in make_payloads().items():
+        print(f"{name}:")
+        baseline: Dict[str, float] = {}
+        for serializer in ("pickle", SERIALIZER):
+            content_type, encoding, body = dumps(payload, serializer=serializer)
+            decoded = loads(body, content_type, encoding, accept={content_type})
+            assert serializer == "pickle" or _same(decoded, payload)
+
+            smaller = f"{baseline['size'] / len(body):5.1f}x" if baseline else "     -"
+            print(f"  {serializer + ' size':<30}{len(body):7} bytes {smaller}")
+            result = {
+                "size": len(body),
+                "encode": bench(
+                    f"  {serializer} encode",
+                    lambda: dumps(payload, serializer=serializer),
+                    baseline.get("encode"),
+                ),
+                "decode": bench(
+                    f"  {serializer} decode",
+                    lambda: loads(body, content_type, encoding, accept={content_type}),
+                    baseline.get("decode"),
+                ),
+            }
+            baseline = baseline or result
+
+
+def _same(decoded: Any, original: Any) -> bool:
+    """Whether `decoded` is `original`, allowing for tuples becoming lists."""
+    if isinstance(original, tuple) and not hasattr(original, "_fields"):
+        original = list(original)
+    if isinstance(original, list):
+        return isinstance(decoded, list) and all(
+            _same(d, o) for d, o in zip(decoded, original)
+        )
+    if isinstance(original, dict):
+        return decoded.keys() == original.keys() and all(
+            _same(decoded[key], value) for key, value in original.items()
+        )
+    return type(decoded) is type(original) and decoded == original
+
+
+if __name__ == "__main__":
+    main()
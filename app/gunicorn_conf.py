@@ -0,0 +1,26 @@
+"""Gunicorn configuration used by the tiangolo/uvicorn-gunicorn base image.
+
+We keep the base image's defaults (worker count from MAX_WORKERS, bind
+address, etc.) and add the hooks prometheus_client needs to aggregate
+metrics across workers.
+"""
+import os
+import runpy
+import shutil
+
+from prometheus_client import multiprocess
+
+globals().update(runpy.run_path("/gunicorn_conf.py"))
+
+
+def on_starting(server):
+    # clear out metrics left over from a previous run
+    path = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if path:
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path, exist_ok=True)
+
+
+def child_exit(server, worker):
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        multiprocess.mark_process_dead(worker.pid)
@@ -1,8 +1,19 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 
 from routes import router
 from utils.config import get_settings
+from utils.executors import shutdown_executors
+from utils.metrics import MetricsMiddleware
+from utils.mysql import close_pools
+from utils.responses import ConditionalGetMiddleware
+from utils.scheduler import (
+    start_periodic_refresher,
+    start_write_behind_flusher,
+    stop_periodic_refresher,
+    stop_write_behind_flusher,
+)
 
 settings = get_settings()
 
@@ -10,6 +21,7 @@ app = FastAPI(
     title="OCF API",
     description="[https://github.com/ocf/api](https://github.com/ocf/api)",
     version=settings.version,
+    default_response_class=ORJSONResponse,
     license_info={
         "name": "GNU GPLv3 and Apache 2.0",
         "url": "https://github.com/ocf/api/blob/master/LICENSE",
@@ -33,6 +45,23 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(ConditionalGetMiddleware)
+app.add_middleware(MetricsMiddleware)
+
+
+@app.on_event("startup")
+async def startup():
+    if settings.periodic_refresh:
+        start_periodic_refresher()
+    start_write_behind_flusher()
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    await stop_periodic_refresher()
+    await stop_write_behind_flusher()
+    shutdown_executors()
+    close_pools()
 
 
 @app.get("/", tags=["misc"])
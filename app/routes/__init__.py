@@ -10,6 +10,10 @@ router = APIRouter()
 path = os.path.dirname(__file__)
 
 
+# every route module is imported when the app starts, so anything slow to import
+# that only some routes need (paramiko, Celery, LDAP, MySQL, most of ocflib)
+# should be imported inside those routes instead. `python -m benchmarks.imports`
+# shows what startup is spending its time on.
 def import_all_in_dir(path, pkg=__package__):
     for entry in os.scandir(path):
         if entry.is_dir():
@@ -1,6 +1,3 @@
-from paramiko import AuthenticationException, SSHClient
-from paramiko.hostkeys import HostKeyEntry
-
 from fastapi import Depends, HTTPException, status
 from pydantic import BaseModel, Field
 
@@ -27,6 +24,9 @@ class RunCommandOutput(BaseModel):
 
 @router.post("/account/command", tags=["account"], response_model=RunCommandOutput)
 def run_command(data: RunCommandInput, _=Depends(get_current_user)):
+    from paramiko import AuthenticationException, SSHClient
+    from paramiko.hostkeys import HostKeyEntry
+
     ssh = SSHClient()
 
     host_keys = ssh.get_host_keys()
@@ -1,26 +1,26 @@
 import csv
 import io
 import re
-from contextlib import contextmanager
-from typing import Any, Collection, Dict, Generator, List, Optional, Tuple
+from typing import (
+    Any,
+    Collection,
+    ContextManager,
+    Dict,
+    Generator,
+    List,
+    Optional,
+    Tuple,
+)
 
 from typing_extensions import Literal
 
-from ocflib.account.validators import validate_password
-from ocflib.vhost.mail import (
-    MailForwardingAddress,
-    crypt_password,
-    get_connection,
-    vhosts_for_user,
-)
-
 from fastapi import Depends, File, HTTPException, Response, status
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 
 from routes import router
 from utils.auth import UserToken
-from utils.config import get_settings
+from utils.mysql import OCFMAIL, get_pool
 from utils.user import get_current_group_user
 
 
@@ -44,6 +44,8 @@ class VHostMailOutput(BaseModel):
 
 @router.get("/account/hosting/mail", tags=["account"], response_model=VHostMailOutput)
 def get_vhost_mail(user_token: UserToken = Depends(get_current_group_user)):
+    from ocflib.vhost.mail import vhosts_for_user
+
     user = user_token.username
     vhosts = []
 
@@ -75,6 +77,8 @@ class VHostMailUpdateInput(BaseModel):
 def vhost_mail_update(
     data: VHostMailUpdateInput, user_token: UserToken = Depends(get_current_group_user)
 ):
+    from ocflib.vhost.mail import MailForwardingAddress
+
     user = user_token.username
 
     # _get_addr may return None, but never with this particular call
@@ -187,6 +191,8 @@ def vhost_mail_csv_import(
     csv_file: bytes = File(None, media_type="text/csv"),
     user_token: UserToken = Depends(get_current_group_user),
 ):
+    from ocflib.vhost.mail import MailForwardingAddress
+
     user = user_token.username
     domain = data.domain
     vhost = _get_vhost(user, domain)
@@ -376,6 +382,9 @@ def _get_forward_to(forward_to: Optional[str]) -> Optional[Collection[Any]]:
 
 
 def _get_password(password: Optional[str], addr_name: Optional[str]) -> Any:
+    from ocflib.account.validators import validate_password
+    from ocflib.vhost.mail import crypt_password
+
     # If addr_name is None, then this is a wildcard address, and those can't
     # have passwords.
     if addr_name is None:
@@ -397,6 +406,8 @@ def _get_password(password: Optional[str], addr_name: Optional[str]) -> Any:
 
 
 def _get_vhost(user: str, domain: str) -> Any:
+    from ocflib.vhost.mail import vhosts_for_user
+
     vhosts = vhosts_for_user(user)
     for vhost in vhosts:
         if vhost.domain == domain:
@@ -409,22 +420,5 @@ def _find_addr(c: Any, vhost: Any, addr: str) -> Any:
             return addr_obj
 
 
-settings = get_settings()
-
-
-@contextmanager
-def _txn(**kwargs: Any) -> Generator[Any, None, None]:
-    with get_connection(
-        user=settings.ocfmail_user,
-        password=settings.ocfmail_password,
-        db=settings.ocfmail_db,
-        autocommit=False,
-        **kwargs,
-    ).cursor() as c:
-        try:
-            yield c
-        except Exception:
-            c.connection.rollback()
-            raise
-        else:
-            c.connection.commit()
+def _txn() -> ContextManager[Any]:
+    return get_pool(OCFMAIL).transaction()
@@ -3,12 +3,6 @@ import socket
 from textwrap import dedent
 from typing import Optional
 
-from ocflib.account.search import user_attrs
-from ocflib.misc.mail import send_mail
-from ocflib.misc.validators import host_exists, valid_email
-from ocflib.misc.whoami import current_user_formatted_email
-from ocflib.vhost.web import eligible_for_vhost, has_vhost
-
 from fastapi import Depends, HTTPException, Request, Response, status
 from pydantic import BaseModel, Field
 
@@ -43,6 +37,12 @@ def request_vhost(
     request: Request,
     user_token: UserToken = Depends(get_current_user),
 ):
+    from ocflib.account.search import user_attrs
+    from ocflib.misc.mail import send_mail
+    from ocflib.misc.validators import host_exists, valid_email
+    from ocflib.misc.whoami import current_user_formatted_email
+    from ocflib.vhost.web import eligible_for_vhost, has_vhost
+
     user = user_token.username
 
     if has_vhost(user):
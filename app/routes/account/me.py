@@ -2,14 +2,14 @@ from typing import List
 
 from typing_extensions import Literal
 
-from ocflib.account.search import user_is_group
-
 from fastapi import Depends
 from pydantic import BaseModel
 
 from routes import router
 from utils.auth import UserToken
-from utils.user import get_current_user
+from utils.executors import LDAP, run_in_backend
+from utils.responses import TrustedJSONResponse
+from utils.user import get_current_user, is_group_account
 
 
 class AccountInfoOutput(BaseModel):
@@ -22,11 +22,14 @@ class AccountInfoOutput(BaseModel):
 
 @router.get("/account/me", tags=["account"], response_model=AccountInfoOutput)
 async def get_account_info(current_user: UserToken = Depends(get_current_user)):
-    account_type = "group" if user_is_group(current_user.username) else "personal"
-    return {
-        "username": current_user.username,
-        "email": current_user.email,
-        "name": current_user.name,
-        "type": account_type,
-        "groups": current_user.groups,
-    }
+    is_group = await run_in_backend(LDAP, is_group_account, current_user.username)
+    account_type = "group" if is_group else "personal"
+    return TrustedJSONResponse(
+        {
+            "username": current_user.username,
+            "email": current_user.email,
+            "name": current_user.name,
+            "type": account_type,
+            "groups": current_user.groups,
+        }
+    )
@@ -1,26 +1,33 @@
 import logging
 from datetime import datetime
-from functools import partial
-
-from ocflib.printing.quota import Refund, add_refund, get_connection, get_quota
+from typing import TYPE_CHECKING
 
 from fastapi import Depends, HTTPException, Response, status
 from pydantic import BaseModel
 
 from routes import router
 from utils.auth import UserToken
-from utils.config import get_settings
 from utils.constants import OCFSTAFF_GROUP
+from utils.executors import MYSQL, run_in_backend
+from utils.mysql import OCFPRINTING, get_pool
 from utils.user import depends_get_current_user_with_group, get_current_user
 
-settings = get_settings()
+if TYPE_CHECKING:
+    from ocflib.printing.quota import Refund
+
+
+def _get_quota(username: str):
+    from ocflib.printing.quota import get_quota
+
+    with get_pool(OCFPRINTING).cursor() as c:
+        return get_quota(c, username)
 
-get_connection = partial(
-    get_connection,
-    user=settings.ocfprinting_user,
-    password=settings.ocfprinting_password,
-    db=settings.ocfprinting_db,
-)
+
+def _add_refund(refund: "Refund") -> None:
+    from ocflib.printing.quota import add_refund
+
+    with get_pool(OCFPRINTING).cursor() as c:
+        add_refund(c, refund)
 
 
 class PaperQuotaOutput(BaseModel):
@@ -32,13 +39,12 @@ class PaperQuotaOutput(BaseModel):
 @router.get("/account/quota/paper", tags=["account"], response_model=PaperQuotaOutput)
 async def get_paper_quota(current_user: UserToken = Depends(get_current_user)):
     try:
-        with get_connection().cursor() as c:
-            quota = get_quota(c, current_user.username)
-            return {
-                "user": quota.user,
-                "daily": quota.daily,
-                "semesterly": quota.semesterly,
-            }
+        quota = await run_in_backend(MYSQL, _get_quota, current_user.username)
+        return {
+            "user": quota.user,
+            "daily": quota.daily,
+            "semesterly": quota.semesterly,
+        }
 
     except (KeyError, ValueError) as e:
         logging.error(e)
@@ -66,19 +72,21 @@ async def add_paper_refund(
         depends_get_current_user_with_group(OCFSTAFF_GROUP)
     ),
 ):
+    from ocflib.printing.quota import Refund
+
     try:
-        with get_connection().cursor() as c:
-            add_refund(
-                c,
-                Refund(
-                    user=refund.username,
-                    time=datetime.now(),
-                    pages=refund.pages,
-                    staffer=current_user.username,
-                    reason=refund.reason,
-                ),
-            )
-            return Response(status_code=status.HTTP_204_NO_CONTENT)
+        await run_in_backend(
+            MYSQL,
+            _add_refund,
+            Refund(
+                user=refund.username,
+                time=datetime.now(),
+                pages=refund.pages,
+                staffer=current_user.username,
+                reason=refund.reason,
+            ),
+        )
+        return Response(status_code=status.HTTP_204_NO_CONTENT)
 
     except (KeyError, ValueError) as e:
         logging.error(e)
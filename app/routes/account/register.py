@@ -1,29 +1,26 @@
-from typing import List, Optional
-
-from Crypto.PublicKey import RSA
-
-import ocflib.ucb.directory as directory
-from ocflib.account import search
-from ocflib.account.creation import (
-    CREATE_PUBLIC_KEY,
-    NewAccountRequest,
-    encrypt_password,
-    valid_email,
-    validate_password,
-    validate_username,
-)
-from ocflib.account.search import user_attrs_ucb
-from ocflib.account.submission import NewAccountResponse
-from ocflib.ucb.groups import group_by_oid, groups_by_student_signat
+import asyncio
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 
 from fastapi import Depends, HTTPException, status
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel, Field
 
 from routes import router
 from utils.calnet import get_calnet_uid
-from utils.celery import celery_app, validate_then_create_account
+from utils.celery import get_celery_app, get_tasks, watch_task
+from utils.config import get_settings
 from utils.constants import TEST_GROUP_ACCOUNTS, TESTER_CALNET_UIDS
+from utils.executors import (
+    CELERY,
+    HTTP,
+    LDAP,
+    gather_with_deadline,
+    result_or_raise,
+    run_in_backend,
+)
+from utils.responses import dumps
+
+_UNKNOWN_FAILURE_MESSAGE = "Account was unable to be created for unknown reasons"
 
 
 class RegisterAccountInput(BaseModel):
@@ -56,19 +53,46 @@ async def register_account(
     data: RegisterAccountInput,
     calnet_uid=Depends(get_calnet_uid),
 ):
-    existing_accounts = search.users_by_calnet_uid(calnet_uid)
-    groups_for_user = groups_by_student_signat(calnet_uid)
+    """Submit a request for a new account.
+
+    This returns as soon as the request has been queued; follow its progress
+    with the returned task_id at /account/register/status/stream (or by
+    polling /account/register/status).
+    """
+    # account creation pulls in most of ocflib, so only import it when needed
+    from Crypto.PublicKey import RSA
+
+    import ocflib.ucb.directory as directory
+    from ocflib.account import search
+    from ocflib.account.creation import (
+        CREATE_PUBLIC_KEY,
+        NewAccountRequest,
+        encrypt_password,
+        valid_email,
+        validate_password,
+        validate_username,
+    )
+    from ocflib.account.search import user_attrs_ucb
+
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + get_settings().directory_lookup_timeout
+    existing_accounts, groups_for_user = await gather_with_deadline(
+        run_in_backend(LDAP, search.users_by_calnet_uid, calnet_uid),
+        _get_groups_with_data(calnet_uid),
+        timeout=deadline - loop.time(),
+    )
+    existing_accounts = result_or_raise(existing_accounts)
+    groups_for_user = result_or_raise(groups_for_user)
 
     eligible_new_group_accounts, existing_group_accounts = {}, {}
-    for group_oid in groups_for_user:
-        group_data = group_by_oid(group_oid)
+    for group_oid, (signatory_group, group_data) in groups_for_user.items():
         group_accounts = group_data["accounts"] if group_data is not None else None
         if not group_accounts or group_oid in [
             group[0] for group in TEST_GROUP_ACCOUNTS
         ]:
-            eligible_new_group_accounts[group_oid] = groups_for_user[group_oid]
+            eligible_new_group_accounts[group_oid] = signatory_group
         else:
-            existing_group_accounts[group_oid] = groups_for_user[group_oid]
+            existing_group_accounts[group_oid] = signatory_group
 
     if (
         existing_accounts
@@ -84,9 +108,17 @@ async def register_account(
             },
         )
 
+    # the rest of the lookups are only needed by those who can register, so
+    # don't make them until we know that
+    ucb_attrs, real_name = await gather_with_deadline(
+        run_in_backend(LDAP, user_attrs_ucb, calnet_uid),
+        run_in_backend(LDAP, directory.name_by_calnet_uid, calnet_uid),
+        timeout=deadline - loop.time(),
+    )
+
     # ensure we can even find them in university LDAP
     # (alumni etc. might not be readable in LDAP but can still auth via CalNet)
-    if not user_attrs_ucb(calnet_uid):
+    if not result_or_raise(ucb_attrs):
         raise HTTPException(
             status.HTTP_500_INTERNAL_SERVER_ERROR, "Unable to read account information"
         )
@@ -97,7 +129,7 @@ async def register_account(
     if not validate_password(data.username, data.password):
         raise HTTPException(status.HTTP_400_BAD_REQUEST, "Invalid password")
 
-    real_name = directory.name_by_calnet_uid(calnet_uid)
+    real_name = result_or_raise(real_name)
 
     association_choices = []
     if not existing_accounts or calnet_uid in TESTER_CALNET_UIDS:
@@ -107,7 +139,9 @@ async def register_account(
 
     is_group_account = data.account_association != calnet_uid
     if is_group_account:
-        if not validate_username(
+        if not await run_in_backend(
+            LDAP,
+            validate_username,
             data.username,
             eligible_new_group_accounts[data.account_association]["name"],
         ):
@@ -126,7 +160,7 @@ async def register_account(
             handle_warnings=NewAccountRequest.WARNINGS_WARN,
         )
     else:
-        if not validate_username(data.username, real_name):
+        if not await run_in_backend(LDAP, validate_username, data.username, real_name):
             raise HTTPException(status.HTTP_400_BAD_REQUEST, "Invalid username")
         req = NewAccountRequest(
             user_name=data.username,
@@ -142,61 +176,152 @@ async def register_account(
             handle_warnings=NewAccountRequest.WARNINGS_WARN,
         )
 
-    task = validate_then_create_account.delay(req)
-    task.wait(timeout=5)
+    task = await run_in_backend(
+        CELERY, get_tasks().validate_then_create_account.delay, req
+    )
+    return {"status": "submitted", "task_id": task.id}
 
-    if isinstance(task.result, NewAccountResponse):
-        if task.result.status == NewAccountResponse.REJECTED:
-            raise HTTPException(status.HTTP_400_BAD_REQUEST, task.result.errors)
-        elif task.result.status == NewAccountResponse.FLAGGED:
-            raise HTTPException(status.HTTP_400_BAD_REQUEST, task.result.errors)
-        elif task.result.status == NewAccountResponse.PENDING:
-            return {"status": "pending", "task_id": task.result}
-        else:
-            raise AssertionError("Unexpected state reached")
-    else:
-        # validation was successful, the account is being created now
-        return {"status": "success", "task_id": task.result}
+
+async def _get_groups_with_data(calnet_uid: int) -> Dict[Any, Tuple[Any, Any]]:
+    """Return the groups a user is a signatory of, and CalLink's data on each.
+
+    Looking the groups up one at a time would take a round trip to CalLink
+    per group, so this looks them all up at once.
+    """
+    from ocflib.ucb.groups import group_by_oid, groups_by_student_signat
+
+    groups = await run_in_backend(HTTP, groups_by_student_signat, calnet_uid)
+    group_data = await asyncio.gather(
+        *(run_in_backend(HTTP, group_by_oid, group_oid) for group_oid in groups),
+        return_exceptions=True,
+    )
+    return {
+        group_oid: (group, result_or_raise(data))
+        for (group_oid, group), data in zip(groups.items(), group_data)
+    }
 
 
 class RegisterAccountStatusOutput(BaseModel):
     state: str
     status: Optional[List[str]]
     message: Optional[str]
+    errors: Optional[List[str]]
 
 
-@router.get(
-    "/account/register/status",
-    tags=["account"],
-    response_model=RegisterAccountStatusOutput,
-)
-def register_account_status(task_id: str):
-    task = celery_app.AsyncResult(task_id)
-    if not task.ready():
-        meta = task.info
+def _registration_status(state: Any, result: Any) -> Optional[Dict[str, Any]]:
+    """Describe a registration task given its Celery state and result.
+
+    Returns None if the task finished in a way we don't understand.
+    """
+    from celery import states
+
+    from ocflib.account.submission import NewAccountResponse
+
+    if state not in states.READY_STATES:
         status_steps = ["Starting creation"]
-        if isinstance(meta, dict) and "status" in meta:
-            status_steps.extend(meta["status"])
+        if isinstance(result, dict) and "status" in result:
+            status_steps.extend(result["status"])
         return {"state": "pending", "status": status_steps}
-    elif isinstance(task.result, NewAccountResponse):
-        if task.result.status == NewAccountResponse.CREATED:
+    elif isinstance(result, NewAccountResponse):
+        if result.status == NewAccountResponse.CREATED:
             return {"state": "success"}
-        elif task.result.status == NewAccountResponse.PENDING:
+        elif result.status == NewAccountResponse.PENDING:
             return {"state": "pending", "message": "requires staff approval"}
-        elif task.result.status == NewAccountResponse.FLAGGED:
+        elif result.status == NewAccountResponse.FLAGGED:
             return {
                 "state": "flagged",
                 "message": "there were some warnings when creating your account",
+                "errors": result.errors,
             }
-        elif task.result.status == NewAccountResponse.REJECTED:
+        elif result.status == NewAccountResponse.REJECTED:
             return {
                 "state": "rejected",
                 "message": "account not created due to fatal error",
+                "errors": result.errors,
             }
-    elif isinstance(task.result, Exception):
-        return {"state": "unknown", "message": task.result}
+    elif isinstance(result, Exception):
+        return {"state": "unknown", "message": str(result)}
 
-    raise HTTPException(
-        status.HTTP_500_INTERNAL_SERVER_ERROR,
-        "Account was unable to be created for unknown reasons",
+    return None
+
+
+def _is_handed_over(state: Any, result: Any) -> bool:
+    """Whether validation passed and started a create_account task.
+
+    validate_then_create_account returns that task's id as its result, so it's
+    that task which has the rest of the registration's progress.
+    """
+    from celery import states
+
+    return state == states.SUCCESS and isinstance(result, str)
+
+
+@router.get(
+    "/account/register/status",
+    tags=["account"],
+    response_model=RegisterAccountStatusOutput,
+)
+def register_account_status(task_id: str):
+    task = get_celery_app().AsyncResult(task_id)
+    if _is_handed_over(task.state, task.info):
+        task = get_celery_app().AsyncResult(task.info)
+
+    registration_status = _registration_status(task.state, task.info)
+    if registration_status is None:
+        raise HTTPException(
+            status.HTTP_500_INTERNAL_SERVER_ERROR, _UNKNOWN_FAILURE_MESSAGE
+        )
+    return registration_status
+
+
+@router.get(
+    "/account/register/status/stream",
+    tags=["account"],
+    response_class=StreamingResponse,
+    responses={
+        status.HTTP_200_OK: {
+            "content": {"text/event-stream": {}},
+            "description": "Server-sent events, each with the same JSON "
+            "/account/register/status returns",
+        }
+    },
+)
+async def register_account_status_stream(task_id: str):
+    """Stream a registration's status as it changes.
+
+    An event is sent straight away, then whenever the status changes, until
+    registration succeeds or fails (or `register_status_stream_timeout`
+    passes, in which case clients should reconnect).
+    """
+    return StreamingResponse(
+        _registration_status_events(task_id),
+        media_type="text/event-stream",
+        # don't let proxies buffer events
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
+
+
+async def _registration_status_events(task_id: str) -> AsyncIterator[bytes]:
+    timeout = get_settings().register_status_stream_timeout
+    last_status = None
+    while True:
+        updates = watch_task(task_id, timeout)
+        try:
+            async for state, result in updates:
+                if _is_handed_over(state, result):
+                    break
+
+                registration_status = _registration_status(state, result) or {
+                    "state": "unknown",
+                    "message": _UNKNOWN_FAILURE_MESSAGE,
+                }
+                if registration_status != last_status:
+                    last_status = registration_status
+                    yield b"data: " + dumps(registration_status) + b"\n\n"
+            else:
+                return
+        finally:
+            # unsubscribe now, rather than whenever the generator is collected
+            await updates.aclose()
+
+        task_id = result
@@ -2,17 +2,22 @@ from typing import Any, Iterator, List
 
 from requests.exceptions import ReadTimeout
 
-from ocflib.account.search import users_by_calnet_uid
-from ocflib.ucb.directory import name_by_calnet_uid
-from ocflib.ucb.groups import groups_by_student_signat
-
 from fastapi import Depends, HTTPException, Response, status
 from pydantic import BaseModel
 
 from routes import router
 from utils.calnet import get_calnet_uid
-from utils.celery import change_password as change_password_task
+from utils.celery import get_tasks
+from utils.config import get_settings
 from utils.constants import TEST_OCF_ACCOUNTS, TESTER_CALNET_UIDS
+from utils.executors import (
+    CELERY,
+    HTTP,
+    LDAP,
+    gather_with_deadline,
+    result_or_raise,
+    run_in_backend,
+)
 
 CALLINK_ERROR_MSG = (
     "Couldn't connect to CalLink API. Resetting group "
@@ -36,9 +41,16 @@ class ResetPasswordInput(BaseModel):
     },
 )
 async def reset_password(data: ResetPasswordInput, calnet_uid=Depends(get_calnet_uid)):
-    accounts = get_accounts_for(calnet_uid)
+    accounts, signatory_accounts, calnet_name = await gather_with_deadline(
+        run_in_backend(LDAP, get_accounts_for, calnet_uid),
+        run_in_backend(HTTP, get_accounts_signatory_for, calnet_uid),
+        run_in_backend(LDAP, _name_by_calnet_uid, calnet_uid),
+        timeout=get_settings().directory_lookup_timeout,
+    )
+
+    accounts = result_or_raise(accounts)
     try:
-        accounts += get_accounts_signatory_for(calnet_uid)
+        accounts += result_or_raise(signatory_accounts)
     except (ConnectionError, ReadTimeout):
         raise HTTPException(status.HTTP_500_INTERNAL_SERVER_ERROR, CALLINK_ERROR_MSG)
 
@@ -55,13 +67,15 @@ async def reset_password(data: ResetPasswordInput, calnet_uid=Depends(get_calnet
         )
 
     try:
-        calnet_name = name_by_calnet_uid(calnet_uid)
-        task = change_password_task.delay(
+        calnet_name = result_or_raise(calnet_name)
+        task = await run_in_backend(
+            CELERY,
+            get_tasks().change_password.delay,
             data.account,
             data.new_password,
             comment=f"Your password was reset online by {calnet_name}.",
         )
-        result = task.wait(timeout=10)
+        result = await run_in_backend(CELERY, task.wait, timeout=10)
         if isinstance(result, Exception):
             raise result
     except ValueError as ex:
@@ -71,6 +85,8 @@ async def reset_password(data: ResetPasswordInput, calnet_uid=Depends(get_calnet
 
 
 def get_accounts_signatory_for(calnet_uid: str) -> List[str]:
+    from ocflib.ucb.groups import groups_by_student_signat
+
     def flatten(lst: Iterator[Any]) -> List[Any]:
         return [item for sublist in lst for item in sublist]
 
@@ -89,6 +105,8 @@ def get_accounts_signatory_for(calnet_uid: str) -> List[str]:
 
 
 def get_accounts_for(calnet_uid: str) -> List[str]:
+    from ocflib.account.search import users_by_calnet_uid
+
     accounts = users_by_calnet_uid(calnet_uid)
 
     if calnet_uid in TESTER_CALNET_UIDS:
@@ -96,3 +114,9 @@ def get_accounts_for(calnet_uid: str) -> List[str]:
         accounts.extend(TEST_OCF_ACCOUNTS)
 
     return accounts
+
+
+def _name_by_calnet_uid(calnet_uid: str) -> str:
+    from ocflib.ucb.directory import name_by_calnet_uid
+
+    return name_by_calnet_uid(calnet_uid)
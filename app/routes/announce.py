@@ -1,7 +1,16 @@
 from routes import router
 from utils.blog import get_blog_posts as real_get_blog_posts
+from utils.cache import async_periodic
+from utils.responses import PrerenderedJSONResponse, render_json
+
+
+@async_periodic(60, stale_while_revalidate=True)
+async def _get_blog_posts_body() -> bytes:
+    return render_json(await real_get_blog_posts())
 
 
 @router.get("/announce/blog", tags=["misc"])
 async def get_blog_posts():
-    return real_get_blog_posts()
+    return PrerenderedJSONResponse(
+        await _get_blog_posts_body(), max_age=_get_blog_posts_body.period
+    )
@@ -8,6 +8,7 @@ from fastapi.responses import RedirectResponse
 
 from routes import router
 from utils.calnet import create_calnet_jwt, get_calnet_service_url
+from utils.executors import HTTP, run_in_backend
 
 
 @router.get("/auth/calnet", tags=["auth"])
@@ -26,7 +27,9 @@ async def calnet_login_callback(
     calnet_redirect_url: Optional[str] = Cookie(None),
     host: str = Header(None),
 ):
-    uid = verify_ticket(ticket, get_calnet_service_url(host))
+    uid = await run_in_backend(
+        HTTP, verify_ticket, ticket, get_calnet_service_url(host)
+    )
     if not uid:
         raise HTTPException(status.HTTP_400_BAD_REQUEST, "got bad ticket")
     jwt = create_calnet_jwt(uid)
@@ -0,0 +1,24 @@
+from fastapi import Depends
+from pydantic import BaseModel
+
+from routes import router
+from utils.cache import invalidate_tag
+from utils.constants import OCFROOT_GROUP
+from utils.user import depends_get_current_user_with_group
+
+
+class InvalidateCacheOutput(BaseModel):
+    deleted: int
+
+
+@router.post(
+    "/cache/invalidate/{tag}",
+    tags=["misc"],
+    response_model=InvalidateCacheOutput,
+)
+def invalidate_cache_tag(
+    tag: str,
+    _=Depends(depends_get_current_user_with_group(OCFROOT_GROUP)),
+):
+    """Drop every cached result tagged with `tag` (e.g. "desktops")."""
+    return {"deleted": invalidate_tag(tag)}
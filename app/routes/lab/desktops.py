@@ -1,27 +1,31 @@
 from typing import List, Set
 
-from ocflib.infra.hosts import hostname_from_domain
-from ocflib.lab.stats import get_connection, list_desktops
-
 from pydantic import BaseModel
 
 from routes import router
-from utils.cache import cache, periodic
+from utils.cache import async_cache, async_cache_lookup_many, async_periodic
+from utils.executors import MYSQL, run_in_backend
+from utils.responses import PrerenderedJSONResponse, render_json
 
 
-@cache()
+@async_cache(tags=["desktops"])
 def _list_public_desktops() -> List[str]:
+    from ocflib.lab.stats import list_desktops
+
     return list_desktops(public_only=True)
 
 
-@cache()
+@async_cache(tags=["desktops"])
 def _list_desktops() -> List[str]:
+    from ocflib.lab.stats import list_desktops
+
     return list_desktops()
 
 
-@periodic(5)
 def _get_desktops_in_use() -> Set[str]:
     """List which desktops are currently in use."""
+    from ocflib.infra.hosts import hostname_from_domain
+    from ocflib.lab.stats import get_connection
 
     # https://github.com/ocf/ocflib/blob/90f9268a89ac9d53c089ab819c1aa95bdc38823d/ocflib/lab/ocfstats.sql#L70
     # we don't use users_in_lab_count_public because we're looking for
@@ -41,16 +45,28 @@ class DesktopUsageOutput(BaseModel):
     public_desktops_num: int
 
 
-@router.get("/lab/desktops", tags=["lab_stats"], response_model=DesktopUsageOutput)
-async def desktop_usage():
-    desktops_in_use = _get_desktops_in_use()
-    all_desktops = _list_desktops()
-    public_desktops = _list_public_desktops()
+@async_periodic(5, stale_while_revalidate=True, max_stale=60, tags=["desktops"])
+async def _get_desktop_usage_body() -> bytes:
+    desktops_in_use = await run_in_backend(MYSQL, _get_desktops_in_use)
+    all_desktops, public_desktops = await async_cache_lookup_many(
+        _list_desktops,
+        _list_public_desktops,
+    )
     public_desktops_in_use = desktops_in_use.intersection(public_desktops)
 
-    return {
-        "all_desktops_in_use": list(desktops_in_use),
-        "all_desktops_num": len(all_desktops),
-        "public_desktops_in_use": list(public_desktops_in_use),
-        "public_desktops_num": len(public_desktops),
-    }
+    return render_json(
+        {
+            "all_desktops_in_use": list(desktops_in_use),
+            "all_desktops_num": len(all_desktops),
+            "public_desktops_in_use": list(public_desktops_in_use),
+            "public_desktops_num": len(public_desktops),
+        },
+        DesktopUsageOutput,
+    )
+
+
+@router.get("/lab/desktops", tags=["lab_stats"], response_model=DesktopUsageOutput)
+async def desktop_usage():
+    return PrerenderedJSONResponse(
+        await _get_desktop_usage_body(), max_age=_get_desktop_usage_body.period
+    )
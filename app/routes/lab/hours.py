@@ -7,10 +7,11 @@ from fastapi import HTTPException
 from pydantic import BaseModel
 
 from routes import router
-from utils.cache import periodic
+from utils.cache import async_periodic
+from utils.responses import PrerenderedJSONResponse, render_json
 
 
-@periodic(60)
+@async_periodic(60, stale_while_revalidate=True)
 def get_hours_listing() -> HoursListing:
     return read_hours_listing()
 
@@ -22,7 +23,9 @@ class HoursOutput(BaseModel):
 
 @router.get("/lab/hours/today", tags=["lab_hours"], response_model=HoursOutput)
 async def get_hours_today():
-    return _get_hours_date()
+    return PrerenderedJSONResponse(
+        render_json(await _get_hours_date()), max_age=get_hours_listing.period
+    )
 
 
 @router.get("/lab/hours/{date}", tags=["lab_hours"], response_model=HoursOutput)
@@ -30,16 +33,21 @@ async def get_hours_date(date: str):
     try:
         # date formatted as ISO 8601 (e.g. 2022-02-22)
         parsed_date = date_type.fromisoformat(date)
-        return _get_hours_date(parsed_date)
+        return PrerenderedJSONResponse(
+            render_json(await _get_hours_date(parsed_date)),
+            max_age=get_hours_listing.period,
+            # hours in the past aren't going to change
+            immutable=parsed_date < date_type.today(),
+        )
     except Exception:
         raise HTTPException(
             status_code=400, detail="Invalid date format (expected ISO 8601)"
         )
 
 
-def _get_hours_date(date: Optional[date_type] = None):
-    hours_listing = get_hours_listing().hours_on_date(date)
+async def _get_hours_date(date: Optional[date_type] = None):
+    hours_listing = (await get_hours_listing()).hours_on_date(date)
     if len(hours_listing) == 0:
-        return {}
+        return {"open": None, "close": None}
     hours = hours_listing[0]
     return {"open": str(hours.open), "close": str(hours.close)}
@@ -1,27 +1,32 @@
+import logging
+import time
+import uuid
 from enum import Enum
-from functools import partial
-from ipaddress import ip_address
-from typing import Any, Dict, Optional
+from ipaddress import IPv4Address, IPv6Address, ip_address
+from typing import Any, Dict, Optional, Union
+
+import redis
 
-from ocflib.infra.hosts import hosts_by_filter
 from ocflib.infra.net import ipv4_to_ipv6, is_ocf_ip
-from ocflib.lab.stats import get_connection
 
 from fastapi import HTTPException, Request, Response, status
 from pydantic import BaseModel
 
 from routes import router
-from utils.cache import cache
+from utils.cache import periodic
 from utils.config import get_settings
+from utils.executors import MYSQL, run_in_backend
+from utils.mysql import OCFSTATS, get_pool
+from utils.redis import get_redis_connection
+from utils.write_behind import WriteBehindBuffer
+
+_logger = logging.getLogger(__name__)
 
-settings = get_settings()
+# field of the open session index holding when it was last rebuilt (hosts
+# are never empty, so this can't clash with one)
+_INDEX_BUILT_AT = ""
 
-get_connection = partial(
-    get_connection,
-    user=settings.ocfstats_user,
-    password=settings.ocfstats_password,
-    db=settings.ocfstats_db,
-)
+IPAddress = Union[IPv4Address, IPv6Address]
 
 
 class SessionState(str, Enum):
@@ -42,13 +47,12 @@ def log_session(session: LogSessionInput, request: Request):
     """
 
     remote_ip = ip_address(request.client.host)
+    host = _get_desktop_index().lookup(remote_ip)
 
-    if not is_ocf_ip(remote_ip):
+    if not host and not is_ocf_ip(remote_ip):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
 
     try:
-        host = _get_desktops().get(remote_ip)
-
         if not host:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -62,7 +66,7 @@ def log_session(session: LogSessionInput, request: Request):
             # sessions also get periodically cleaned up: https://git.io/vpwg8
             _close_sessions(host)
         elif state is SessionState.active and _session_exists(host, user):
-            _refresh_session(host, user)
+            _heartbeats.put(host, user)
         else:
             _new_session(host, user)
 
@@ -77,18 +81,58 @@ def _new_session(host: str, user: str) -> None:
 
     _close_sessions(host)
 
-    with get_connection().cursor() as c:
+    with get_pool(OCFSTATS).cursor() as c:
         c.execute(
             "INSERT INTO `session` (`host`, `user`, `start`, `last_update`) "
             "VALUES (%s, %s, NOW(), NOW())",
             (host, user),
         )
 
+    _update_session_index("hset", host, user)
+
 
 def _session_exists(host: str, user: str) -> bool:
-    """Returns whether an open session already exists for a given host and user."""
+    """Returns whether an open session already exists for a given host and user.
+
+    This is answered from the open session index in Redis, so the common
+    case of a desktop reporting that its session is still active doesn't
+    need to query MySQL at all. If Redis is unavailable, we fall back to the
+    session table.
+
+    The index can miss a session that was just opened, e.g. if a rebuild on
+    another worker read the session table just before it was inserted. So
+    when the index has no such session, we check the session table before
+    letting the caller open a new one, which would split the session.
+    """
 
-    with get_connection().cursor() as c:
+    try:
+        built_at, open_user = get_redis_connection().hmget(
+            _session_index_key(), _INDEX_BUILT_AT, host
+        )
+        if (
+            built_at is None
+            or time.time() - float(built_at) > get_settings().session_index_ttl
+        ):
+            open_user = _rebuild_session_index().get(host)
+        elif open_user is not None:
+            open_user = open_user.decode()
+    except redis.RedisError as e:
+        _logger.debug(f"Unable to use open session index: {e}")
+        return _session_exists_in_db(host, user)
+
+    if open_user == user:
+        return True
+
+    if _session_exists_in_db(host, user):
+        _logger.debug(f"Open session index is missing {host}, adding it back")
+        _update_session_index("hset", host, user)
+        return True
+    return False
+
+
+def _session_exists_in_db(host: str, user: str) -> bool:
+
+    with get_pool(OCFSTATS).cursor() as c:
         c.execute(
             "SELECT COUNT(*) AS `count` FROM `session` "
             "WHERE `host` = %s AND `user` = %s AND `end` IS NULL",
@@ -102,37 +146,153 @@ def _session_exists(host: str, user: str) -> bool:
         return count > 0
 
 
-def _refresh_session(host: str, user: str) -> None:
-    """Keep a session around if the user is still logged in."""
+def _refresh_sessions(sessions: Dict[str, str]) -> None:
+    """Keep sessions around if their users are still logged in.
 
-    with get_connection().cursor() as c:
-        c.execute(
+    Desktops report that their session is still active much more often than
+    anything else, so these are buffered in `_heartbeats` and applied in bulk
+    rather than one UPDATE per request.
+    """
+
+    hosts_and_users = list(sessions.items())
+    with get_pool(OCFSTATS).cursor() as c:
+        updated = c.execute(
             "UPDATE `session` SET `last_update` = NOW() "
-            "WHERE `host` = %s AND `user` = %s AND `end` IS NULL",
-            (host, user),
+            "WHERE `end` IS NULL AND (`host`, `user`) IN ({})".format(
+                ", ".join(["(%s, %s)"] * len(hosts_and_users))
+            ),
+            [value for host_and_user in hosts_and_users for value in host_and_user],
         )
 
+    if updated < len(hosts_and_users):
+        # some sessions the index said were open weren't (e.g. they were
+        # closed by the cleanup cronjob), so rebuild it before it's used again.
+        # this also happens if a session was already updated within the same
+        # second, since MySQL doesn't count unchanged rows, which is harmless.
+        _update_session_index("hdel", _INDEX_BUILT_AT)
+
+
+_heartbeats: WriteBehindBuffer[str, str] = WriteBehindBuffer(
+    "session_heartbeats",
+    _refresh_sessions,
+    interval=get_settings().session_flush_interval,
+).register()
+
 
 def _close_sessions(host: str) -> None:
     """Close all sessions for a particular host."""
 
-    with get_connection().cursor() as c:
+    # any refresh still buffered for this host is for a session we're closing
+    _heartbeats.discard(host)
+
+    with get_pool(OCFSTATS).cursor() as c:
         c.execute(
             "UPDATE `session` SET `end` = NOW(), `last_update` = NOW() "
             "WHERE `host` = %s AND `end` IS NULL",
             (host,),
         )
 
+    _update_session_index("hdel", host)
+
+
+def _session_index_key() -> str:
+    return f"{get_settings().cache_namespace}:sessions:open"
+
+
+def _rebuild_session_index() -> Dict[str, str]:
+    """Rebuild the open session index from the session table.
+
+    The index is a Redis hash mapping each host with an open session to its
+    user. It's kept up to date as sessions are opened and closed, and rebuilt
+    from scratch whenever it's missing, older than `session_index_ttl`, or
+    found to be wrong.
+    """
+
+    with get_pool(OCFSTATS).cursor() as c:
+        c.execute(
+            "SELECT `host`, `user` FROM `session` WHERE `end` IS NULL "
+            "ORDER BY `start`"
+        )
+        sessions = {row["host"]: row["user"] for row in c}  # type: ignore
+
+    # build it under a temporary name and swap it in, so readers never see a
+    # partially built index
+    key = _session_index_key()
+    new_key = f"{key}:{uuid.uuid4().hex}"
+    redis_connection = get_redis_connection()
+    redis_connection.hset(new_key, mapping={_INDEX_BUILT_AT: time.time(), **sessions})
+    redis_connection.rename(new_key, key)
+    return sessions
+
+
+def _update_session_index(command: str, *args: Any) -> None:
+    try:
+        getattr(get_redis_connection(), command)(_session_index_key(), *args)
+    except redis.RedisError as e:
+        _logger.debug(f"Unable to update open session index: {e}")
+
+
+@router.on_event("startup")
+async def _rebuild_session_index_on_startup() -> None:
+    try:
+        await run_in_backend(MYSQL, _rebuild_session_index)
+    except Exception as e:
+        _logger.warning(f"Unable to rebuild open session index: {e}")
+
+
+class DesktopIndex:
+    """Maps the IPv4 and 6 addresses of OCF desktops to their fqdns.
+
+    Addresses are stored as integers rather than ip_address objects, since
+    those are much cheaper to hash and compare.
+    """
+
+    __slots__ = ("_v4", "_v6")
 
-@cache(600)
-def _get_desktops() -> Dict[Any, Any]:
-    """Return IPv4 and 6 address to fqdn mapping for OCF desktops from LDAP."""
+    def __init__(self) -> None:
+        self._v4: Dict[int, str] = {}
+        self._v6: Dict[int, str] = {}
 
-    desktops = {}
+    def __len__(self) -> int:
+        return len(self._v4)
+
+    def add(self, address: IPAddress, host: str) -> None:
+        (self._v4 if address.version == 4 else self._v6)[int(address)] = host
+
+    def lookup(self, address: IPAddress) -> Optional[str]:
+        """Return the desktop with the given address, if it is one."""
+        return (self._v4 if address.version == 4 else self._v6).get(int(address))
+
+
+@periodic(600, stale_while_revalidate=True, tags=["desktops"])
+def _build_desktop_index() -> DesktopIndex:
+    """Build the desktop index from LDAP.
+
+    This is refreshed in the background, so requests almost never wait on
+    the LDAP search.
+    """
+    from ocflib.infra.hosts import hosts_by_filter
+
+    desktops = DesktopIndex()
     for e in hosts_by_filter("(type=desktop)"):
         host = e["cn"][0] + ".ocf.berkeley.edu"
         v4 = ip_address(e["ipHostNumber"][0])
-        v6 = ipv4_to_ipv6(v4)
-        desktops[v4] = host
-        desktops[v6] = host
+        desktops.add(v4, host)
+        desktops.add(ipv4_to_ipv6(v4), host)
     return desktops
+
+
+_last_desktop_index: Optional[DesktopIndex] = None
+
+
+def _get_desktop_index() -> DesktopIndex:
+    """Return the desktop index, or the last one we had if it can't be built."""
+
+    global _last_desktop_index
+    try:
+        _last_desktop_index = _build_desktop_index()
+    except Exception as e:
+        if _last_desktop_index is None:
+            raise
+        _logger.warning(f"Unable to build desktop index, using last one: {e}")
+    return _last_desktop_index
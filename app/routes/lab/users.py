@@ -1,21 +1,35 @@
 from datetime import datetime
-from typing import List, Optional
-
-from ocflib.lab.stats import staff_in_lab as real_staff_in_lab
-from ocflib.lab.stats import users_in_lab_count as real_users_in_lab_count
+from typing import Any, List, Optional
 
 from pydantic import BaseModel
 
 from routes import router
+from utils.cache import async_periodic
+from utils.executors import MYSQL, run_in_backend
+from utils.responses import PrerenderedJSONResponse, TrustedJSONResponse, render_json
 
 
 class NumUsersOutput(BaseModel):
     num_users: int
 
 
+def _users_in_lab_count() -> int:
+    from ocflib.lab.stats import users_in_lab_count
+
+    return users_in_lab_count()
+
+
+@async_periodic(5, stale_while_revalidate=True, max_stale=60)
+async def _get_num_users_body() -> bytes:
+    num_users = await run_in_backend(MYSQL, _users_in_lab_count)
+    return render_json({"num_users": num_users}, NumUsersOutput)
+
+
 @router.get("/lab/num_users", tags=["lab_stats"], response_model=NumUsersOutput)
 async def get_num_users_in_lab():
-    return {"num_users": real_users_in_lab_count()}
+    return PrerenderedJSONResponse(
+        await _get_num_users_body(), max_age=_get_num_users_body.period
+    )
 
 
 class StaffSession(BaseModel):
@@ -29,6 +43,13 @@ class StaffInLabOutput(BaseModel):
     staff_in_lab: List[StaffSession]
 
 
+def _staff_in_lab() -> List[Any]:
+    from ocflib.lab.stats import staff_in_lab
+
+    return staff_in_lab()
+
+
 @router.get("/lab/staff", tags=["lab_stats"], response_model=StaffInLabOutput)
 async def get_staff_in_lab():
-    return {"staff_in_lab": [s._asdict() for s in real_staff_in_lab()]}
+    staff_in_lab = await run_in_backend(MYSQL, _staff_in_lab)
+    return TrustedJSONResponse({"staff_in_lab": [s._asdict() for s in staff_in_lab]})
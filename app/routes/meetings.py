@@ -10,6 +10,8 @@ from fastapi import Response, status
 from pydantic import BaseModel
 
 from routes import router
+from utils.cache import periodic
+from utils.responses import PrerenderedJSONResponse, render_json
 
 
 class MeetingOutput(BaseModel):
@@ -25,9 +27,24 @@ class MeetingsListOutput(BaseModel):
     meetings: List[MeetingOutput]
 
 
+# the next and current meetings are read afresh for every request, but only
+# change when a meeting starts or ends, so clients may reuse them for a minute
+_MEETING_MAX_AGE = 60
+
+
+@periodic(60, stale_while_revalidate=True)
+def _get_meetings_list_body() -> bytes:
+    return render_json(
+        {"meetings": [item._asdict() for item in read_meeting_list()]},
+        MeetingsListOutput,
+    )
+
+
 @router.get("/meetings/list", tags=["meetings"], response_model=MeetingsListOutput)
 def get_meetings_list():
-    return {"meetings": [item._asdict() for item in read_meeting_list()]}
+    return PrerenderedJSONResponse(
+        _get_meetings_list_body(), max_age=_get_meetings_list_body.period
+    )
 
 
 @router.get("/meetings/next", tags=["meetings"], response_model=MeetingOutput)
@@ -36,7 +53,9 @@ def get_next_meeting():
     if next_meeting is None:
         return Response(status_code=status.HTTP_204_NO_CONTENT)
 
-    return next_meeting._asdict()
+    return PrerenderedJSONResponse(
+        render_json(next_meeting._asdict()), max_age=_MEETING_MAX_AGE
+    )
 
 
 @router.get("/meetings/current", tags=["meetings"], response_model=MeetingOutput)
@@ -45,4 +64,6 @@ def get_current_meeting():
     if current_meeting is None:
         return Response(status_code=status.HTTP_204_NO_CONTENT)
 
-    return current_meeting._asdict()
+    return PrerenderedJSONResponse(
+        render_json(current_meeting._asdict()), max_age=_MEETING_MAX_AGE
+    )
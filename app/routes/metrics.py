@@ -0,0 +1,12 @@
+from prometheus_client import CONTENT_TYPE_LATEST
+
+from fastapi import Response
+
+from routes import router
+from utils.metrics import generate_metrics
+
+
+@router.get("/metrics", tags=["misc"], include_in_schema=False)
+def get_metrics():
+    # CONTENT_TYPE_LATEST already has a charset, which media_type would repeat
+    return Response(generate_metrics(), headers={"Content-Type": CONTENT_TYPE_LATEST})
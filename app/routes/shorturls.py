@@ -1,10 +1,11 @@
-from ocflib.misc.shorturls import get_connection, get_shorturl
+from typing import Optional
 
 from fastapi import status
 from fastapi.exceptions import HTTPException
 from fastapi.responses import RedirectResponse
 
 from routes import router
+from utils.executors import MYSQL, run_in_backend
 
 
 @router.get(
@@ -14,8 +15,7 @@ from routes import router
 )
 async def bounce_shorturl(slug: str):
     if slug:
-        with get_connection().cursor() as ctx:
-            target = get_shorturl(ctx, slug)
+        target = await run_in_backend(MYSQL, _lookup_shorturl, slug)
 
         if target:
             return RedirectResponse(
@@ -23,3 +23,10 @@ async def bounce_shorturl(slug: str):
             )
 
     raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+
+
+def _lookup_shorturl(slug: str) -> Optional[str]:
+    from ocflib.misc.shorturls import get_connection, get_shorturl
+
+    with get_connection().cursor() as ctx:
+        return get_shorturl(ctx, slug)
@@ -1,11 +1,10 @@
 from typing import List
 
-from ocflib.lab.staff_hours import get_staff_hours as real_get_staff_hours
-
 from pydantic import BaseModel
 
 from routes import router
-from utils.cache import periodic
+from utils.cache import async_periodic
+from utils.responses import PrerenderedJSONResponse, render_json
 
 
 class StaffHourStaff(BaseModel):
@@ -25,16 +24,20 @@ class StaffHoursOutput(BaseModel):
     staff_hours: List[StaffHour]
 
 
-@periodic(60)
-def _get_staff_hours() -> List[StaffHour]:
+@async_periodic(60, stale_while_revalidate=True)
+def _get_staff_hours_body() -> bytes:
+    from ocflib.lab.staff_hours import get_staff_hours as real_get_staff_hours
+
     staff_hours: List[StaffHour] = []
     for h in real_get_staff_hours():
         staff_hour = h._asdict()
         staff_hour["staff"] = [s._asdict() for s in h.staff]
         staff_hours.append(staff_hour)
-    return staff_hours
+    return render_json({"staff_hours": staff_hours}, StaffHoursOutput)
 
 
 @router.get("/staff_hours", tags=["misc"], response_model=StaffHoursOutput)
 async def get_staff_hours():
-    return {"staff_hours": _get_staff_hours()}
+    return PrerenderedJSONResponse(
+        await _get_staff_hours_body(), max_age=_get_staff_hours_body.period
+    )
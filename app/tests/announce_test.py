@@ -8,3 +8,4 @@ client = TestClient(app)
 def test_read_announcements():
     response = client.get("/announce/blog")
     assert response.status_code == 200
+    assert response.headers["cache-control"] == "public, max-age=60"
@@ -0,0 +1,145 @@
+import time
+
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from jose import jwk, jwt
+
+import utils.auth
+from utils.auth import KeySet, _get_token_cache, decode_token, get_cached_token
+
+
+def _make_signing_key():
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    return private_key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption(),
+    )
+
+
+SIGNING_KEYS = {kid: _make_signing_key() for kid in ["old", "new"]}
+
+
+def _jwks(*kids):
+    keys = []
+    for kid in kids:
+        key = jwk.construct(SIGNING_KEYS[kid], "RS256").public_key().to_dict()
+        keys.append({**key, "kid": kid, "use": "sig"})
+    return {"keys": keys}
+
+
+def _make_token(kid="old", expires_in=3600):
+    claims = {
+        "exp": time.time() + expires_in,
+        "preferred_username": "waddles",
+        "email": "waddles@ocf.berkeley.edu",
+        "name": "Waddles",
+        "scope": "openid",
+        "groups": ["ocf"],
+    }
+    return jwt.encode(
+        claims, SIGNING_KEYS[kid], algorithm="RS256", headers={"kid": kid}
+    )
+
+
+class FakeKeycloak:
+    """Stands in for requests.get, serving the JWKS of the current keys."""
+
+    def __init__(self, *kids):
+        self.kids = kids
+        self.requests = 0
+        self.down = False
+
+    def get(self, url, timeout):
+        self.requests += 1
+        if self.down:
+            raise utils.auth.requests.ConnectionError("Keycloak is down")
+        return self
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return _jwks(*self.kids)
+
+
+@pytest.fixture
+def keycloak(monkeypatch):
+    keycloak = FakeKeycloak("old")
+    monkeypatch.setattr(utils.auth.requests, "get", keycloak.get)
+    return keycloak
+
+
+@pytest.fixture
+def key_set(keycloak, monkeypatch):
+    key_set = KeySet("https://keycloak/certs", ttl=3600, min_refetch_interval=30)
+    monkeypatch.setattr(utils.auth, "get_key_set", lambda: key_set)
+    _get_token_cache.cache_clear()
+    return key_set
+
+
+def test_verified_tokens_are_cached(key_set):
+    token = _make_token()
+    assert get_cached_token(token) is None
+
+    user_token = decode_token(token)
+    assert user_token.username == "waddles"
+    assert get_cached_token(token) is user_token
+    assert decode_token(token) is user_token
+
+
+def test_cached_tokens_expire_with_the_token(key_set):
+    token = _make_token(expires_in=0.2)
+    decode_token(token)
+    assert get_cached_token(token) is not None
+
+    time.sleep(0.3)
+    assert get_cached_token(token) is None
+
+
+def test_invalid_tokens_are_not_cached(key_set):
+    token = _make_token()[:-4] + "AAAA"
+    with pytest.raises(Exception):
+        decode_token(token)
+    assert get_cached_token(token) is None
+
+
+def test_keys_are_fetched_lazily_and_cached(keycloak):
+    key_set = KeySet("https://keycloak/certs", ttl=3600, min_refetch_interval=30)
+    assert keycloak.requests == 0
+
+    assert key_set.get("old") is key_set.get("old")
+    assert keycloak.requests == 1
+
+
+def test_unknown_key_refetches_at_most_once_per_interval(keycloak):
+    key_set = KeySet("https://keycloak/certs", ttl=3600, min_refetch_interval=0.2)
+    key_set.get("old")
+
+    # keycloak rotated its keys, but we've only just fetched them
+    keycloak.kids = ("old", "new")
+    for _ in range(3):
+        with pytest.raises(KeyError):
+            key_set.get("new")
+    assert keycloak.requests == 1
+
+    time.sleep(0.3)
+    assert key_set.get("new") is not None
+    assert keycloak.requests == 2
+
+
+def test_keys_are_kept_when_refreshing_fails(keycloak):
+    key_set = KeySet("https://keycloak/certs", ttl=0, min_refetch_interval=0)
+    old_key = key_set.get("old")
+
+    keycloak.down = True
+    assert key_set.get("old") is old_key
+    assert keycloak.requests == 2
+
+
+def test_tokens_signed_with_rotated_keys_verify(key_set, keycloak):
+    keycloak.kids = ("new",)
+    key_set.min_refetch_interval = 0
+
+    assert decode_token(_make_token(kid="new")).username == "waddles"
@@ -0,0 +1,92 @@
+import asyncio
+
+import httpx
+import pytest
+
+import utils.blog as blog
+
+_REAL_SLEEP = asyncio.sleep
+
+_FEED = b"""<?xml version="1.0" encoding="UTF-8"?>
+<feed xmlns="http://www.w3.org/2005/Atom">
+  <entry>
+    <id>tag:blogger.com,1999:post-1</id>
+    <published>2023-01-02T03:04:05.000-08:00</published>
+    <updated>2023-01-02T04:04:05.000-08:00</updated>
+    <title>Printing is down</title>
+    <content>Sorry!</content>
+    <author><name>oski</name><email>oski@ocf.berkeley.edu</email></author>
+    <link rel="alternate" type="text/html" href="https://status.ocf.io/1"/>
+  </entry>
+</feed>
+"""
+
+
+@pytest.fixture
+def feed(monkeypatch):
+    """Serve the blog feed from the responses the test appends, recording
+    each request and each retry delay."""
+    responses, requests, delays = [], [], []
+
+    def handle(request):
+        requests.append(request)
+        response = responses.pop(0) if responses else httpx.Response(500)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    async def sleep(delay):
+        delays.append(delay)
+        await _REAL_SLEEP(0)
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handle))
+    monkeypatch.setattr(blog, "_get_client", lambda: client)
+    monkeypatch.setattr(blog, "_feed", blog._Feed())
+    monkeypatch.setattr(blog.asyncio, "sleep", sleep)
+    return responses, requests, delays
+
+
+def _ok(**headers):
+    return httpx.Response(200, content=_FEED, headers=headers)
+
+
+def test_unchanged_feed_is_reused(feed):
+    responses, requests, _ = feed
+    responses.extend([_ok(ETag='"v1"'), httpx.Response(304)])
+
+    first = asyncio.run(blog.get_blog_posts())
+    assert [post["title"] for post in first] == ["Printing is down"]
+    assert first[0]["link"] == "https://status.ocf.io/1"
+    assert "If-None-Match" not in requests[0].headers
+
+    assert asyncio.run(blog.get_blog_posts()) is first
+    assert requests[1].headers["If-None-Match"] == '"v1"'
+
+
+def test_failures_are_retried_with_backoff(feed):
+    responses, requests, delays = feed
+    responses.extend([httpx.Response(503), httpx.ConnectError("refused"), _ok()])
+
+    posts = asyncio.run(blog.get_blog_posts())
+
+    assert [post["title"] for post in posts] == ["Printing is down"]
+    assert len(requests) == 3
+    assert delays == [blog._RETRY_DELAY, blog._RETRY_DELAY * 2]
+
+
+def test_retries_give_up_at_the_deadline(feed, monkeypatch):
+    _, requests, _ = feed
+    monkeypatch.setattr(blog, "_DEADLINE", 0.05)
+
+    assert asyncio.run(blog.get_blog_posts()) == []
+    # it kept retrying until then
+    assert len(requests) > 1
+
+
+def test_last_good_posts_are_served_when_blogger_fails(feed, monkeypatch):
+    responses, _, _ = feed
+    monkeypatch.setattr(blog, "_DEADLINE", 0.05)
+    responses.append(_ok())
+    posts = asyncio.run(blog.get_blog_posts())
+
+    assert asyncio.run(blog.get_blog_posts()) is posts
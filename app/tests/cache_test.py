@@ -0,0 +1,261 @@
+import asyncio
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from utils.cache import (
+    AsyncPeriodicFunction,
+    LocalCache,
+    PeriodicFunction,
+    _make_lock_name,
+    _revalidating,
+    _single_flight,
+    async_cache,
+    async_cache_lookup_many,
+    cache,
+    cache_lookup_many,
+    cached_call,
+    get_local_cache,
+)
+from utils.codec import get_codec
+
+
+def test_local_cache_hit_and_miss():
+    local_cache = LocalCache(max_entries=2)
+    local_cache.set("a", 1, ttl=None)
+
+    assert local_cache.get("a") == 1
+    with pytest.raises(KeyError):
+        local_cache.get("b")
+
+    stats = local_cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+
+
+def test_local_cache_evicts_least_recently_used():
+    local_cache = LocalCache(max_entries=2)
+    local_cache.set("a", 1, ttl=None)
+    local_cache.set("b", 2, ttl=None)
+    local_cache.get("a")
+    local_cache.set("c", 3, ttl=None)
+
+    assert local_cache.get("a") == 1
+    assert local_cache.get("c") == 3
+    assert "b" not in local_cache._entries
+    assert local_cache.stats()["evictions"] == 1
+
+
+def test_local_cache_expires_entries():
+    local_cache = LocalCache(max_entries=2)
+    local_cache.set("a", 1, ttl=0.01)
+    time.sleep(0.02)
+
+    with pytest.raises(KeyError):
+        local_cache.get("a")
+    assert local_cache.stats()["expirations"] == 1
+
+
+def test_single_flight_shares_one_call():
+    calls = []
+    started = threading.Event()
+    release = threading.Event()
+
+    def slow():
+        calls.append(1)
+        started.set()
+        release.wait()
+        return "value"
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(_single_flight("k", slow)))
+        for _ in range(4)
+    ]
+    threads[0].start()
+    started.wait()
+    for thread in threads[1:]:
+        thread.start()
+    # give the followers a chance to start waiting on the leader
+    time.sleep(0.1)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert results == ["value"] * 4
+
+
+def _swr_function(fn, period=60, max_stale=3600):
+    return PeriodicFunction(
+        function=fn,
+        period=period,
+        ttl=max_stale,
+        stale_while_revalidate=True,
+        max_stale=max_stale,
+    )
+
+
+def _store_with_age(redis, pf, value, age):
+    timestamp = datetime.now() - timedelta(seconds=age)
+    redis.set(pf.function_call_key, get_codec().encode((timestamp, value)))
+
+
+def _wait_for(condition, timeout=2):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def _hours():
+    _hours.calls += 1
+    return "new"
+
+
+def test_periodic_serves_fresh_result(redis):
+    _hours.calls = 0
+    pf = _swr_function(_hours)
+    _store_with_age(redis, pf, "cached", age=1)
+
+    assert pf.result() == "cached"
+    assert _hours.calls == 0
+    assert pf not in _revalidating
+
+
+def test_periodic_serves_stale_result_while_revalidating(redis):
+    _hours.calls = 0
+    pf = _swr_function(_hours)
+    _store_with_age(redis, pf, "stale", age=120)
+
+    assert pf.result() == "stale"
+    _wait_for(lambda: pf not in _revalidating)
+    assert _hours.calls == 1
+    assert pf.seconds_since_last_update() < pf.period
+
+
+def test_periodic_recomputes_result_past_max_stale(redis):
+    _hours.calls = 0
+    pf = _swr_function(_hours)
+    _store_with_age(redis, pf, "ancient", age=7200)
+
+    assert pf.result() == "new"
+    assert _hours.calls == 1
+
+
+def test_periodic_past_max_stale_waits_for_lock_holder(redis):
+    _hours.calls = 0
+    pf = _swr_function(_hours)
+    _store_with_age(redis, pf, "ancient", age=7200)
+    lock = redis.lock(
+        _make_lock_name(pf.function_call_key), timeout=10, thread_local=False
+    )
+    assert lock.acquire(blocking=False)
+
+    def other_worker():
+        time.sleep(0.1)
+        _store_with_age(redis, pf, "theirs", age=0)
+        lock.release()
+
+    thread = threading.Thread(target=other_worker)
+    thread.start()
+    assert pf.result() == "theirs"
+    thread.join()
+    assert _hours.calls == 0
+
+
+def test_async_periodic_recomputes_result_past_max_stale(redis):
+    async def hours():
+        calls.append(1)
+        return "new"
+
+    calls = []
+    pf = AsyncPeriodicFunction(
+        function=hours,
+        period=60,
+        ttl=3600,
+        stale_while_revalidate=True,
+        max_stale=3600,
+    )
+    _store_with_age(redis, pf, "ancient", age=7200)
+
+    assert asyncio.run(pf.result()) == "new"
+    assert calls == [1]
+
+
+squared = []
+
+
+@cache()
+def _square(x):
+    squared.append(x)
+    return x * x
+
+
+@async_cache()
+async def _async_square(x):
+    squared.append(x)
+    return x * x
+
+
+def _motd():
+    return "hello"
+
+
+def _fill_batch(redis, fn):
+    """Put fn(1) in the in-process cache and fn(2) only in Redis."""
+    squared.clear()
+    get_local_cache().set(cached_call(fn, 1).key, 100, None)
+    redis.set(cached_call(fn, 2).key, get_codec().encode(200))
+
+
+def test_cache_lookup_many_only_evaluates_misses(redis):
+    _fill_batch(redis, _square)
+    motd = PeriodicFunction(function=_motd, period=60, ttl=120)
+
+    results = cache_lookup_many(
+        cached_call(_square, 1),
+        cached_call(_square, 2),
+        cached_call(_square, 3),
+        motd.cached_call(),
+    )
+
+    # the periodic function's timestamp was stripped by `finish`
+    assert results == [100, 200, 9, "hello"]
+    assert squared == [3]
+    # the Redis hit and the miss are now in the in-process cache too
+    assert get_local_cache().get(cached_call(_square, 2).key) == 200
+    assert get_local_cache().get(cached_call(_square, 3).key) == 9
+    assert get_codec().decode(redis.get(cached_call(_square, 3).key)) == 9
+
+
+def test_async_cache_lookup_many_only_evaluates_misses(redis):
+    _fill_batch(redis, _async_square)
+    motd = AsyncPeriodicFunction(function=_motd, period=60, ttl=120)
+
+    results = asyncio.run(
+        async_cache_lookup_many(
+            cached_call(_async_square, 1),
+            cached_call(_async_square, 2),
+            cached_call(_async_square, 3),
+            motd.cached_call(),
+        )
+    )
+
+    assert results == [100, 200, 9, "hello"]
+    assert squared == [3]
+
+
+def test_cache_lookup_many_rejects_functions_that_must_be_awaited(redis):
+    motd = AsyncPeriodicFunction(function=_motd, period=60, ttl=120)
+
+    with pytest.raises(TypeError):
+        cache_lookup_many(motd.cached_call())
+    with pytest.raises(TypeError):
+        cache_lookup_many(cached_call(_async_square, 1))
+
+
+def test_cached_call_rejects_uncached_functions():
+    with pytest.raises(ValueError):
+        cached_call(_motd)
@@ -0,0 +1,114 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import fakeredis
+import fakeredis.aioredis
+import pytest
+
+import utils.celery
+from utils.celery import deserialize, serialize, watch_task
+
+
+def test_serializer_round_trips_task_payloads():
+    payload = [
+        ["someuser", "hunter22"],
+        {"comment": None, "key": b"\x00\xff" * 128},
+        {"callbacks": None, "chain": None},
+    ]
+    assert deserialize(serialize(payload)) == payload
+    assert deserialize(serialize(("a", 1))) == ["a", 1]
+    # bytes aren't inflated by encoding them as text
+    assert len(serialize(b"\x00\xff" * 128)) == 256 + 3
+
+    with pytest.raises(TypeError):
+        serialize({"unsupported": object()})
+
+
+def test_serializer_revives_account_requests():
+    # ocflib's account creation code needs cracklib
+    creation = pytest.importorskip("ocflib.account.creation")
+    submission = pytest.importorskip("ocflib.account.submission")
+
+    request = creation.NewAccountRequest(
+        user_name="someuser",
+        real_name="Some User",
+        is_group=False,
+        calnet_uid=1234567,
+        callink_oid=None,
+        email="someuser@berkeley.edu",
+        encrypted_password=b"\x00\xff" * 128,
+        handle_warnings=creation.NewAccountRequest.WARNINGS_WARN,
+    )
+    response = submission.NewAccountResponse(
+        status=submission.NewAccountResponse.FLAGGED, errors=["Similar username"]
+    )
+    revived = deserialize(serialize([[request], {"result": response}]))
+    assert revived == [[request], {"result": response}]
+    assert type(revived[0][0]) is creation.NewAccountRequest
+    assert type(revived[1]["result"]) is submission.NewAccountResponse
+
+
+class FakeResultBackend:
+    """Stores task results as JSON, like Celery's Redis result backend."""
+
+    def get_key_for_task(self, task_id):
+        return f"celery-task-meta-{task_id}".encode()
+
+    def encode_result(self, status, result):
+        return json.dumps({"status": status, "result": result})
+
+    def decode_result(self, payload):
+        return json.loads(payload)
+
+
+@pytest.fixture
+def result_backend(monkeypatch):
+    backend = FakeResultBackend()
+    client = fakeredis.aioredis.FakeRedis(server=fakeredis.FakeServer())
+    celery_app = SimpleNamespace(backend=backend)
+    monkeypatch.setattr(utils.celery, "get_celery_app", lambda: celery_app)
+    monkeypatch.setattr(utils.celery, "_get_result_backend_redis", lambda: client)
+    return backend, client
+
+
+async def _watch(task_id, timeout, on_update=None):
+    updates = []
+    async for update in watch_task(task_id, timeout):
+        updates.append(update)
+        if on_update is not None:
+            await on_update(update)
+    return updates
+
+
+def test_watch_task_stops_at_a_finished_task(result_backend):
+    backend, client = result_backend
+
+    async def run():
+        key = backend.get_key_for_task("t")
+        await client.set(key, backend.encode_result("SUCCESS", "done"))
+        return await _watch("t", timeout=5)
+
+    assert asyncio.run(run()) == [("SUCCESS", "done")]
+
+
+def test_watch_task_follows_published_progress(result_backend):
+    backend, client = result_backend
+    key = backend.get_key_for_task("t")
+    progress = [("PROGRESS", {"status": ["Validated"]}), ("SUCCESS", "done")]
+
+    async def publish_next(update):
+        # the backend stores each result, and publishes it to the result key
+        if progress:
+            await client.publish(key, backend.encode_result(*progress.pop(0)))
+
+    updates = asyncio.run(_watch("t", timeout=5, on_update=publish_next))
+    assert updates == [
+        ("PENDING", None),
+        ("PROGRESS", {"status": ["Validated"]}),
+        ("SUCCESS", "done"),
+    ]
+
+
+def test_watch_task_gives_up_after_timeout(result_backend):
+    assert asyncio.run(_watch("t", timeout=0.05)) == [("PENDING", None)]
@@ -0,0 +1,34 @@
+from collections import namedtuple
+from datetime import datetime
+
+import pytest
+
+from utils.codec import FLAG_COMPRESSED, Codec, CodecError
+
+Point = namedtuple("Point", ["x", "y"])
+
+
+def test_codec_round_trips_cached_types():
+    codec = Codec()
+    for value in [
+        None,
+        {"desktop1", "desktop2"},
+        Point(1, 2),
+        (datetime(2022, 2, 22, 12, 0), [{"title": "Outage", "content": "<p/>"}]),
+    ]:
+        assert codec.decode(codec.encode(value)) == value
+
+
+def test_codec_compresses_large_values():
+    codec = Codec(compress_threshold=1024)
+    value = "<p>lots of html</p>" * 1000
+
+    data = codec.encode(value)
+    assert data[1] & FLAG_COMPRESSED
+    assert len(data) < len(value)
+    assert codec.decode(data) == value
+
+
+def test_codec_rejects_unknown_versions():
+    with pytest.raises(CodecError):
+        Codec().decode(b"\xff\x00garbage")
@@ -0,0 +1,35 @@
+import fakeredis
+import fakeredis.aioredis
+import pytest
+
+import utils.cache
+
+
+@pytest.fixture
+def redis_server(monkeypatch):
+    """Point the cache at an empty in-memory Redis, shared by the sync and
+    asyncio clients, and start with an empty in-process cache."""
+    server = fakeredis.FakeServer()
+    r = fakeredis.FakeRedis(server=server)
+    async_r = fakeredis.aioredis.FakeRedis(server=server)
+    monkeypatch.setattr(utils.cache, "get_redis_connection", lambda: r)
+    monkeypatch.setattr(utils.cache, "get_async_redis_connection", lambda: async_r)
+    monkeypatch.setattr(utils.cache, "_local_cache", None)
+    return server
+
+
+@pytest.fixture
+def redis(redis_server):
+    return fakeredis.FakeRedis(server=redis_server)
+
+
+@pytest.fixture
+def redis_down(monkeypatch):
+    """Make every Redis call fail as if the server were unreachable."""
+
+    def unreachable():
+        raise utils.cache.CircuitOpenError("Redis circuit breaker is open")
+
+    monkeypatch.setattr(utils.cache, "get_redis_connection", unreachable)
+    monkeypatch.setattr(utils.cache, "get_async_redis_connection", unreachable)
+    monkeypatch.setattr(utils.cache, "_local_cache", None)
@@ -0,0 +1,109 @@
+import asyncio
+import gc
+import threading
+
+import pytest
+from prometheus_client import REGISTRY
+
+from utils.executors import (
+    BackendBusyError,
+    BackendExecutor,
+    DeadlineExceededError,
+    gather_with_deadline,
+    result_or_raise,
+)
+
+
+def test_backend_executor_rejects_calls_once_full():
+    executor = BackendExecutor("test", max_workers=1, max_queue=1)
+    release = threading.Event()
+    try:
+        running = executor.submit(release.wait)
+        queued = executor.submit(lambda: "queued")
+        with pytest.raises(BackendBusyError):
+            executor.submit(lambda: "rejected")
+
+        release.set()
+        running.result()
+        assert queued.result() == "queued"
+        assert executor.submit(lambda: "accepted").result() == "accepted"
+    finally:
+        release.set()
+        executor.shutdown()
+
+
+def test_backend_executor_frees_slots_of_cancelled_calls():
+    executor = BackendExecutor("cancelled", max_workers=1, max_queue=2)
+    release = threading.Event()
+    try:
+        running = executor.submit(release.wait)
+        queued = [executor.submit(lambda: "queued") for _ in range(2)]
+        for future in queued:
+            assert future.cancel()
+
+        # the cancelled calls never ran, but gave their slots back
+        accepted = [executor.submit(lambda: "accepted") for _ in range(2)]
+        with pytest.raises(BackendBusyError):
+            executor.submit(lambda: "rejected")
+        assert (
+            REGISTRY.get_sample_value(
+                "ocfapi_executor_queued", {"backend": "cancelled"}
+            )
+            == 2
+        )
+
+        release.set()
+        running.result()
+        assert [future.result() for future in accepted] == ["accepted"] * 2
+    finally:
+        release.set()
+        executor.shutdown()
+
+
+def test_gather_with_deadline_keeps_order_and_exceptions():
+    async def sleep_then(delay, result):
+        await asyncio.sleep(delay)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    error = ValueError("lookup failed")
+    results = asyncio.run(
+        gather_with_deadline(
+            sleep_then(0.02, "slow"),
+            sleep_then(0, error),
+            sleep_then(0, "fast"),
+            timeout=1,
+        )
+    )
+    assert results == ["slow", error, "fast"]
+    assert result_or_raise(results[0]) == "slow"
+    with pytest.raises(ValueError):
+        result_or_raise(results[1])
+
+    with pytest.raises(DeadlineExceededError):
+        asyncio.run(
+            gather_with_deadline(
+                sleep_then(1, "late"), sleep_then(0, "ok"), timeout=0.01
+            )
+        )
+
+
+def test_cancelled_gather_with_deadline_leaves_nothing_unretrieved():
+    errors = []
+
+    async def run():
+        asyncio.get_running_loop().set_exception_handler(
+            lambda loop, context: errors.append(context)
+        )
+        lookups = asyncio.ensure_future(
+            gather_with_deadline(asyncio.sleep(1), timeout=1)
+        )
+        await asyncio.sleep(0)
+        lookups.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await lookups
+
+    asyncio.run(run())
+    gc.collect()
+    assert errors == []
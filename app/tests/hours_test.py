@@ -0,0 +1,39 @@
+import asyncio
+from datetime import time
+from types import SimpleNamespace
+
+from main import app
+
+from fastapi.testclient import TestClient
+
+import routes.lab.hours
+
+client = TestClient(app)
+
+
+class FakeHoursListing:
+    def hours_on_date(self, date):
+        return [SimpleNamespace(open=time(9), close=time(18))]
+
+
+def _read_hours_listing():
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return FakeHoursListing()
+    raise AssertionError("read the hours listing on the event loop")
+
+
+def test_hours_listing_is_read_off_the_event_loop(redis, monkeypatch):
+    monkeypatch.setattr(routes.lab.hours, "read_hours_listing", _read_hours_listing)
+
+    for url in ["/lab/hours/today", "/lab/hours/2022-02-22"]:
+        response = client.get(url)
+        assert response.status_code == 200
+        assert response.json() == {"open": "09:00:00", "close": "18:00:00"}
+
+
+def test_invalid_date_is_rejected(redis, monkeypatch):
+    monkeypatch.setattr(routes.lab.hours, "read_hours_listing", _read_hours_listing)
+
+    assert client.get("/lab/hours/tomorrow").status_code == 400
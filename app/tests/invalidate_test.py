@@ -0,0 +1,114 @@
+from main import app
+
+from fastapi.testclient import TestClient
+
+from utils.auth import UserToken
+from utils.cache import (
+    _delete_prefix,
+    _escape_glob,
+    _function_key_prefixes,
+    _make_lock_name,
+    cache,
+    cache_lookup_with_fallback,
+    get_local_cache,
+    invalidate,
+    invalidate_tag,
+)
+from utils.config import get_settings
+from utils.user import get_current_user
+
+client = TestClient(app)
+
+
+@cache(tags=["test-printers"])
+def _printer_status(name):
+    return f"{name} is up"
+
+
+@cache(tags=["test-printers", "test-lab"])
+def _printer_count():
+    return 2
+
+
+@cache()
+def _untagged():
+    return "untagged"
+
+
+def test_keys_share_a_namespaced_prefix_per_function():
+    settings = get_settings()
+    prefix = _function_key_prefixes[_printer_status]
+
+    assert prefix == (
+        f"{settings.cache_namespace}:{settings.version}:{__name__}#_printer_status:"
+    )
+    assert _make_lock_name(prefix + "x") == (
+        f"{settings.cache_namespace}:lock:{prefix}x"
+    )
+
+
+def test_invalidate_deletes_every_result_of_a_function(redis):
+    _printer_status("logjam")
+    _printer_status("papercut")
+    _untagged()
+
+    assert invalidate(_printer_status) == 2
+    assert redis.keys(_function_key_prefixes[_printer_status] + "*") == []
+    assert len(redis.keys(_function_key_prefixes[_untagged] + "*")) == 1
+    assert len(get_local_cache()) == 1
+
+
+def test_invalidate_tag_deletes_every_tagged_function(redis):
+    _printer_status("logjam")
+    _printer_count()
+    _untagged()
+
+    assert invalidate_tag("test-printers") == 2
+    assert invalidate_tag("test-printers") == 0
+    assert invalidate_tag("no-such-tag") == 0
+    assert len(redis.keys()) == 1
+
+
+def test_delete_prefix_treats_glob_characters_literally(redis):
+    for key in ["a*b:1", "a*b:2", "axb:1", "a[b]:1"]:
+        cache_lookup_with_fallback(key, lambda: 1)
+
+    assert _escape_glob("a*b?[c]\\") == "a\\*b\\?\\[c\\]\\\\"
+    assert _delete_prefix("a*b:") == 2
+    assert _delete_prefix("a[b]") == 1
+    assert sorted(redis.keys()) == [b"axb:1"]
+
+
+def test_invalidate_route_requires_ocfroot(redis):
+    app.dependency_overrides[get_current_user] = lambda: _user_token(["ocfstaff"])
+    try:
+        response = client.post("/cache/invalidate/test-printers")
+    finally:
+        app.dependency_overrides.clear()
+
+    assert response.status_code == 403
+
+
+def test_invalidate_route_deletes_tagged_results(redis):
+    _printer_count()
+    app.dependency_overrides[get_current_user] = lambda: _user_token(["ocfroot"])
+    try:
+        response = client.post("/cache/invalidate/test-lab")
+    finally:
+        app.dependency_overrides.clear()
+
+    assert response.status_code == 200
+    assert response.json() == {"deleted": 1}
+    assert redis.keys() == []
+
+
+def _user_token(groups):
+    return UserToken(
+        {
+            "preferred_username": "waddles",
+            "email": "waddles@ocf.berkeley.edu",
+            "name": "Waddles",
+            "scope": "openid",
+            "groups": groups,
+        }
+    )
@@ -0,0 +1,32 @@
+from main import app
+
+from ocflib.org.meeting_hours import Meeting
+
+from fastapi.testclient import TestClient
+
+import routes.meetings as meetings
+
+client = TestClient(app)
+
+
+def test_next_meeting_may_be_cached_for_a_minute(monkeypatch):
+    meeting = Meeting(
+        day="Monday",
+        time="19:00-20:00",
+        subject="General Meeting",
+        short="gm",
+        irl=True,
+        virtual=False,
+    )
+    monkeypatch.setattr(meetings, "read_next_meeting", lambda: meeting)
+
+    response = client.get("/meetings/next")
+    assert response.status_code == 200
+    assert response.json()["subject"] == "General Meeting"
+    assert response.headers["cache-control"] == "public, max-age=60"
+
+
+def test_no_current_meeting(monkeypatch):
+    monkeypatch.setattr(meetings, "read_current_meeting", lambda: None)
+
+    assert client.get("/meetings/current").status_code == 204
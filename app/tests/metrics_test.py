@@ -0,0 +1,78 @@
+from main import app
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from utils.cache import cache
+from utils.metrics import MetricsMiddleware, cache_function_label
+
+
+def _sample(name, labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+def test_metrics_exposes_prometheus_text():
+    response = TestClient(app).get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == CONTENT_TYPE_LATEST
+    assert "# TYPE ocfapi_request_duration_seconds histogram" in response.text
+
+
+def test_middleware_labels_requests_by_route_template():
+    items = FastAPI()
+    items.add_middleware(MetricsMiddleware)
+
+    @items.get("/items/{item_id}")
+    def get_item(item_id: int):
+        return {"item_id": item_id}
+
+    def count(route, status):
+        return _sample(
+            "ocfapi_request_duration_seconds_count",
+            {"method": "GET", "route": route, "status": status},
+        )
+
+    found, missing = count("/items/{item_id}", "200"), count("unmatched", "404")
+    client = TestClient(items)
+    assert client.get("/items/1").status_code == 200
+    assert client.get("/items/2").status_code == 200
+    assert client.get("/nowhere").status_code == 404
+
+    assert count("/items/{item_id}", "200") == found + 2
+    assert count("unmatched", "404") == missing + 1
+    assert (
+        _sample(
+            "ocfapi_requests_in_progress",
+            {"method": "GET", "route": "/items/{item_id}"},
+        )
+        == 0
+    )
+
+
+@cache()
+def _double(x):
+    return x * 2
+
+
+def test_cache_lookups_are_counted_by_function_and_result(redis, monkeypatch):
+    label = cache_function_label(f"ocfapi:dev:{__name__}#_double:digest")
+
+    def count(result):
+        return _sample(
+            "ocfapi_cache_lookups_total", {"function": label, "result": result}
+        )
+
+    before = {result: count(result) for result in ("miss", "hit", "local_hit")}
+    assert _double(1) == 2
+    assert _double(1) == 2
+    # another worker, without this one's in-process cache, finds it in Redis
+    monkeypatch.setattr("utils.cache._local_cache", None)
+    assert _double(1) == 2
+
+    assert {result: count(result) - before[result] for result in before} == {
+        "miss": 1,
+        "hit": 1,
+        "local_hit": 1,
+    }
@@ -0,0 +1,80 @@
+from contextlib import nullcontext
+
+import pymysql
+import pytest
+
+from utils.mysql import ConnectionPool, PoolTimeout
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = False
+
+    def ping(self, reconnect):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def get_autocommit(self):
+        return True
+
+    def cursor(self):
+        return nullcontext(self)
+
+
+def make_pool(**kwargs):
+    connections = []
+
+    def connect():
+        connections.append(FakeConnection())
+        return connections[-1]
+
+    options = {"max_size": 2, "recycle": 60, "ping_interval": 10, "timeout": 0.01}
+    options.update(kwargs)
+    return ConnectionPool(connect, **options), connections
+
+
+def test_pool_reuses_connections():
+    pool, connections = make_pool()
+    for _ in range(3):
+        with pool.cursor():
+            pass
+
+    assert len(connections) == 1
+
+
+def test_pool_discards_broken_connections():
+    pool, connections = make_pool()
+    with pytest.raises(pymysql.OperationalError):
+        with pool.cursor():
+            raise pymysql.OperationalError()
+    with pool.cursor() as c:
+        assert c is connections[1]
+
+    assert connections[0].closed
+
+
+def test_pool_discards_connections_of_abandoned_queries():
+    pool, connections = make_pool()
+
+    def query():
+        with pool.cursor() as c:
+            yield c
+
+    rows = query()
+    next(rows)
+    # e.g. a streaming response whose client went away
+    rows.close()
+    with pool.cursor() as c:
+        assert c is connections[1]
+
+    assert connections[0].closed
+
+
+def test_pool_times_out_when_exhausted():
+    pool, _ = make_pool(max_size=1)
+    with pool.connection():
+        with pytest.raises(PoolTimeout):
+            with pool.connection():
+                pass
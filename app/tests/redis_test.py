@@ -0,0 +1,196 @@
+import asyncio
+import time
+
+import fakeredis
+import fakeredis.aioredis
+import pytest
+import redis
+import redis.asyncio
+
+import utils.redis
+from utils.redis import (
+    CircuitBreaker,
+    CircuitOpenError,
+    PoolExhaustedError,
+    _AsyncBlockingConnectionPool,
+    _AsyncBreakerRedis,
+    _BlockingConnectionPool,
+    _BreakerRedis,
+)
+
+
+@pytest.fixture
+def breaker(monkeypatch):
+    breaker = CircuitBreaker(failure_threshold=2, cooldown=0.05)
+    monkeypatch.setattr(utils.redis, "get_circuit_breaker", lambda: breaker)
+    return breaker
+
+
+def _open_then_wait(breaker):
+    for _ in range(breaker.failure_threshold):
+        assert breaker.allow()
+        breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    time.sleep(breaker.cooldown)
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+
+
+def test_breaker_opens_then_closes_after_a_successful_trial(breaker):
+    assert breaker.state == CircuitBreaker.CLOSED
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+
+    assert not breaker.allow()
+    assert breaker.stats()["short_circuits"] == 1
+
+    time.sleep(breaker.cooldown)
+    assert breaker.allow()
+    # only one trial at a time
+    assert not breaker.allow()
+
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow()
+
+
+def test_breaker_reopens_after_a_failed_trial(breaker):
+    _open_then_wait(breaker)
+
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def _reply(*args, **options):
+    raise redis.ResponseError("NOSCRIPT No matching script.")
+
+
+def _disconnect(*args, **options):
+    raise redis.ConnectionError("Connection refused")
+
+
+class _Cancelled(BaseException):
+    pass
+
+
+def _cancel(*args, **options):
+    raise _Cancelled()
+
+
+def test_client_short_circuits_while_open(breaker, monkeypatch):
+    monkeypatch.setattr(redis.Redis, "execute_command", _disconnect)
+    r = _BreakerRedis()
+
+    for _ in range(breaker.failure_threshold):
+        with pytest.raises(redis.ConnectionError):
+            r.get("key")
+    with pytest.raises(CircuitOpenError):
+        r.get("key")
+
+
+def test_client_counts_error_replies_as_healthy(breaker, monkeypatch):
+    _open_then_wait(breaker)
+    monkeypatch.setattr(redis.Redis, "execute_command", _reply)
+
+    with pytest.raises(redis.ResponseError):
+        _BreakerRedis().evalsha("sha", 0)
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_client_ends_trial_whatever_happens(breaker, monkeypatch):
+    _open_then_wait(breaker)
+    monkeypatch.setattr(redis.Redis, "execute_command", _cancel)
+
+    with pytest.raises(_Cancelled):
+        _BreakerRedis().get("key")
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    # the next call is let through as a new trial
+    assert breaker.allow()
+
+
+def test_only_the_trial_call_ends_the_trial(breaker, monkeypatch):
+    def outlive_the_cooldown(*args, **options):
+        # while this call runs, the breaker opens and another call is let
+        # through as its trial
+        _open_then_wait(breaker)
+        assert breaker.allow()
+        raise _Cancelled()
+
+    monkeypatch.setattr(redis.Redis, "execute_command", outlive_the_cooldown)
+
+    with pytest.raises(_Cancelled):
+        _BreakerRedis().get("key")
+    assert not breaker.allow()
+
+
+def test_exhausted_pool_is_not_a_failure(breaker):
+    r = _BreakerRedis(
+        connection_pool=_BlockingConnectionPool(
+            connection_class=fakeredis.FakeConnection,
+            server=fakeredis.FakeServer(),
+            max_connections=1,
+            timeout=0.01,
+        )
+    )
+    held = r.connection_pool.get_connection("GET")
+
+    for _ in range(breaker.failure_threshold):
+        with pytest.raises(PoolExhaustedError):
+            r.get("key")
+    assert breaker.state == CircuitBreaker.CLOSED
+
+    _open_then_wait(breaker)
+    with pytest.raises(PoolExhaustedError):
+        r.get("key")
+    # that trial told us nothing, so the next call is let through as another
+    r.connection_pool.release(held)
+    assert r.get("key") is None
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_async_exhausted_pool_is_not_a_failure(breaker):
+    async def call():
+        r = _AsyncBreakerRedis(
+            connection_pool=_AsyncBlockingConnectionPool(
+                connection_class=fakeredis.aioredis.FakeConnection,
+                server=fakeredis.FakeServer(),
+                max_connections=1,
+                timeout=0.01,
+            )
+        )
+        held = await r.connection_pool.get_connection("GET")
+        for _ in range(breaker.failure_threshold):
+            with pytest.raises(PoolExhaustedError):
+                await r.get("key")
+        await r.connection_pool.release(held)
+        assert await r.get("key") is None
+
+    asyncio.run(call())
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_async_client_ends_trial_when_cancelled(breaker, monkeypatch):
+    async def hang(*args, **options):
+        await asyncio.sleep(10)
+
+    _open_then_wait(breaker)
+    monkeypatch.setattr(redis.asyncio.Redis, "execute_command", hang)
+
+    async def call():
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(_AsyncBreakerRedis().get("key"), 0.01)
+
+    asyncio.run(call())
+    assert breaker.allow()
+
+
+def test_async_client_counts_error_replies_as_healthy(breaker, monkeypatch):
+    async def reply(*args, **options):
+        _reply()
+
+    _open_then_wait(breaker)
+    monkeypatch.setattr(redis.asyncio.Redis, "execute_command", reply)
+
+    with pytest.raises(redis.ResponseError):
+        asyncio.run(_AsyncBreakerRedis().get("key"))
+    assert breaker.state == CircuitBreaker.CLOSED
@@ -0,0 +1,149 @@
+import asyncio
+import time
+
+import pytest
+from main import app
+
+from fastapi.testclient import TestClient
+
+import routes.account.register as register
+from routes.account.register import _registration_status_events
+from utils.calnet import get_calnet_uid
+
+# describing a registration's result needs ocflib's account code, which
+# needs cracklib
+submission = pytest.importorskip("ocflib.account.submission")
+
+
+class FakeTasks:
+    """Scripted (state, result) updates for each task, like watch_task's."""
+
+    def __init__(self, updates):
+        self.updates = updates
+        self.log = []
+
+    async def watch_task(self, task_id, timeout):
+        self.log.append(("watch", task_id))
+        try:
+            for update in self.updates[task_id]:
+                yield update
+        finally:
+            self.log.append(("closed", task_id))
+
+
+def _events(monkeypatch, updates):
+    tasks = FakeTasks(updates)
+    monkeypatch.setattr(register, "watch_task", tasks.watch_task)
+
+    async def collect():
+        return [event async for event in _registration_status_events("validate")]
+
+    return asyncio.run(collect()), tasks.log
+
+
+def test_status_events_follow_the_handover(monkeypatch):
+    created = submission.NewAccountResponse(
+        status=submission.NewAccountResponse.CREATED, errors=[]
+    )
+    events, log = _events(
+        monkeypatch,
+        {
+            "validate": [("PENDING", None), ("SUCCESS", "create"), ("PENDING", None)],
+            "create": [
+                ("PENDING", None),
+                ("PROGRESS", {"status": ["Validated"]}),
+                ("SUCCESS", created),
+            ],
+        },
+    )
+
+    assert events == [
+        b'data: {"state":"pending","status":["Starting creation"]}\n\n',
+        b'data: {"state":"pending","status":["Starting creation","Validated"]}\n\n',
+        b'data: {"state":"success"}\n\n',
+    ]
+    # the validation task was no longer watched once it had handed over
+    assert log == [
+        ("watch", "validate"),
+        ("closed", "validate"),
+        ("watch", "create"),
+        ("closed", "create"),
+    ]
+
+
+def test_status_events_report_unknown_failures(monkeypatch):
+    events, log = _events(monkeypatch, {"validate": [("FAILURE", None)]})
+
+    assert events == [
+        b'data: {"state":"unknown","message":"'
+        + register._UNKNOWN_FAILURE_MESSAGE.encode()
+        + b'"}\n\n'
+    ]
+    assert log == [("watch", "validate"), ("closed", "validate")]
+
+
+def test_status_stream_route_sends_server_sent_events(monkeypatch):
+    tasks = FakeTasks({"validate": [("PENDING", None), ("FAILURE", None)]})
+    monkeypatch.setattr(register, "watch_task", tasks.watch_task)
+
+    response = TestClient(app).get(
+        "/account/register/status/stream", params={"task_id": "validate"}
+    )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert response.headers["cache-control"] == "no-cache"
+    assert response.text.count("data: ") == 2
+
+
+def test_existing_account_turned_away_without_other_lookups(monkeypatch):
+    search = pytest.importorskip("ocflib.account.search")
+    directory = pytest.importorskip("ocflib.ucb.directory")
+    lookups = []
+
+    async def no_groups(calnet_uid):
+        return {}
+
+    monkeypatch.setattr(search, "users_by_calnet_uid", lambda uid: ["oski"])
+    monkeypatch.setattr(search, "user_attrs_ucb", lookups.append)
+    monkeypatch.setattr(directory, "name_by_calnet_uid", lookups.append)
+    monkeypatch.setattr(register, "_get_groups_with_data", no_groups)
+    app.dependency_overrides[get_calnet_uid] = lambda: 1234567
+
+    try:
+        response = TestClient(app).post(
+            "/account/register",
+            json={
+                "account_association": 1234567,
+                "username": "oski",
+                "password": "hunter2",
+                "contact_email": "oski@berkeley.edu",
+            },
+        )
+    finally:
+        app.dependency_overrides.clear()
+
+    assert response.status_code == 403
+    assert response.json()["account"] == "oski"
+    assert lookups == []
+
+
+def test_group_lookup_errors_are_raised_in_group_order(monkeypatch):
+    groups = pytest.importorskip("ocflib.ucb.groups")
+
+    def group_by_oid(group_oid):
+        if group_oid == 1:
+            # the first group fails after the second
+            time.sleep(0.1)
+        raise ValueError(group_oid)
+
+    monkeypatch.setattr(
+        groups,
+        "groups_by_student_signat",
+        lambda uid: {1: {"name": "first"}, 2: {"name": "second"}},
+    )
+    monkeypatch.setattr(groups, "group_by_oid", group_by_oid)
+
+    with pytest.raises(ValueError) as exc_info:
+        asyncio.run(register._get_groups_with_data(1234567))
+    assert exc_info.value.args == (1,)
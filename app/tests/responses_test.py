@@ -0,0 +1,87 @@
+from datetime import datetime
+
+from fastapi import FastAPI
+from fastapi.encoders import jsonable_encoder
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+from fastapi.testclient import TestClient
+
+from utils.responses import (
+    ConditionalGetMiddleware,
+    PrerenderedJSONResponse,
+    TrustedJSONResponse,
+)
+
+app = FastAPI()
+app.add_middleware(ConditionalGetMiddleware)
+
+
+@app.get("/things")
+def get_things():
+    return PrerenderedJSONResponse(b'{"things":[]}', max_age=60)
+
+
+client = TestClient(app)
+
+# like main.app, where the CORS headers are added before the 304 replaces
+# the response
+cors_app = FastAPI()
+cors_app.add_middleware(
+    CORSMiddleware,
+    allow_origin_regex=r"https://www\.example\.com",
+    allow_credentials=True,
+)
+cors_app.add_middleware(ConditionalGetMiddleware)
+cors_app.get("/things")(get_things)
+cors_client = TestClient(cors_app)
+
+
+def test_prerendered_response_has_etag_and_cache_control():
+    response = client.get("/things")
+
+    assert response.status_code == 200
+    assert response.json() == {"things": []}
+    assert response.headers["etag"]
+    assert response.headers["cache-control"] == "public, max-age=60"
+
+
+def test_matching_if_none_match_is_not_modified():
+    etag = client.get("/things").headers["etag"]
+    response = client.get("/things", headers={"If-None-Match": f'"other", {etag}'})
+
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["etag"] == etag
+    assert response.headers["cache-control"] == "public, max-age=60"
+    assert "content-type" not in response.headers
+
+
+def test_not_modified_keeps_cors_headers():
+    origin = {"Origin": "https://www.example.com"}
+    etag = cors_client.get("/things", headers=origin).headers["etag"]
+    response = cors_client.get("/things", headers={"If-None-Match": etag, **origin})
+
+    assert response.status_code == 304
+    assert response.headers["access-control-allow-origin"] == origin["Origin"]
+    assert response.headers["access-control-allow-credentials"] == "true"
+
+
+def test_stale_if_none_match_gets_full_response():
+    response = client.get("/things", headers={"If-None-Match": '"other"'})
+
+    assert response.status_code == 200
+    assert response.json() == {"things": []}
+
+
+def test_trusted_response_matches_default_encoding():
+    content = {
+        "start": datetime(2023, 10, 1, 12, 30),
+        "end": None,
+        "hosts": ["a", "b"],
+        "count": 3,
+    }
+
+    assert (
+        TrustedJSONResponse(content).body
+        == JSONResponse(jsonable_encoder(content)).body
+    )
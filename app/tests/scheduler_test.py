@@ -0,0 +1,74 @@
+import asyncio
+import time
+
+import utils.scheduler
+from utils.cache import AsyncPeriodicFunction, PeriodicFunction, _make_lock_name
+from utils.scheduler import _refresh_forever
+
+calls = []
+
+
+def _count_calls():
+    calls.append(1)
+    return len(calls)
+
+
+def _periodic(period=60):
+    calls.clear()
+    return PeriodicFunction(function=_count_calls, period=period, ttl=period * 2)
+
+
+def test_refresh_skipped_while_another_worker_holds_the_lock(redis):
+    pf = _periodic()
+    lock = redis.lock(_make_lock_name(pf.function_call_key), timeout=10)
+    assert lock.acquire(blocking=False)
+
+    assert pf.refresh_if_due() == pf.period
+    assert calls == []
+
+
+def test_refresh_skipped_until_period_elapses(redis):
+    pf = _periodic(period=0.2)
+    pf.update()
+
+    delay = pf.refresh_if_due()
+    assert 0 < delay <= pf.period
+    assert calls == [1]
+
+    time.sleep(pf.period)
+    assert pf.refresh_if_due() == pf.period
+    assert calls == [1, 1]
+    # the lock was released, so the next worker can take it
+    assert not redis.exists(_make_lock_name(pf.function_call_key))
+
+
+def test_refresh_runs_when_redis_is_down(redis_down):
+    pf = _periodic()
+
+    assert pf.refresh_if_due() == pf.period
+    assert calls == [1]
+    # the in-process cache was still filled
+    assert pf.result() == 1
+    assert calls == [1]
+
+
+def test_refresh_forever_survives_failures(redis, monkeypatch):
+    monkeypatch.setattr(utils.scheduler, "_MIN_SLEEP", 0)
+    attempts = []
+
+    async def flaky():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise RuntimeError("first refresh fails")
+        return len(attempts)
+
+    pf = AsyncPeriodicFunction(function=flaky, period=0.01, ttl=1)
+
+    async def run():
+        task = asyncio.ensure_future(_refresh_forever(pf))
+        await asyncio.sleep(0.2)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    asyncio.run(run())
+    assert len(attempts) >= 2
@@ -0,0 +1,210 @@
+import time
+from contextlib import nullcontext
+from ipaddress import ip_address
+from types import SimpleNamespace
+
+import fakeredis
+import pytest
+import redis
+
+from ocflib.infra.net import ipv4_to_ipv6
+
+from fastapi import HTTPException
+
+import routes.lab.session_tracking as session_tracking
+from routes.lab.session_tracking import (
+    _INDEX_BUILT_AT,
+    DesktopIndex,
+    LogSessionInput,
+    _build_desktop_index,
+    _get_desktop_index,
+    _rebuild_session_index,
+    _refresh_sessions,
+    _session_exists,
+    _session_index_key,
+    log_session,
+)
+from utils.config import get_settings
+
+
+class FakeSessionTable:
+    """Answers the session tracking queries from a dict of open sessions."""
+
+    def __init__(self, open_sessions):
+        self.open_sessions = open_sessions
+        self.queries = []
+        self._rows = []
+
+    def cursor(self):
+        return nullcontext(self)
+
+    def execute(self, query, args=()):
+        self.queries.append(query.split()[0])
+        if "COUNT(*)" in query:
+            host, user = args
+            self._rows = [{"count": int(self.open_sessions.get(host) == user)}]
+        elif query.startswith("SELECT"):
+            self._rows = [
+                {"host": host, "user": user}
+                for host, user in self.open_sessions.items()
+            ]
+        else:
+            pairs = list(zip(args[::2], args[1::2]))
+            return sum(self.open_sessions.get(host) == user for host, user in pairs)
+
+    def fetchone(self):
+        return self._rows[0]
+
+    def __iter__(self):
+        return iter(self._rows)
+
+
+@pytest.fixture
+def index(monkeypatch):
+    r = fakeredis.FakeRedis()
+    monkeypatch.setattr(session_tracking, "get_redis_connection", lambda: r)
+    return r
+
+
+@pytest.fixture
+def table(monkeypatch):
+    table = FakeSessionTable({"tornado": "waddles"})
+    monkeypatch.setattr(session_tracking, "get_pool", lambda db: table)
+    return table
+
+
+def test_session_exists_from_index(index, table):
+    _rebuild_session_index()
+    table.queries.clear()
+
+    assert _session_exists("tornado", "waddles")
+    assert table.queries == []
+
+
+def test_session_missing_from_index_and_table(index, table):
+    _rebuild_session_index()
+    table.queries.clear()
+
+    assert not _session_exists("tornado", "someone-else")
+    assert not _session_exists("avalanche", "waddles")
+    assert table.queries == ["SELECT", "SELECT"]
+
+
+def test_stale_index_is_rebuilt(index, table):
+    _rebuild_session_index()
+    old = time.time() - get_settings().session_index_ttl - 1
+    index.hset(_session_index_key(), _INDEX_BUILT_AT, old)
+    table.open_sessions["avalanche"] = "pinguino"
+
+    assert _session_exists("avalanche", "pinguino")
+    assert index.hget(_session_index_key(), "avalanche") == b"pinguino"
+    assert float(index.hget(_session_index_key(), _INDEX_BUILT_AT)) > old
+
+
+def test_session_missing_from_index_is_found_in_table(index, table):
+    # e.g. a rebuild on another worker overwrote the hset for a new session
+    _rebuild_session_index()
+    table.open_sessions["avalanche"] = "pinguino"
+
+    assert _session_exists("avalanche", "pinguino")
+    # the index was repaired, so the next heartbeat doesn't need the table
+    table.queries.clear()
+    assert _session_exists("avalanche", "pinguino")
+    assert table.queries == []
+
+
+def test_sessions_closed_behind_our_back_invalidate_index(index, table):
+    _rebuild_session_index()
+    del table.open_sessions["tornado"]
+
+    _refresh_sessions({"tornado": "waddles"})
+    assert not index.hexists(_session_index_key(), _INDEX_BUILT_AT)
+    assert not _session_exists("tornado", "waddles")
+
+
+def test_session_exists_without_redis(monkeypatch, table):
+    def unreachable():
+        raise redis.ConnectionError()
+
+    monkeypatch.setattr(session_tracking, "get_redis_connection", unreachable)
+
+    assert _session_exists("tornado", "waddles")
+    assert not _session_exists("tornado", "someone-else")
+
+
+_DESKTOP_V4 = ip_address("169.229.226.101")
+
+
+def test_desktop_index_finds_both_addresses_of_desktops(redis, monkeypatch):
+    monkeypatch.setattr(
+        "ocflib.infra.hosts.hosts_by_filter",
+        lambda ldap_filter: [
+            {"cn": ["tornado"], "ipHostNumber": [str(_DESKTOP_V4)]},
+        ],
+    )
+    desktops = _build_desktop_index()
+
+    assert len(desktops) == 1
+    assert desktops.lookup(_DESKTOP_V4) == "tornado.ocf.berkeley.edu"
+    assert desktops.lookup(ipv4_to_ipv6(_DESKTOP_V4)) == "tornado.ocf.berkeley.edu"
+    assert desktops.lookup(ip_address("169.229.226.102")) is None
+
+
+def test_last_desktop_index_is_used_when_ldap_fails(monkeypatch):
+    def unreachable():
+        raise ConnectionError("LDAP is down")
+
+    monkeypatch.setattr(session_tracking, "_build_desktop_index", unreachable)
+    monkeypatch.setattr(session_tracking, "_last_desktop_index", None)
+    with pytest.raises(ConnectionError):
+        _get_desktop_index()
+
+    last = DesktopIndex()
+    monkeypatch.setattr(session_tracking, "_last_desktop_index", last)
+    assert _get_desktop_index() is last
+
+
+@pytest.fixture
+def desktops(monkeypatch):
+    desktops = DesktopIndex()
+    desktops.add(_DESKTOP_V4, "tornado.ocf.berkeley.edu")
+    desktops.add(ipv4_to_ipv6(_DESKTOP_V4), "tornado.ocf.berkeley.edu")
+    monkeypatch.setattr(session_tracking, "_get_desktop_index", lambda: desktops)
+    return desktops
+
+
+def _log_session(ip, state="cleanup", user=None):
+    request = SimpleNamespace(client=SimpleNamespace(host=ip))
+    return log_session(LogSessionInput(state=state, user=user), request)
+
+
+def test_log_session_from_outside_the_ocf_is_unauthorized(desktops):
+    with pytest.raises(HTTPException) as exc_info:
+        _log_session("8.8.8.8")
+    assert exc_info.value.status_code == 401
+
+
+def test_log_session_from_a_non_desktop_is_a_bad_request(desktops):
+    with pytest.raises(HTTPException) as exc_info:
+        _log_session("169.229.226.102")
+    assert exc_info.value.status_code == 400
+    assert "does not belong to a desktop" in exc_info.value.detail
+
+
+def test_log_session_with_a_bad_session_is_a_bad_request(desktops, monkeypatch):
+    def reject(host, user):
+        raise ValueError("bad user")
+
+    monkeypatch.setattr(session_tracking, "_session_exists", lambda host, user: False)
+    monkeypatch.setattr(session_tracking, "_new_session", reject)
+    with pytest.raises(HTTPException) as exc_info:
+        _log_session(str(_DESKTOP_V4), state="active", user="waddles")
+    assert exc_info.value.status_code == 400
+
+
+def test_log_session_from_a_desktop(desktops, monkeypatch):
+    closed = []
+    monkeypatch.setattr(session_tracking, "_close_sessions", closed.append)
+
+    assert _log_session(str(ipv4_to_ipv6(_DESKTOP_V4))).status_code == 204
+    assert closed == ["tornado.ocf.berkeley.edu"]
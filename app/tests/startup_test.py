@@ -0,0 +1,21 @@
+from benchmarks.imports import cold_import_time, import_times
+
+from utils.config import get_settings
+
+# dependencies only some routes need, which shouldn't slow down worker startup
+DEFERRED_MODULES = {"celery", "Crypto", "cracklib", "ldap3", "paramiko", "pymysql"}
+
+
+def test_cold_import_within_budget():
+    budget = get_settings().import_time_budget
+    # best of a few runs, so that a briefly busy machine doesn't fail the test
+    elapsed = min(cold_import_time("main:app") for _ in range(3))
+    assert elapsed <= budget, (
+        f"importing main:app took {elapsed:.2f}s, over the {budget:.2f}s budget; "
+        "run `python -m benchmarks.imports` to see why"
+    )
+
+
+def test_heavy_dependencies_not_imported_at_startup():
+    imported = {t.module.partition(".")[0] for t in import_times("main:app")}
+    assert not imported & DEFERRED_MODULES
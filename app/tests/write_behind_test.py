@@ -0,0 +1,42 @@
+import pytest
+
+from utils.write_behind import WriteBehindBuffer, write_behind_buffers
+
+
+def test_buffer_coalesces_writes_per_key():
+    batches = []
+    buffer = WriteBehindBuffer("test", batches.append, interval=1)
+    buffer.put("a", 1)
+    buffer.put("b", 2)
+    buffer.put("a", 3)
+    buffer.discard("b")
+
+    assert buffer.flush() == 1
+    assert batches == [{"a": 3}]
+    assert buffer.flush() == 0
+
+
+def test_buffer_keeps_writes_that_failed_to_flush():
+    def fail(batch):
+        buffer.put("a", 2)
+        raise RuntimeError()
+
+    buffer = WriteBehindBuffer("test", fail, interval=1)
+    buffer.put("a", 1)
+    buffer.put("b", 1)
+    with pytest.raises(RuntimeError):
+        buffer.flush()
+
+    assert buffer.get("a") == 2
+    assert buffer.get("b") == 1
+
+
+def test_buffers_are_flushed_in_background_only_once_registered():
+    buffer = WriteBehindBuffer("test", lambda batch: None, interval=1)
+    assert buffer not in write_behind_buffers
+
+    assert buffer.register() is buffer
+    try:
+        assert buffer in write_behind_buffers
+    finally:
+        write_behind_buffers.remove(buffer)
@@ -1,37 +1,88 @@
 # Keycloak setup
 import logging
-from typing import List, cast
+import threading
+import time
+from functools import lru_cache
+from hashlib import blake2b
+from typing import Dict, List, Optional, cast
 
 import requests
-from jose import jwt
+from jose import jwk, jwt
+from jose.backends.base import Key
 from typing_extensions import TypedDict
 
 from fastapi.security import OAuth2AuthorizationCodeBearer
 
+from utils.cache import LocalCache
+from utils.config import get_settings
+from utils.metrics import TOKEN_CACHE_LOOKUPS
+
 keycloak_url = "https://auth.ocf.berkeley.edu/auth/"
 realm_name = "ocf"
 client_id = "ocfapi"
+jwks_url = f"{keycloak_url}realms/{realm_name}/protocol/openid-connect/certs"
+
+_logger = logging.getLogger(__name__)
+
+
+class KeySet:
+    """Keycloak's public signing keys, fetched from its JWKS endpoint.
+
+    Keys are only fetched when a token needs verifying, so the API can start
+    (and tests can run) without Keycloak being reachable. They're cached by
+    key ID for `ttl` seconds; if Keycloak can't be reached after that, the
+    keys we already have keep being used. A token signed by a key we don't
+    know about (e.g. because Keycloak rotated its keys) triggers a refetch,
+    but at most once every `min_refetch_interval` seconds, so that garbage
+    tokens can't make us hammer Keycloak.
+    """
+
+    def __init__(self, url: str, ttl: float, min_refetch_interval: float) -> None:
+        self.url = url
+        self.ttl = ttl
+        self.min_refetch_interval = min_refetch_interval
+        self._keys: Dict[str, Key] = {}
+        self._fetched_at = -float("inf")
+        self._lock = threading.Lock()
+
+    def get(self, kid: str) -> Key:
+        with self._lock:
+            age = time.monotonic() - self._fetched_at
+            if age > self.ttl or (
+                kid not in self._keys and age > self.min_refetch_interval
+            ):
+                self._refresh()
+
+            try:
+                return self._keys[kid]
+            except KeyError:
+                raise KeyError(f"Unknown signing key {kid!r}") from None
+
+    def _refresh(self) -> None:
+        # even if this fails, don't try again right away
+        self._fetched_at = time.monotonic()
+        try:
+            response = requests.get(self.url, timeout=5)
+            response.raise_for_status()
+            self._keys = {
+                key["kid"]: jwk.construct(key, key.get("alg", "RS256"))
+                for key in response.json()["keys"]
+                if key.get("use", "sig") == "sig"
+            }
+        except Exception:
+            _logger.exception(f"Unable to fetch Keycloak signing keys from {self.url}")
+
+
+@lru_cache()
+def get_key_set() -> KeySet:
+    settings = get_settings()
+    return KeySet(
+        jwks_url,
+        ttl=settings.keycloak_jwks_ttl,
+        min_refetch_interval=settings.keycloak_jwks_min_refetch_interval,
+    )
 
 
-class RealmMetadata(TypedDict):
-    realm: str
-    public_key: str
-
-
-realm_metadata_request = requests.get(f"{keycloak_url}realms/{realm_name}")
-if not realm_metadata_request.ok:
-    logging.fatal(realm_metadata_request.text)
-    raise Exception("Unable to fetch Keycloak realm metadata")
-
-realm_metadata: RealmMetadata = realm_metadata_request.json()
-raw_public_key = realm_metadata.get("public_key")
-if not raw_public_key:
-    raise Exception("`public_key` not present in realm metadata")
-
-KEYCLOAK_PUBLIC_KEY = (
-    "-----BEGIN PUBLIC KEY-----\n" + raw_public_key + "\n-----END PUBLIC KEY-----"
-)
-
 oauth2_scheme = OAuth2AuthorizationCodeBearer(
     authorizationUrl=f"{keycloak_url}realms/{realm_name}/protocol/openid-connect/auth",
     tokenUrl=f"{keycloak_url}realms/{realm_name}/protocol/openid-connect/token",
@@ -98,12 +149,55 @@ class UserToken:
         self.raw = raw_token
 
 
+@lru_cache()
+def _get_token_cache() -> LocalCache:
+    return LocalCache(get_settings().token_cache_max_entries)
+
+
+def _token_cache_key(token: str) -> bytes:
+    return blake2b(token.encode(), digest_size=16).digest()
+
+
+def get_cached_token(token: str) -> Optional[UserToken]:
+    """Return the user for an already verified token, if we have it cached."""
+    try:
+        user_token = _get_token_cache().get(_token_cache_key(token))
+    except KeyError:
+        TOKEN_CACHE_LOOKUPS.labels("miss").inc()
+        return None
+
+    TOKEN_CACHE_LOOKUPS.labels("hit").inc()
+    return user_token
+
+
 def decode_token(token: str) -> UserToken:
+    """Verify a bearer token and return the user it belongs to.
+
+    Verifying the signature is expensive, and clients send the same token
+    with every request until it expires, so verified tokens are remembered
+    (by a digest of the token, never the token itself) until their `exp`.
+
+    Verifying may have to fetch Keycloak's signing keys, so from the event
+    loop, use get_cached_token and only call verify_token in a thread.
+    """
+    return get_cached_token(token) or verify_token(token)
+
+
+def verify_token(token: str) -> UserToken:
+    """Verify a bearer token (ignoring the cache) and cache the result."""
+    user_token = _verify_token(token)
+    _get_token_cache().set(
+        _token_cache_key(token), user_token, ttl=user_token.raw["exp"] - time.time()
+    )
+    return user_token
+
+
+def _verify_token(token: str) -> UserToken:
     raw_user_token = cast(
         RawUserToken,
         jwt.decode(
             token,
-            key=KEYCLOAK_PUBLIC_KEY,
+            key=get_key_set().get(jwt.get_unverified_header(token)["kid"]),
             audience=client_id,
             algorithms=["RS256"],
             options={"verify_aud": False, "require_exp": True},
@@ -1,16 +1,27 @@
+import asyncio
+import logging
 from collections import namedtuple
-from typing import Any, Dict, List
+from functools import lru_cache
+from typing import Any, Dict, Iterator, List, Optional
 from xml.etree import ElementTree as etree
 
 import dateutil.parser
-import requests
+import httpx
 from cached_property import cached_property
-from requests.exceptions import RequestException
 
-from utils.cache import periodic
+_logger = logging.getLogger(__name__)
 
 _namespaces = {"atom": "http://www.w3.org/2005/Atom"}
 
+_FEED_URL = "https://status.ocf.berkeley.edu/feeds/posts/default"
+_ENTRY_TAG = "{http://www.w3.org/2005/Atom}entry"
+
+# Blogger is hella flakey, so we retry with exponential backoff (starting at
+# _RETRY_DELAY seconds), but give up after _DEADLINE seconds in total
+_ATTEMPT_TIMEOUT = 2
+_RETRY_DELAY = 0.25
+_DEADLINE = 8
+
 
 class Post(
     namedtuple(
@@ -52,33 +63,83 @@ class Post(
         return attrs
 
 
-@periodic(60)
-def get_blog_posts() -> List[Any]:
+class _Feed:
+    """What we last got from the feed, to make conditional requests with."""
+
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    posts: Optional[List[Any]] = None
+
+
+_feed = _Feed()
+
+
+@lru_cache()
+def _get_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(timeout=_ATTEMPT_TIMEOUT)
+
+
+async def get_blog_posts() -> List[Any]:
     """Parse the beautiful OCF status blog atom feed into a list of Posts.
 
-    Unfortunately Blogger is hella flakey so we use it inside a loop and fail
-    silently if it doesn't succeed.
+    Unfortunately Blogger is hella flakey so we retry for a while, and if it
+    still doesn't succeed we fail silently, returning the last posts we got.
+
+    This isn't cached itself; see routes/announce.py.
     """
-    for _ in range(5):
+    try:
+        return await asyncio.wait_for(_fetch_posts(), _DEADLINE)
+    except (httpx.HTTPError, etree.ParseError, asyncio.TimeoutError) as e:
+        _logger.warning(f"Unable to fetch blog posts: {e!r}")
+        return _feed.posts if _feed.posts is not None else []
+
+
+async def _fetch_posts() -> List[Any]:
+    delay = _RETRY_DELAY
+    while True:
         try:
-            tree = etree.fromstring(
-                requests.get(
-                    "https://status.ocf.berkeley.edu/feeds/posts/default",
-                    timeout=2,
-                ).content,
-            )
-        except RequestException:
-            pass
-        else:
-            break
-    else:
-        # fail silently
-        return []
-
-    return [
-        Post.from_element(post)
-        for post in tree.findall(
-            ".//atom:entry",
-            namespaces=_namespaces,
-        )
-    ]
+            return await _fetch_posts_once()
+        except (httpx.HTTPError, etree.ParseError) as e:
+            _logger.debug(f"Unable to fetch blog posts, retrying in {delay}s: {e!r}")
+            await asyncio.sleep(delay)
+            delay *= 2
+
+
+async def _fetch_posts_once() -> List[Any]:
+    """Fetch the feed, parsing posts as they arrive.
+
+    If we already have the feed's posts, we ask for it conditionally, so an
+    unchanged feed is just a 304 response.
+    """
+    headers = {}
+    if _feed.posts is not None:
+        if _feed.etag:
+            headers["If-None-Match"] = _feed.etag
+        if _feed.last_modified:
+            headers["If-Modified-Since"] = _feed.last_modified
+
+    async with _get_client().stream("GET", _FEED_URL, headers=headers) as response:
+        if response.status_code == httpx.codes.NOT_MODIFIED and _feed.posts is not None:
+            return _feed.posts
+        response.raise_for_status()
+
+        parser = etree.XMLPullParser(events=("end",))
+        posts = []
+        async for chunk in response.aiter_bytes():
+            parser.feed(chunk)
+            posts.extend(_read_posts(parser))
+        parser.close()
+        posts.extend(_read_posts(parser))
+
+    _feed.etag = response.headers.get("ETag")
+    _feed.last_modified = response.headers.get("Last-Modified")
+    _feed.posts = posts
+    return posts
+
+
+def _read_posts(parser: etree.XMLPullParser) -> Iterator[Any]:
+    for _, element in parser.read_events():
+        if element.tag == _ENTRY_TAG:
+            yield Post.from_element(element)
+            # we're done with this entry, so don't keep it around
+            element.clear()
@@ -1,38 +1,203 @@
 """Caching decorators for ocfweb."""
+import asyncio
+import hashlib
 import logging
 import math
-from collections import namedtuple
+import re
+import threading
+import time
+from collections import OrderedDict, namedtuple
 from datetime import datetime
+from functools import partial
 from itertools import chain
-from typing import Any, Callable, Dict, Hashable, Iterable, Optional, Tuple
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    Hashable,
+    Iterable,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Type,
+)
 
 from cached_property import cached_property
 
+from fastapi.concurrency import run_in_threadpool
+
+from utils.codec import CodecError, get_codec
 from utils.config import get_settings
-from utils.redis import get_redis_connection
+from utils.metrics import PERIODIC_DURATION, count_cache_lookup
+from utils.redis import (
+    CircuitOpenError,
+    get_async_redis_connection,
+    get_redis_connection,
+)
 
 _logger = logging.getLogger(__name__)
 
+# how often to check whether another worker has finished computing a key
+_FILL_POLL_INTERVAL = 0.05
+
+# how many keys to ask for (and delete) at a time when invalidating
+_SCAN_COUNT = 500
+
+
+class LocalCache:
+    """A bounded, in-process LRU cache with a per-entry expiry time.
+
+    Each worker process gets its own instance, which sits in front of Redis
+    so that hot keys can be served without a network round trip. Entries are
+    evicted least-recently-used first once `max_entries` is reached.
+
+    Expired entries are kept around (until evicted) so that they can still be
+    served as stale values while someone else recomputes them.
+    """
+
+    def __init__(self, max_entries: int) -> None:
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Any:
+        """Return the value for a key, raising KeyError if missing or expired."""
+        with self._lock:
+            try:
+                expires_at, value = self._entries[key]
+            except KeyError:
+                self.misses += 1
+                raise
+
+            if expires_at <= time.monotonic():
+                self.expirations += 1
+                self.misses += 1
+                raise KeyError(key)
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def get_stale(self, key: Hashable) -> Any:
+        """Return the value for a key even if it has expired.
+
+        Raises KeyError only if the key isn't (or is no longer) stored at all.
+        """
+        with self._lock:
+            expires_at, value = self._entries[key]
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float]) -> None:
+        """Store a value, evicting the least recently used entries if full."""
+        if self.max_entries <= 0 or (ttl is not None and ttl <= 0):
+            return
+
+        expires_at = math.inf if ttl is None else time.monotonic() + ttl
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key: Hashable) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def delete_prefix(self, prefix: str) -> None:
+        """Delete every (string) key starting with a prefix."""
+        with self._lock:
+            for key in [
+                key
+                for key in self._entries
+                if isinstance(key, str) and key.startswith(prefix)
+            ]:
+                del self._entries[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """Return counters describing how well the cache is doing."""
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+
+_local_cache: Optional[LocalCache] = None
+
+
+def get_local_cache() -> LocalCache:
+    """Return this worker's in-process cache, creating it on first use."""
+    global _local_cache
+    if _local_cache is None:
+        _local_cache = LocalCache(get_settings().local_cache_max_entries)
+    return _local_cache
+
+
+def _local_ttl(ttl: Optional[float], local_ttl: Optional[float]) -> Optional[float]:
+    """Return how long an entry may live in the in-process cache.
+
+    Redis is the source of truth shared between workers, so we never keep a
+    local copy around for longer than `settings.local_cache_ttl` (or the
+    Redis ttl, if that is shorter); otherwise a refresh performed by another
+    worker would go unnoticed here.
+    """
+    candidates = [get_settings().local_cache_ttl]
+    if ttl is not None:
+        candidates.append(ttl)
+    if local_ttl is not None:
+        candidates.append(local_ttl)
+    return min(candidates)
+
+
+def _redis_key(key: Hashable) -> str:
+    """Return the name under which a cache key is stored in Redis."""
+    return str(key)
+
 
 def cache_lookup(key: Hashable) -> Any:
     """Look up a key in the cache, raising KeyError if it's a miss."""
-    # The "get" method returns `None` both for cached values of `None`,
-    # and keys which aren't in the cache.
-    #
-    # The recommended workaround is using a sentinel as a default
-    # return value for when a key is missing. This allows us to still
-    # cache functions which return None.
-    cache_miss_sentinel: Dict[Any, Any] = {}
     try:
         r = get_redis_connection()
-        # "Hashable" is incompatible with "str"
-        retval = r.get(key) or cache_miss_sentinel  # type: ignore
+        data = r.get(_redis_key(key))
     except Exception:
-        retval = cache_miss_sentinel
+        count_cache_lookup(key, "error")
+        data = None
+
+    return _decode_lookup(key, data)
+
 
-    is_hit = retval is not cache_miss_sentinel
+def _decode_lookup(key: Hashable, data: Optional[bytes]) -> Any:
+    """Decode a value fetched from Redis, raising KeyError if it's a miss."""
+    # The "get" method returns `None` only for keys which aren't in the
+    # cache; cached values of `None` are encoded like anything else, so we
+    # can still cache functions which return None.
+    if data is not None:
+        try:
+            retval = get_codec().decode(data)
+        except CodecError:
+            _logger.error(f'Unable to decode cached value for "{key}"', exc_info=True)
+            count_cache_lookup(key, "error")
+            data = None
 
-    if not is_hit:
+    if data is None:
         _logger.debug(f"Cache miss: {key}")
         raise KeyError(f'Key "{key}" is not in the cache.')
     else:
@@ -45,12 +210,19 @@ def cache_lookup_with_fallback(
     fallback: Callable[[], Any],
     ttl: Optional[int] = None,
     force_miss: bool = False,
+    local_ttl: Optional[float] = None,
 ) -> Any:
     """Look up a key in the cache, falling back to a function if it's a miss.
 
-    We first check if the key is in the cache, and if so, return it. If not, we
-    evaluate the fallback function, stick the result in the cache for next
-    time, and then return the result.
+    We first check if the key is in this worker's in-process cache, then in
+    Redis, and if either has it, return it. If not, we evaluate the fallback
+    function, stick the result in both caches for next time, and then return
+    the result.
+
+    Misses are single-flighted: concurrent callers in this process share one
+    evaluation of the fallback, and a short-lived Redis lock keeps other
+    workers from evaluating it at the same time (they get the stale value or
+    wait for the winner's instead).
 
     In DEBUG mode, we still retrieve and store from the cache (in order to
     exercise as much of the code as possible), but we always force a miss.
@@ -61,37 +233,442 @@ def cache_lookup_with_fallback(
     :param ttl: the ttl to use (optional, if not specified, keys never expire)
     :param force_miss: whether to force a cache miss (and thus evaluate the
                        fallback and store it in the cache)
+    :param local_ttl: the longest time the value may be served from the
+                      in-process cache without consulting Redis (optional)
     """
+    local_cache = get_local_cache()
+    local_ttl = _local_ttl(ttl, local_ttl)
+
     try:
         if force_miss:
             raise KeyError("Forcing miss as requested.")
 
-        result = cache_lookup(key)
-
         if get_settings().debug:
+            result = cache_lookup(key)
             _logger.debug(f'Cache hit for "{key}", but forcing miss due to DEBUG.')
             raise KeyError("Forcing miss due to DEBUG mode.")
 
+        try:
+            result = local_cache.get(key)
+            count_cache_lookup(key, "local_hit")
+            return result
+        except KeyError:
+            pass
+
+        result = cache_lookup(key)
+        count_cache_lookup(key, "hit")
+        local_cache.set(key, result, local_ttl)
+        return result
+    except KeyError:
+        if not force_miss:
+            count_cache_lookup(key, "miss")
+
+        if force_miss or get_settings().debug:
+            return _compute_and_store(key, fallback, ttl, local_ttl)
+
+        return _single_flight(
+            key,
+            lambda: _fill(key, fallback, ttl, local_ttl),
+        )
+
+
+def _compute_and_store(
+    key: Hashable,
+    fallback: Callable[[], Any],
+    ttl: Optional[int],
+    local_ttl: Optional[float],
+) -> Any:
+    """Evaluate the fallback and store its result in both cache tiers."""
+    result = fallback()
+    get_local_cache().set(key, result, local_ttl)
+
+    data = _encode_for_store(key, result)
+    if data is None:
         return result
+
+    try:
+        r = get_redis_connection()
+        r.set(_redis_key(key), data, _redis_ttl(ttl))
+    except Exception as e:
+        if not isinstance(e, CircuitOpenError):
+            _logger.warning(f'Unable to store "{key}" in Redis: {e}')
+        count_cache_lookup(key, "error")
+
+    return result
+
+
+def _encode_for_store(key: Hashable, result: Any) -> Optional[bytes]:
+    """Encode a value for Redis, logging (and returning None) on failure."""
+    try:
+        return get_codec().encode(result)
+    except CodecError:
+        _logger.error(f'Unable to encode value for "{key}"', exc_info=True)
+        count_cache_lookup(key, "error")
+        return None
+
+
+def _redis_ttl(ttl: Optional[float]) -> Optional[int]:
+    # Redis only accepts whole seconds
+    return math.ceil(ttl) if ttl is not None else None
+
+
+class _Flight:
+    """A computation of a cache key that other threads can wait on."""
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+_flights: Dict[Hashable, _Flight] = {}
+_flights_lock = threading.Lock()
+
+
+def _single_flight(key: Hashable, fn: Callable[[], Any]) -> Any:
+    """Call fn, unless another thread in this process is already doing so for
+    the same key, in which case wait for and share its result instead."""
+    with _flights_lock:
+        flight = _flights.get(key)
+        is_leader = flight is None
+        if flight is None:
+            flight = _flights[key] = _Flight()
+
+    if not is_leader:
+        flight.done.wait()
+        if flight.error is not None:
+            raise flight.error
+        return flight.result
+
+    try:
+        flight.result = fn()
+    except BaseException as e:
+        flight.error = e
+        raise
+    finally:
+        with _flights_lock:
+            del _flights[key]
+        flight.done.set()
+
+    return flight.result
+
+
+def _fill(
+    key: Hashable,
+    fallback: Callable[[], Any],
+    ttl: Optional[int],
+    local_ttl: Optional[float],
+    usable: Optional[Callable[[Any], bool]] = None,
+) -> Any:
+    """Compute a missing key, making sure only one worker does so at a time.
+
+    The worker that gets the Redis lock evaluates the fallback. Everyone else
+    serves the stale value from their in-process cache if they have one, or
+    otherwise waits (up to the lock timeout) for the winner's value to show
+    up in Redis. If Redis is unavailable, we just evaluate the fallback.
+
+    If given, `usable` decides whether a value that is already cached may be
+    served instead of computing a new one (by default, any value will do).
+    """
+    lock_timeout = get_settings().cache_fill_lock_timeout
+    try:
+        lock = get_redis_connection().lock(
+            _make_lock_name(key),
+            timeout=lock_timeout,
+        )
+        acquired = lock.acquire(blocking=False)
+    except Exception:
+        return _compute_and_store(key, fallback, ttl, local_ttl)
+
+    if acquired:
+        try:
+            # another worker may have filled it just before we got the lock
+            return _accept(key, cache_lookup(key), local_ttl, usable)
+        except KeyError:
+            return _compute_and_store(key, fallback, ttl, local_ttl)
+        finally:
+            try:
+                lock.release()
+            except Exception:
+                pass
+
+    try:
+        return _serve_stale(key, usable)
     except KeyError:
-        result = fallback()
+        pass
+
+    deadline = time.monotonic() + lock_timeout
+    while time.monotonic() < deadline:
+        time.sleep(_FILL_POLL_INTERVAL)
         try:
-            r = get_redis_connection()
-            # "Hashable" is incompatible with "str"
-            r.set(key, result, ttl)  # type: ignore
-        except Exception:
+            return _accept(key, cache_lookup(key), local_ttl, usable)
+        except KeyError:
+            try:
+                if not lock.locked():
+                    # the winner gave up without storing anything
+                    break
+            except Exception:
+                break
+
+    return _compute_and_store(key, fallback, ttl, local_ttl)
+
+
+def _accept(
+    key: Hashable,
+    result: Any,
+    local_ttl: Optional[float],
+    usable: Optional[Callable[[Any], bool]],
+) -> Any:
+    """Keep a value another worker stored, raising KeyError if it won't do."""
+    if usable is not None and not usable(result):
+        raise KeyError(f'Cached value for "{key}" is too old.')
+    get_local_cache().set(key, result, local_ttl)
+    return result
+
+
+def _serve_stale(key: Hashable, usable: Optional[Callable[[Any], bool]]) -> Any:
+    """Return the in-process value for a key that someone else is recomputing."""
+    result = get_local_cache().get_stale(key)
+    if usable is not None and not usable(result):
+        raise KeyError(f'Stale value for "{key}" is too old.')
+    _logger.debug(f'Serving stale value for "{key}" while it is recomputed.')
+    return result
+
+
+class CachedCall(
+    namedtuple(
+        "CachedCall",
+        [
+            "key",
+            "fallback",
+            "ttl",
+            "local_ttl",
+            "finish",
+        ],
+    ),
+):
+    """A call to a cached function, described so it can be looked up in a batch.
+
+    `finish` turns the cached value into the function's return value (e.g.
+    it strips the timestamp from the result of a periodic function).
+    """
+
+
+# decorated function -> factory returning a CachedCall for given arguments
+_cached_functions: Dict[Callable[..., Any], Callable[..., CachedCall]] = {}
+
+# decorated function -> prefix shared by the keys of all its results
+_function_key_prefixes: Dict[Callable[..., Any], str] = {}
+
+# tag -> key prefixes of the functions carrying that tag
+_tagged_key_prefixes: Dict[str, Set[str]] = {}
+
+
+def _register_cached_function(
+    decorated: Callable[..., Any],
+    fn: Callable[..., Any],
+    make_cached_call: Callable[..., CachedCall],
+    tags: Iterable[str],
+) -> None:
+    """Remember a decorated function for batch lookups and invalidation."""
+    prefix = _make_function_key_prefix(fn)
+    _cached_functions[decorated] = make_cached_call
+    _function_key_prefixes[decorated] = prefix
+    for tag in tags:
+        _tagged_key_prefixes.setdefault(tag, set()).add(prefix)
+
+
+def _function_cached_call(
+    fn: Callable[..., Any], ttl: Optional[int]
+) -> Callable[..., CachedCall]:
+    def make_cached_call(*args: Any, **kwargs: Any) -> CachedCall:
+        return CachedCall(
+            key=_make_function_call_key(fn, args, kwargs),
+            fallback=partial(fn, *args, **kwargs),
+            ttl=ttl,
+            local_ttl=None,
+            finish=lambda value: value,
+        )
+
+    return make_cached_call
+
+
+def cached_call(fn: Callable[..., Any], *args: Any, **kwargs: Any) -> CachedCall:
+    """Describe a call to a @cache or @periodic function for a batch lookup.
+
+    :param fn: the decorated function
+    :param args: positional arguments to call it with
+    :param kwargs: keyword arguments to call it with
+    """
+    try:
+        factory = _cached_functions[fn]
+    except KeyError:
+        raise ValueError(f"{fn} is not a cached function")
+    return factory(*args, **kwargs)
+
+
+def _as_cached_call(call: Any) -> CachedCall:
+    return call if isinstance(call, CachedCall) else cached_call(call)
+
+
+def _mget(keys: List[Hashable]) -> Dict[Hashable, Any]:
+    """Fetch several keys from Redis in one round trip, returning the hits."""
+    if not keys:
+        return {}
+
+    try:
+        values = get_redis_connection().mget([_redis_key(key) for key in keys])
+    except Exception:
+        for key in keys:
+            count_cache_lookup(key, "error")
+        return {}
+
+    return _decode_many(keys, values)
+
+
+def _decode_many(
+    keys: List[Hashable], values: List[Optional[bytes]]
+) -> Dict[Hashable, Any]:
+    hits = {}
+    for key, data in zip(keys, values):
+        try:
+            hits[key] = _decode_lookup(key, data)
+        except KeyError:
             pass
+    return hits
 
-        return result
+
+def _local_hits(calls: List[CachedCall]) -> Dict[Hashable, Any]:
+    """Return the values for a batch which are in the in-process cache."""
+    local_cache = get_local_cache()
+    hits = {}
+    for call in calls:
+        try:
+            hits[call.key] = local_cache.get(call.key)
+        except KeyError:
+            pass
+    return hits
+
+
+def cache_lookup_many(*calls: Any) -> List[Any]:
+    """Look up several cached functions at once.
+
+    Each argument is either a decorated function taking no arguments, or a
+    `cached_call(fn, *args, **kwargs)`. Values in the in-process cache are
+    used as is, the rest are fetched from Redis in a single round trip, and
+    only those missing from both are evaluated (with the same single-flight
+    protection as `cache_lookup_with_fallback`). Functions which have to be
+    awaited are rejected with TypeError.
+
+    Usage:
+
+        desktops_in_use, all_desktops = cache_lookup_many(
+            _get_desktops_in_use,
+            _list_desktops,
+        )
+    """
+    cached_calls = [_as_cached_call(call) for call in calls]
+    for call in cached_calls:
+        if asyncio.iscoroutinefunction(call.fallback) or asyncio.iscoroutinefunction(
+            call.finish
+        ):
+            raise TypeError(
+                f'"{call.key}" has to be awaited, use async_cache_lookup_many'
+            )
+
+    local_cache = get_local_cache()
+    debug = get_settings().debug
+
+    # in DEBUG mode, everything misses
+    hits = {} if debug else _local_hits(cached_calls)
+    fetched = {} if debug else _mget([c.key for c in cached_calls if c.key not in hits])
+
+    results = []
+    for call in cached_calls:
+        local_ttl = _local_ttl(call.ttl, call.local_ttl)
+        if call.key in hits:
+            count_cache_lookup(call.key, "local_hit")
+            value = hits[call.key]
+        elif call.key in fetched:
+            count_cache_lookup(call.key, "hit")
+            value = fetched[call.key]
+            local_cache.set(call.key, value, local_ttl)
+        elif debug:
+            count_cache_lookup(call.key, "miss")
+            value = _compute_and_store(call.key, call.fallback, call.ttl, local_ttl)
+        else:
+            count_cache_lookup(call.key, "miss")
+            value = _single_flight(
+                call.key,
+                partial(_fill, call.key, call.fallback, call.ttl, local_ttl),
+            )
+        hits[call.key] = value
+        results.append(call.finish(value))
+
+    return results
+
+
+def local_cache_stats() -> Dict[str, int]:
+    """Return hit, miss and eviction counters for this worker's local cache."""
+    return get_local_cache().stats()
+
+
+def invalidate(fn: Callable[..., Any]) -> int:
+    """Delete every cached result of a @cache or @periodic function.
+
+    Returns the number of Redis keys deleted. Other workers may keep serving
+    their in-process copies for up to `settings.local_cache_ttl` seconds.
+
+    :param fn: the decorated function
+    """
+    try:
+        prefix = _function_key_prefixes[fn]
+    except KeyError:
+        raise ValueError(f"{fn} is not a cached function")
+    return _delete_prefix(prefix)
+
+
+def invalidate_tag(tag: str) -> int:
+    """Delete every cached result of all functions carrying a tag.
+
+    Returns the number of Redis keys deleted, see `invalidate`.
+    """
+    return sum(_delete_prefix(prefix) for prefix in _tagged_key_prefixes.get(tag, ()))
+
+
+def _delete_prefix(prefix: str) -> int:
+    """Delete all keys starting with a prefix, using SCAN so Redis never blocks."""
+    get_local_cache().delete_prefix(prefix)
+
+    r = get_redis_connection()
+    deleted = 0
+    batch = []
+    for name in r.scan_iter(match=_escape_glob(prefix) + "*", count=_SCAN_COUNT):
+        batch.append(name)
+        if len(batch) >= _SCAN_COUNT:
+            deleted += r.delete(*batch)
+            batch = []
+    if batch:
+        deleted += r.delete(*batch)
+
+    _logger.info(f'Invalidated {deleted} cache entries under "{prefix}"')
+    return deleted
+
+
+def _escape_glob(pattern: str) -> str:
+    return re.sub(r"([*?\[\]\\])", r"\\\1", pattern)
 
 
 def cache(
     ttl: Optional[int] = None,
+    tags: Iterable[str] = (),
 ) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
     """Caching function decorator, with an optional ttl.
 
     The optional ttl (in seconds) specifies how long cache entries should live.
-    If not specified, cache entries last until the site rolls.
+    If not specified, cache entries last until the site rolls, or until they
+    are invalidated with `invalidate(fn)` or `invalidate_tag(tag)` for one of
+    the given tags.
 
     If you find yourself using the TTL for anything other than to control the
     cache size (e.g. because your entries become stale), consider using the
@@ -111,6 +688,10 @@ def cache(
         @cache(ttl=60)
         def my_changing_function(a, b, c):
             ....
+
+        @cache(tags=["desktops"])
+        def my_ldap_function():
+            ....
     """
 
     def outer(fn: Callable[..., Any]) -> Callable[..., Any]:
@@ -121,51 +702,67 @@ def cache(
                 ttl=ttl,
             )
 
+        _register_cached_function(inner, fn, _function_cached_call(fn, ttl), tags)
         return inner
 
     return outer
 
 
-def _make_key(key: Iterable[Any]) -> Tuple[Any, ...]:
+def _make_key(key: Iterable[str]) -> str:
     """Return a key suitable for caching.
 
-    The returned key prepends a version tag so that we don't share the cache
-    across ocfweb versions. This prevents strange behavior (e.g. if you change
-    the return type of a function which was cached on the previous version).
+    The returned key is prefixed with our namespace and a version tag so that
+    we don't share the cache across ocfweb versions. This prevents strange
+    behavior (e.g. if you change the return type of a function which was
+    cached on the previous version).
 
-    :param key: some iterable key (e.g. a tuple or list)
+    :param key: some iterable of strings (e.g. a tuple or list)
     """
-    return tuple(
-        chain(
-            [get_settings().version],
-            key,
-        ),
-    )
+    settings = get_settings()
+    return ":".join(chain([settings.cache_namespace, settings.version], key))
+
+
+def _make_function_key_prefix(fn: Callable[..., Any]) -> str:
+    """Return the prefix shared by the keys of every call to a function."""
+    return _make_key(["{fn.__module__}#{fn.__name__}".format(fn=fn), ""])
 
 
 def _make_function_call_key(
     fn: Callable[..., Any], args: Iterable[Any], kwargs: Dict[Any, Any]
-) -> Tuple[Any, ...]:
+) -> str:
     """Return a key for a function call.
 
-    The key will eventually be converted to a string and used as a cache key.
-    We attempt to make it resistant to obvious ordering issues.
+    The key looks like "ocfapi:<version>:<module>#<name>:<digest>", where the
+    digest is a fixed-length hash of the arguments, so keys stay short no
+    matter what a function is called with. We attempt to make it resistant to
+    obvious ordering issues.
+
+    Arguments are hashed by their repr, so they need a deterministic one.
 
     :param fn: function
     :param args: tuple or list of arguments
     :param kwargs: dict of keyword arguments
     """
-    return _make_key(
-        (
-            "{fn.__module__}#{fn.__name__}".format(fn=fn),
-            tuple(args),
-            tuple((k, v) for k, v in sorted(kwargs.items())),
-        )
-    )
+    arguments = repr((tuple(args), tuple(sorted(kwargs.items()))))
+    digest = hashlib.blake2b(arguments.encode(), digest_size=16).hexdigest()
+    return _make_function_key_prefix(fn) + digest
+
+
+def _make_lock_name(key: Hashable) -> str:
+    """Return the name of the Redis lock guarding computation of a key.
+
+    Locks live under our namespace too, but outside the versioned key space,
+    so invalidating a function's results never deletes a lock in use.
+    """
+    return ":".join([get_settings().cache_namespace, "lock", str(key)])
 
 
 periodic_functions = set()
 
+# periodic functions currently being revalidated in the background
+_revalidating = set()
+_revalidating_lock = threading.Lock()
+
 
 class PeriodicFunction(
     namedtuple(
@@ -174,7 +771,10 @@ class PeriodicFunction(
             "function",
             "period",
             "ttl",
+            "stale_while_revalidate",
+            "max_stale",
         ],
+        defaults=[False, None],
     ),
 ):
     def __hash__(self) -> int:
@@ -191,7 +791,7 @@ class PeriodicFunction(
         return f"PeriodicFunction({self.function_call_key})"
 
     @cached_property
-    def function_call_key(self) -> Tuple[Any, ...]:
+    def function_call_key(self) -> str:
         """Return the function's cache key."""
         return _make_function_call_key(self.function, (), {})
 
@@ -203,7 +803,15 @@ class PeriodicFunction(
 
         Storing them in the same record helps to avoid race conditions.
         """
-        return (datetime.now(), self.function())
+        timestamp = datetime.now()
+        with PERIODIC_DURATION.labels(self.metric_label).time():
+            result = self.function()
+        return (timestamp, result)
+
+    @cached_property
+    def metric_label(self) -> str:
+        """Return the name this function is reported under in metrics."""
+        return "{fn.__module__}#{fn.__name__}".format(fn=self.function)
 
     def last_update(self) -> Any:
         """Return the timestamp of the last update of this function.
@@ -230,17 +838,90 @@ class PeriodicFunction(
         In most cases, we can read it from the cache and so it is nearly
         instant. If for some reason it isn't in the cache, we execute it (and
         then stick it in the cache for next time).
+
+        Results are kept in the in-process cache for at most one period, so
+        a worker never serves something older than a refresh would.
+
+        In stale-while-revalidate mode, a result older than the period is
+        still returned immediately, and a single background refresh is kicked
+        off. Only results older than `max_stale` are recomputed synchronously,
+        by one worker at a time while the others wait for its result.
         """
         if kwargs:
             return self.function(**kwargs)
 
-        timestamp, result = cache_lookup_with_fallback(
-            self.function_call_key,
-            self.function_with_timestamp,
-            ttl=self.ttl,
+        return self._finish(
+            cache_lookup_with_fallback(
+                self.function_call_key,
+                self.function_with_timestamp,
+                ttl=self.ttl,
+                local_ttl=self.period,
+            )
         )
+
+    def _finish(self, cached: Tuple[datetime, Any]) -> Any:
+        """Unpack a cached (timestamp, result) pair, dealing with staleness."""
+        timestamp, result = cached
+
+        if self.stale_while_revalidate:
+            age = (datetime.now() - timestamp).total_seconds()
+            if self.max_stale is not None and age > self.max_stale:
+                _logger.debug(f"{self} is {age:.0f}s old, refreshing synchronously")
+                timestamp, result = _single_flight(
+                    self._refresh_flight_key,
+                    partial(
+                        _fill,
+                        self.function_call_key,
+                        self.function_with_timestamp,
+                        self.ttl,
+                        _local_ttl(self.ttl, self.period),
+                        self._is_servable,
+                    ),
+                )
+            elif age > self.period:
+                self._revalidate_in_background()
+
         return result
 
+    @property
+    def _refresh_flight_key(self) -> Hashable:
+        # separate from the key's own flight, which may settle for a stale value
+        return (self.function_call_key, "max_stale")
+
+    def _is_servable(self, cached: Tuple[datetime, Any]) -> bool:
+        """Return whether a cached result is no older than max_stale."""
+        timestamp, result = cached
+        age = (datetime.now() - timestamp).total_seconds()
+        return self.max_stale is None or age <= self.max_stale
+
+    def cached_call(self) -> "CachedCall":
+        """Describe a call to this function, for use in batch lookups."""
+        return CachedCall(
+            key=self.function_call_key,
+            fallback=self.function_with_timestamp,
+            ttl=self.ttl,
+            local_ttl=self.period,
+            finish=self._finish,
+        )
+
+    def _revalidate_in_background(self) -> None:
+        """Start a refresh in a background thread, unless one is running."""
+        with _revalidating_lock:
+            if self in _revalidating:
+                return
+            _revalidating.add(self)
+
+        def revalidate() -> None:
+            try:
+                self.refresh_if_due()
+            except Exception:
+                _logger.exception(f"Failed to revalidate {self}")
+            finally:
+                with _revalidating_lock:
+                    _revalidating.discard(self)
+
+        threading.Thread(target=revalidate, daemon=True).start()
+
     def update(self) -> Any:
         """Run this periodic function and cache the result."""
         cache_lookup_with_fallback(
@@ -248,11 +929,56 @@ class PeriodicFunction(
             self.function_with_timestamp,
             ttl=self.ttl,
             force_miss=True,
+            local_ttl=self.period,
         )
 
+    def refresh_if_due(self) -> float:
+        """Update this function if its period has elapsed.
+
+        A Redis lock makes sure only one worker (across all pods) refreshes a
+        function at a time. Whoever gets the lock next sees the new timestamp
+        and skips the work. If Redis is unavailable, we refresh anyway so this
+        worker's in-process cache stays warm.
+
+        Returns the number of seconds until the next refresh is due.
+        """
+        lock = None
+        try:
+            lock = get_redis_connection().lock(
+                _make_lock_name(self.function_call_key),
+                timeout=get_settings().periodic_lock_timeout,
+            )
+            if not lock.acquire(blocking=False):
+                # someone else is refreshing it right now
+                return self.period
+        except Exception:
+            _logger.warning(f"Unable to lock {self}, refreshing anyway", exc_info=True)
+            lock = None
+
+        try:
+            elapsed = self.seconds_since_last_update()
+            if elapsed < self.period:
+                return self.period - elapsed
+
+            _logger.debug(f"Refreshing {self}")
+            self.update()
+            return self.period
+        finally:
+            if lock is not None:
+                try:
+                    lock.release()
+                except Exception:
+                    # the lock expired while we were refreshing, or Redis
+                    # went away; either way it will time out on its own
+                    pass
+
 
 def periodic(
-    period: float, ttl: Optional[float] = None
+    period: float,
+    ttl: Optional[float] = None,
+    stale_while_revalidate: bool = False,
+    max_stale: Optional[float] = None,
+    tags: Iterable[str] = (),
 ) -> Callable[[Callable[..., Any]], Any]:
     """Caching function decorator for functions which desire TTL-based caching.
 
@@ -269,6 +995,16 @@ def periodic(
     being cached, it is synchronously executed (and the result stored for next
     time), much like the @cache decorator.
 
+    With stale_while_revalidate, results older than the period are still
+    served immediately while a single background refresh runs. The optional
+    max_stale (in seconds, by default `settings.periodic_max_stale`) bounds how
+    old a served result may be; it is also used as the default ttl.
+
+    Results can be invalidated like those of @cache functions.
+
+    The decorated function's `period` attribute holds the period, e.g. for
+    telling clients how long they may cache its result for.
+
     Periodic functions can have no required arguments. While they can have
     keyword arguments, no caching is done if you call the function using them.
 
@@ -282,21 +1018,459 @@ def periodic(
         @periodic(60)
         def get_blog_posts():
             ....
+
+        @periodic(60, stale_while_revalidate=True, max_stale=3600)
+        def get_staff_hours():
+            ....
     """
+    return _periodic_decorator(
+        PeriodicFunction, period, ttl, stale_while_revalidate, max_stale, tags
+    )
+
+
+def _periodic_decorator(
+    cls: Type[PeriodicFunction],
+    period: float,
+    ttl: Optional[float],
+    stale_while_revalidate: bool,
+    max_stale: Optional[float],
+    tags: Iterable[str],
+) -> Callable[[Callable[..., Any]], Any]:
+    if stale_while_revalidate and max_stale is None:
+        max_stale = get_settings().periodic_max_stale
+
     if period == math.inf:
         assert ttl is None, ttl
         # In the Django cache framework, None means cache forever.
         ttl = None
     elif ttl is None:
-        ttl = period * 2
+        ttl = max(period * 2, max_stale or 0)
 
     def outer(fn: Callable[..., Any]) -> Any:
-        pf = PeriodicFunction(
+        pf = cls(
             function=fn,
             period=period,
             ttl=ttl,
+            stale_while_revalidate=stale_while_revalidate,
+            max_stale=max_stale,
         )
         periodic_functions.add(pf)
-        return pf.result
+        decorated: Any = partial(pf.result)
+        decorated.period = period
+        _register_cached_function(decorated, fn, pf.cached_call, tags)
+        return decorated
 
     return outer
+
+
+# asyncio flavors of the above, for use from `async def` routes. These talk to
+# Redis through a pooled asyncio client, so a lookup never blocks the event
+# loop, and they await fallbacks which are coroutine functions (blocking
+# fallbacks are run in the threadpool instead).
+
+
+async def _evaluate(fallback: Callable[[], Any]) -> Any:
+    """Await a coroutine function, or run a blocking function in a thread."""
+    if asyncio.iscoroutinefunction(fallback):
+        return await fallback()
+    return await run_in_threadpool(fallback)
+
+
+async def async_cache_lookup(key: Hashable) -> Any:
+    """Look up a key in the cache, raising KeyError if it's a miss."""
+    try:
+        r = get_async_redis_connection()
+        data = await r.get(_redis_key(key))
+    except Exception:
+        count_cache_lookup(key, "error")
+        data = None
+
+    return _decode_lookup(key, data)
+
+
+async def async_cache_lookup_with_fallback(
+    key: Hashable,
+    fallback: Callable[[], Any],
+    ttl: Optional[int] = None,
+    force_miss: bool = False,
+    local_ttl: Optional[float] = None,
+) -> Any:
+    """Look up a key in the cache, falling back to a function if it's a miss.
+
+    This behaves exactly like `cache_lookup_with_fallback`, except that it
+    must be awaited, and `fallback` may be a coroutine function.
+    """
+    local_cache = get_local_cache()
+    local_ttl = _local_ttl(ttl, local_ttl)
+
+    try:
+        if force_miss:
+            raise KeyError("Forcing miss as requested.")
+
+        if get_settings().debug:
+            result = await async_cache_lookup(key)
+            _logger.debug(f'Cache hit for "{key}", but forcing miss due to DEBUG.')
+            raise KeyError("Forcing miss due to DEBUG mode.")
+
+        try:
+            result = local_cache.get(key)
+            count_cache_lookup(key, "local_hit")
+            return result
+        except KeyError:
+            pass
+
+        result = await async_cache_lookup(key)
+        count_cache_lookup(key, "hit")
+        local_cache.set(key, result, local_ttl)
+        return result
+    except KeyError:
+        if not force_miss:
+            count_cache_lookup(key, "miss")
+
+        if force_miss or get_settings().debug:
+            return await _async_compute_and_store(key, fallback, ttl, local_ttl)
+
+        return await _async_single_flight(
+            key,
+            lambda: _async_fill(key, fallback, ttl, local_ttl),
+        )
+
+
+async def _async_compute_and_store(
+    key: Hashable,
+    fallback: Callable[[], Any],
+    ttl: Optional[int],
+    local_ttl: Optional[float],
+) -> Any:
+    result = await _evaluate(fallback)
+    get_local_cache().set(key, result, local_ttl)
+
+    data = _encode_for_store(key, result)
+    if data is None:
+        return result
+
+    try:
+        r = get_async_redis_connection()
+        await r.set(_redis_key(key), data, _redis_ttl(ttl))
+    except Exception as e:
+        if not isinstance(e, CircuitOpenError):
+            _logger.warning(f'Unable to store "{key}" in Redis: {e}')
+        count_cache_lookup(key, "error")
+
+    return result
+
+
+_async_flights: Dict[Hashable, "asyncio.Future[Any]"] = {}
+
+
+async def _async_single_flight(key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+    """Await fn(), unless another task is already doing so for the same key,
+    in which case wait for and share its result instead."""
+    flight = _async_flights.get(key)
+    if flight is not None:
+        # shield, so that one waiter being cancelled doesn't cancel the rest
+        return await asyncio.shield(flight)
+
+    flight = _async_flights[key] = asyncio.ensure_future(fn())
+    try:
+        return await asyncio.shield(flight)
+    finally:
+        if _async_flights.get(key) is flight:
+            del _async_flights[key]
+
+
+async def _async_fill(
+    key: Hashable,
+    fallback: Callable[[], Any],
+    ttl: Optional[int],
+    local_ttl: Optional[float],
+    usable: Optional[Callable[[Any], bool]] = None,
+) -> Any:
+    """Compute a missing key, making sure only one worker does so at a time.
+
+    See `_fill` for details.
+    """
+    lock_timeout = get_settings().cache_fill_lock_timeout
+    try:
+        lock = get_async_redis_connection().lock(
+            _make_lock_name(key),
+            timeout=lock_timeout,
+        )
+        acquired = await lock.acquire(blocking=False)
+    except Exception:
+        return await _async_compute_and_store(key, fallback, ttl, local_ttl)
+
+    if acquired:
+        try:
+            # another worker may have filled it just before we got the lock
+            return _accept(key, await async_cache_lookup(key), local_ttl, usable)
+        except KeyError:
+            return await _async_compute_and_store(key, fallback, ttl, local_ttl)
+        finally:
+            try:
+                await lock.release()
+            except Exception:
+                pass
+
+    try:
+        return _serve_stale(key, usable)
+    except KeyError:
+        pass
+
+    deadline = time.monotonic() + lock_timeout
+    while time.monotonic() < deadline:
+        await asyncio.sleep(_FILL_POLL_INTERVAL)
+        try:
+            return _accept(key, await async_cache_lookup(key), local_ttl, usable)
+        except KeyError:
+            try:
+                if not await lock.locked():
+                    # the winner gave up without storing anything
+                    break
+            except Exception:
+                break
+
+    return await _async_compute_and_store(key, fallback, ttl, local_ttl)
+
+
+async def _async_mget(keys: List[Hashable]) -> Dict[Hashable, Any]:
+    if not keys:
+        return {}
+
+    try:
+        r = get_async_redis_connection()
+        values = await r.mget([_redis_key(key) for key in keys])
+    except Exception:
+        for key in keys:
+            count_cache_lookup(key, "error")
+        return {}
+
+    return _decode_many(keys, values)
+
+
+async def async_cache_lookup_many(*calls: Any) -> List[Any]:
+    """Look up several cached functions at once, see `cache_lookup_many`.
+
+    Missing values are evaluated concurrently.
+    """
+    cached_calls = [_as_cached_call(call) for call in calls]
+    local_cache = get_local_cache()
+    debug = get_settings().debug
+
+    hits = {} if debug else _local_hits(cached_calls)
+    fetched = (
+        {}
+        if debug
+        else await _async_mget([c.key for c in cached_calls if c.key not in hits])
+    )
+
+    async def resolve(call: CachedCall) -> Any:
+        local_ttl = _local_ttl(call.ttl, call.local_ttl)
+        if call.key in hits:
+            count_cache_lookup(call.key, "local_hit")
+            return hits[call.key]
+        elif call.key in fetched:
+            count_cache_lookup(call.key, "hit")
+            local_cache.set(call.key, fetched[call.key], local_ttl)
+            return fetched[call.key]
+
+        count_cache_lookup(call.key, "miss")
+        if debug:
+            return await _async_compute_and_store(
+                call.key, call.fallback, call.ttl, local_ttl
+            )
+        else:
+            return await _async_single_flight(
+                call.key,
+                partial(_async_fill, call.key, call.fallback, call.ttl, local_ttl),
+            )
+
+    values = await asyncio.gather(*(resolve(call) for call in cached_calls))
+
+    results = []
+    for call, value in zip(cached_calls, values):
+        result = call.finish(value)
+        if asyncio.iscoroutine(result):
+            result = await result
+        results.append(result)
+
+    return results
+
+
+def async_cache(
+    ttl: Optional[int] = None,
+    tags: Iterable[str] = (),
+) -> Callable[[Callable[..., Any]], Callable[..., Awaitable[Any]]]:
+    """Like @cache, but the decorated function must be awaited.
+
+    The function itself can be a coroutine function, or a blocking function
+    which is then run in the threadpool on a cache miss.
+
+    Usage:
+
+        @async_cache()
+        def _list_desktops():
+            ....
+
+        desktops = await _list_desktops()
+    """
+
+    def outer(fn: Callable[..., Any]) -> Callable[..., Awaitable[Any]]:
+        async def inner(*args: Any, **kwargs: Any) -> Any:
+            return await async_cache_lookup_with_fallback(
+                _make_function_call_key(fn, args, kwargs),
+                partial(fn, *args, **kwargs),
+                ttl=ttl,
+            )
+
+        _register_cached_function(inner, fn, _function_cached_call(fn, ttl), tags)
+        return inner
+
+    return outer
+
+
+class AsyncPeriodicFunction(PeriodicFunction):
+    """A periodic function whose methods must be awaited.
+
+    The wrapped function can be a coroutine function, or a blocking function
+    which is then run in the threadpool.
+    """
+
+    async def function_with_timestamp(self) -> Tuple[datetime, Any]:
+        """Return a tuple (timestamp, result), see PeriodicFunction."""
+        timestamp = datetime.now()
+        start = time.perf_counter()
+        result = await _evaluate(self.function)
+        PERIODIC_DURATION.labels(self.metric_label).observe(time.perf_counter() - start)
+        return (timestamp, result)
+
+    async def last_update(self) -> Any:
+        try:
+            timestamp, result = await async_cache_lookup(self.function_call_key)
+            return timestamp
+        except KeyError:
+            return None
+
+    async def seconds_since_last_update(self) -> float:
+        last_update = await self.last_update() or datetime.fromtimestamp(0)
+        return (datetime.now() - last_update).total_seconds()
+
+    async def result(self, **kwargs: Any) -> Any:
+        if kwargs:
+            return await _evaluate(partial(self.function, **kwargs))
+
+        return await self._finish(
+            await async_cache_lookup_with_fallback(
+                self.function_call_key,
+                self.function_with_timestamp,
+                ttl=self.ttl,
+                local_ttl=self.period,
+            )
+        )
+
+    async def _finish(self, cached: Tuple[datetime, Any]) -> Any:
+        timestamp, result = cached
+
+        if self.stale_while_revalidate:
+            age = (datetime.now() - timestamp).total_seconds()
+            if self.max_stale is not None and age > self.max_stale:
+                _logger.debug(f"{self} is {age:.0f}s old, refreshing synchronously")
+                timestamp, result = await _async_single_flight(
+                    self._refresh_flight_key,
+                    partial(
+                        _async_fill,
+                        self.function_call_key,
+                        self.function_with_timestamp,
+                        self.ttl,
+                        _local_ttl(self.ttl, self.period),
+                        self._is_servable,
+                    ),
+                )
+            elif age > self.period:
+                self._revalidate_in_background()
+
+        return result
+
+    def _revalidate_in_background(self) -> None:
+        """Start a refresh in a background task, unless one is running."""
+        with _revalidating_lock:
+            if self in _revalidating:
+                return
+            _revalidating.add(self)
+
+        async def revalidate() -> None:
+            try:
+                await self.refresh_if_due()
+            except Exception:
+                _logger.exception(f"Failed to revalidate {self}")
+            finally:
+                with _revalidating_lock:
+                    _revalidating.discard(self)
+
+        asyncio.ensure_future(revalidate())
+
+    async def update(self) -> Any:
+        await async_cache_lookup_with_fallback(
+            self.function_call_key,
+            self.function_with_timestamp,
+            ttl=self.ttl,
+            force_miss=True,
+            local_ttl=self.period,
+        )
+
+    async def refresh_if_due(self) -> float:
+        """Update this function if its period has elapsed, see PeriodicFunction.
+
+        Returns the number of seconds until the next refresh is due.
+        """
+        lock = None
+        try:
+            lock = get_async_redis_connection().lock(
+                _make_lock_name(self.function_call_key),
+                timeout=get_settings().periodic_lock_timeout,
+            )
+            if not await lock.acquire(blocking=False):
+                return self.period
+        except Exception:
+            _logger.warning(f"Unable to lock {self}, refreshing anyway", exc_info=True)
+            lock = None
+
+        try:
+            elapsed = await self.seconds_since_last_update()
+            if elapsed < self.period:
+                return self.period - elapsed
+
+            _logger.debug(f"Refreshing {self}")
+            await self.update()
+            return self.period
+        finally:
+            if lock is not None:
+                try:
+                    await lock.release()
+                except Exception:
+                    pass
+
+
+def async_periodic(
+    period: float,
+    ttl: Optional[float] = None,
+    stale_while_revalidate: bool = False,
+    max_stale: Optional[float] = None,
+    tags: Iterable[str] = (),
+) -> Callable[[Callable[..., Any]], Any]:
+    """Like @periodic, but the decorated function must be awaited.
+
+    The function itself can be a coroutine function, or a blocking function
+    which is then run in the threadpool when it needs to be executed.
+
+    Usage:
+
+        @async_periodic(60)
+        async def get_blog_posts():
+            ....
+
+        posts = await get_blog_posts()
+    """
+    return _periodic_decorator(
+        AsyncPeriodicFunction, period, ttl, stale_while_revalidate, max_stale, tags
+    )
@@ -3,40 +3,196 @@
 This module is responsible for instantiating the Celery tasks used for account
 creation using our special credentials. Other modules should import from here,
 rather than from ocflib directly.
+
+Importing Celery and ocflib's account submission code is slow (the latter
+pulls in most of ocflib), and only a couple of routes need them, so the app
+and tasks are created on first use rather than at import.
+
+Task messages and results are pickled by default, since that's what ocflib's
+workers accept. Setting `settings.celery_serializer` to `SERIALIZER` encodes
+them with msgpack instead (see `serialize`), so whatever is on the other end
+of the broker can't make us run arbitrary code; only do so once the workers
+register the same serializer (`register_serializer`) and accept it.
 """
+import asyncio
 import ssl
+from functools import lru_cache
+from typing import TYPE_CHECKING, Any, AsyncGenerator, List, Tuple, Type
 
-from celery import Celery
-
-from ocflib.account.submission import get_tasks as real_get_tasks
+import msgpack
+import redis.asyncio
 
 from utils.config import get_settings
 
-settings = get_settings()
+if TYPE_CHECKING:
+    from celery import Celery
 
-celery_app = Celery(
-    broker=settings.celery_broker,
-    backend=settings.celery_backend,
-)
-celery_app.conf.broker_use_ssl = {
-    "ssl_ca_certs": "/etc/ssl/certs/ca-certificates.crt",
-    "ssl_cert_reqs": ssl.CERT_REQUIRED,
-}
-celery_app.conf.redis_backend_use_ssl = {
+_SSL_OPTIONS = {
     "ssl_ca_certs": "/etc/ssl/certs/ca-certificates.crt",
     "ssl_cert_reqs": ssl.CERT_REQUIRED,
 }
 
-# TODO: stop using pickle
-celery_app.conf.task_serializer = "pickle"
-celery_app.conf.result_serializer = "pickle"
-celery_app.conf.accept_content = {"pickle"}
+SERIALIZER = "ocfmsgpack"
+_CONTENT_TYPE = "application/x-ocf-msgpack"
+
+
+# msgpack extension type marking an array as the fields of an ocflib type
+_NAMEDTUPLE_EXT = 1
+
+
+@lru_cache()
+def _namedtuple_types() -> Tuple[Type[Any], ...]:
+    """The ocflib types passed to or returned from account tasks.
+
+    Each is identified by its position here, so new types must only ever be
+    appended.
+    """
+    from ocflib.account.creation import NewAccountRequest
+    from ocflib.account.submission import NewAccountResponse
+
+    return (NewAccountRequest, NewAccountResponse)
+
+
+class _NamedTupleType(int):
+    """What a namedtuple's marker decodes to: the index of its type."""
+
+
+def _default(value: Any) -> Any:
+    if type(value) is tuple:
+        return list(value)
+    if isinstance(value, tuple) and type(value) in _namedtuple_types():
+        index = _namedtuple_types().index(type(value))
+        return [msgpack.ExtType(_NAMEDTUPLE_EXT, bytes([index])), *value]
+    # subclasses of types msgpack supports (e.g. enums) are sent as their base
+    for base in (bool, int, float, str, bytes, list, dict):
+        if isinstance(value, base):
+            return base(value)
+    raise TypeError(f"Unable to serialize {type(value).__name__}")
+
+
+def _ext_hook(code: int, data: bytes) -> Any:
+    if code == _NAMEDTUPLE_EXT:
+        return _NamedTupleType(data[0])
+    return msgpack.ExtType(code, data)
+
+
+def _list_hook(items: List[Any]) -> Any:
+    if items and type(items[0]) is _NamedTupleType:
+        return _namedtuple_types()[items[0]](*items[1:])
+    return items
+
+
+def serialize(value: Any) -> bytes:
+    """Encode a task message or result with msgpack.
+
+    Unlike JSON, msgpack carries bytes (like an encrypted password) as they
+    are. ocflib's NewAccountRequest and NewAccountResponse are encoded as an
+    array of their fields by position, led by an extension type naming the
+    type, so both ends must agree on the version of ocflib. Other tuples
+    become lists, as they would with Celery's json serializer.
+    """
+    return msgpack.packb(value, default=_default, strict_types=True, use_bin_type=True)
+
+
+def deserialize(payload: bytes) -> Any:
+    return msgpack.unpackb(payload, ext_hook=_ext_hook, list_hook=_list_hook, raw=False)
+
+
+def register_serializer() -> None:
+    """Make `SERIALIZER` available to Celery (and kombu)."""
+    from kombu.serialization import register
+
+    register(
+        SERIALIZER,
+        serialize,
+        deserialize,
+        content_type=_CONTENT_TYPE,
+        content_encoding="binary",
+    )
+
+
+@lru_cache()
+def get_celery_app() -> "Celery":
+    from celery import Celery
+
+    settings = get_settings()
+    register_serializer()
+
+    celery_app = Celery(
+        broker=settings.celery_broker,
+        backend=settings.celery_backend,
+    )
+    celery_app.conf.broker_use_ssl = dict(_SSL_OPTIONS)
+    celery_app.conf.redis_backend_use_ssl = dict(_SSL_OPTIONS)
+
+    celery_app.conf.task_serializer = settings.celery_serializer
+    celery_app.conf.result_serializer = settings.celery_serializer
+    celery_app.conf.accept_content = {settings.celery_serializer}
+
+    return celery_app
+
+
+@lru_cache()
+def get_tasks() -> Any:
+    """Return ocflib's account tasks, bound to our Celery app.
+
+    These are e.g. create_account, validate_then_create_account,
+    get_pending_requests, approve_request, reject_request and change_password.
+    """
+    from ocflib.account.submission import get_tasks as real_get_tasks
+
+    return real_get_tasks(get_celery_app())
+
+
+@lru_cache()
+def _get_result_backend_redis() -> redis.asyncio.Redis:
+    return redis.asyncio.Redis.from_url(
+        get_settings().celery_backend,
+        connection_class=redis.asyncio.SSLConnection,
+        **_SSL_OPTIONS,
+    )
+
+
+async def watch_task(
+    task_id: str, timeout: float
+) -> AsyncGenerator[Tuple[Any, Any], None]:
+    """Yield a task's state and result now, and again whenever they change.
+
+    Celery's Redis result backend publishes each result it stores (including
+    progress from update_state) on a channel named after the task's result
+    key, so we subscribe to that rather than polling the backend. This stops
+    once the task is ready, or after `timeout` seconds if it never gets there.
+    For unfinished tasks the result is their progress meta, if any.
+    """
+    from celery import states
 
-_tasks = real_get_tasks(celery_app)
+    backend = get_celery_app().backend
+    key = backend.get_key_for_task(task_id)
+    client = _get_result_backend_redis()
+    pubsub = client.pubsub()
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    try:
+        # subscribe before reading the current state, so nothing is missed in
+        # between
+        await pubsub.subscribe(key)
+        payload = await client.get(key)
+        meta = (
+            backend.decode_result(payload)
+            if payload is not None
+            else {"status": states.PENDING, "result": None}
+        )
+        yield meta["status"], meta["result"]
 
-create_account = _tasks.create_account
-validate_then_create_account = _tasks.validate_then_create_account
-get_pending_requests = _tasks.get_pending_requests
-approve_request = _tasks.approve_request
-reject_request = _tasks.reject_request
-change_password = _tasks.change_password
+        while meta["status"] not in states.READY_STATES:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return
+            message = await pubsub.get_message(
+                ignore_subscribe_messages=True, timeout=remaining
+            )
+            if message is not None and message["type"] == "message":
+                meta = backend.decode_result(message["data"])
+                yield meta["status"], meta["result"]
+    finally:
+        await pubsub.reset()
@@ -0,0 +1,94 @@
+"""Encoding of cached values for storage in Redis.
+
+Values are pickled (which round-trips sets, namedtuples, datetimes and
+ocflib objects like `HoursListing`), compressed with zlib when they are
+large, and prefixed with a two byte header:
+
+    byte 0: the format version, bumped whenever the encoding changes
+    byte 1: flags (currently just whether the payload is compressed)
+
+Values that can't be decoded, e.g. because they were written using an older
+format, raise `CodecError`, which callers treat like a cache miss.
+"""
+import pickle
+import zlib
+from functools import lru_cache
+from typing import Any, Optional
+
+from utils.config import get_settings
+
+FORMAT_VERSION = 1
+
+FLAG_COMPRESSED = 0x01
+
+_HEADER_SIZE = 2
+
+
+class CodecError(Exception):
+    """A value could not be encoded or decoded."""
+
+
+class Codec:
+    """Turns Python objects into bytes for Redis and back again.
+
+    Subclasses can override `serialize` and `deserialize` to use a different
+    serialization format; the header and compression are handled here.
+
+    :param compress_threshold: compress payloads at least this many bytes long
+                               (None disables compression)
+    :param compress_level: the zlib compression level
+    """
+
+    def __init__(
+        self,
+        compress_threshold: Optional[int] = 1024,
+        compress_level: int = 6,
+    ) -> None:
+        self.compress_threshold = compress_threshold
+        self.compress_level = compress_level
+
+    def serialize(self, value: Any) -> bytes:
+        return pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def deserialize(self, payload: bytes) -> Any:
+        return pickle.loads(payload)
+
+    def encode(self, value: Any) -> bytes:
+        try:
+            payload = self.serialize(value)
+        except Exception as e:
+            raise CodecError(f"Unable to serialize {type(value).__name__}") from e
+
+        flags = 0
+        if (
+            self.compress_threshold is not None
+            and len(payload) >= self.compress_threshold
+        ):
+            compressed = zlib.compress(payload, self.compress_level)
+            # tiny or already-compressed payloads can grow; keep whichever is smaller
+            if len(compressed) < len(payload):
+                payload = compressed
+                flags |= FLAG_COMPRESSED
+
+        return bytes((FORMAT_VERSION, flags)) + payload
+
+    def decode(self, data: bytes) -> Any:
+        if len(data) < _HEADER_SIZE:
+            raise CodecError("Value is too short to have been encoded by us")
+
+        version, flags = data[0], data[1]
+        if version != FORMAT_VERSION:
+            raise CodecError(f"Unsupported format version {version}")
+
+        payload = data[_HEADER_SIZE:]
+        try:
+            if flags & FLAG_COMPRESSED:
+                payload = zlib.decompress(payload)
+            return self.deserialize(payload)
+        except Exception as e:
+            raise CodecError("Unable to decode value") from e
+
+
+@lru_cache()
+def get_codec() -> Codec:
+    return Codec(compress_threshold=get_settings().cache_compress_threshold)
@@ -16,15 +16,83 @@ class Settings(BaseSettings):
     ocfprinting_password: str = "shhverysecret"
     ocfprinting_db: str = "ocfprinting"
 
+    # per-worker connection pool for each of the databases above
+    mysql_pool_size: int = 8
+    mysql_pool_timeout: float = 5.0
+    # replace connections after this many seconds, before mysql times them out
+    mysql_pool_recycle: int = 3600
+    # check connections idle for longer than this are alive before using them
+    mysql_pool_ping_interval: int = 10
+
     redis_host: str = "127.0.0.1"
     redis_port: int = 6379
     redis_password: str = "shhverysecret"
+    redis_max_connections: int = 32
+    redis_pool_timeout: float = 1.0
+    redis_connect_timeout: float = 0.5
+    redis_socket_timeout: float = 0.5
+    redis_health_check_interval: int = 30
+    # skip redis for redis_breaker_cooldown seconds after this many failures
+    redis_breaker_failure_threshold: int = 5
+    redis_breaker_cooldown: float = 10.0
+
+    # prefix for all of our keys in redis
+    cache_namespace: str = "ocfapi"
+
+    # per-worker in-process cache that sits in front of redis
+    local_cache_max_entries: int = 1024
+    local_cache_ttl: int = 60
+    # cached values at least this many bytes long are compressed in redis
+    cache_compress_threshold: int = 1024
+    # how long other workers wait for a single worker to compute a missing key
+    cache_fill_lock_timeout: int = 10
+
+    # background refreshing of @periodic functions
+    periodic_refresh: bool = True
+    periodic_lock_timeout: int = 60
+    periodic_max_sleep: int = 60
+    # oldest result a stale-while-revalidate periodic function will serve
+    periodic_max_stale: int = 3600
+
+    # threads for blocking calls from async routes, per backend, and how many
+    # more calls may wait for one before we start turning requests away
+    executor_mysql_workers: int = 8
+    executor_ldap_workers: int = 8
+    executor_http_workers: int = 8
+    executor_celery_workers: int = 4
+    executor_max_queue: int = 32
+    # overall deadline for the directory (LDAP and CalLink) lookups made
+    # concurrently by account registration and password resets
+    directory_lookup_timeout: float = 15.0
+
+    # how often buffered session heartbeats are written to ocfstats
+    session_flush_interval: float = 5.0
+    # rebuild the redis index of open sessions from ocfstats at least this
+    # often, to pick up sessions closed outside the API
+    session_index_ttl: int = 300
+
+    # how long a client can follow a registration's progress on one connection
+    register_status_stream_timeout: int = 300
 
     celery_broker: str = "redis://127.0.0.1:6378"
     celery_backend: str = "redis://127.0.0.1:6378"
+    # how account task messages and results are serialized; the workers must
+    # accept the same one, so only use utils/celery.py's "ocfmsgpack" once
+    # they register it
+    celery_serializer: str = "pickle"
 
     calnet_jwt_secret: str = "sshverysecret"
 
+    # how long keycloak's signing keys are cached, and how often an unknown key
+    # id can make us fetch them again
+    keycloak_jwks_ttl: int = 3600
+    keycloak_jwks_min_refetch_interval: int = 30
+    # per-worker cache of verified keycloak tokens
+    token_cache_max_entries: int = 1024
+
+    # seconds a worker may take to import the app (see tests/startup_test.py)
+    import_time_budget: float = 2.0
+
     debug: bool = False
     version: str = "dev"
 
@@ -0,0 +1,182 @@
+"""Bounded thread pools for calling blocking backends from async routes.
+
+Blocking calls (PyMySQL, LDAP, CAS/CalLink over HTTP, waiting on Celery)
+must not run on the event loop, or one slow backend stalls every request on
+the worker. Each backend gets its own thread pool, sized separately, so a
+slow LDAP server can only tie up the LDAP pool instead of starving MySQL
+queries too. Each pool also has a bounded queue: once `max_workers` calls
+are running and `max_queue` more are waiting, further calls are rejected
+with a 503 rather than piling up behind a backend that isn't keeping up.
+
+    from utils.executors import LDAP, run_in_backend
+
+    is_group = await run_in_backend(LDAP, user_is_group, username)
+
+Independent calls can be made concurrently with gather_with_deadline, so a
+request waits on the slowest of them rather than on all of them in turn.
+"""
+import asyncio
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache, partial
+from typing import Any, Awaitable, Callable, Dict, List, TypeVar, Union
+
+from fastapi import HTTPException, status
+
+from utils.config import get_settings
+from utils.metrics import (
+    EXECUTOR_ACTIVE,
+    EXECUTOR_QUEUED,
+    EXECUTOR_REJECTED,
+    EXECUTOR_WAIT,
+)
+
+MYSQL = "mysql"
+LDAP = "ldap"
+HTTP = "http"
+CELERY = "celery"
+
+T = TypeVar("T")
+
+
+class BackendBusyError(HTTPException):
+    """Raised when a backend's executor has no room for another call."""
+
+    def __init__(self, backend: str) -> None:
+        super().__init__(
+            status.HTTP_503_SERVICE_UNAVAILABLE,
+            f"Too many pending {backend} requests, try again later",
+            headers={"Retry-After": "1"},
+        )
+
+
+class DeadlineExceededError(HTTPException):
+    """Raised when backend calls made for a request take too long overall."""
+
+    def __init__(self) -> None:
+        super().__init__(
+            status.HTTP_504_GATEWAY_TIMEOUT,
+            "Timed out waiting for a backend, try again later",
+        )
+
+
+class BackendExecutor:
+    """A thread pool for one backend that rejects calls once it's full."""
+
+    def __init__(self, name: str, max_workers: int, max_queue: int) -> None:
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(
+            max_workers, thread_name_prefix=f"{name}-executor"
+        )
+        self._slots = threading.BoundedSemaphore(max_workers + max_queue)
+        self._queued = EXECUTOR_QUEUED.labels(name)
+        self._active = EXECUTOR_ACTIVE.labels(name)
+        self._wait = EXECUTOR_WAIT.labels(name)
+
+    def submit(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> "Future[T]":
+        if not self._slots.acquire(blocking=False):
+            EXECUTOR_REJECTED.labels(self.name).inc()
+            raise BackendBusyError(self.name)
+
+        submitted = time.monotonic()
+        self._queued.inc()
+
+        def run() -> T:
+            self._queued.dec()
+            self._wait.observe(time.monotonic() - submitted)
+            self._active.inc()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self._active.dec()
+
+        try:
+            future = self._executor.submit(run)
+        except BaseException:
+            # the executor is shutting down
+            self._queued.dec()
+            self._slots.release()
+            raise
+        # release the slot once the call is done, or once it's been cancelled
+        # before it started (e.g. a caller's deadline passed), since then run()
+        # never will
+        future.add_done_callback(self._release)
+        return future
+
+    def _release(self, future: "Future[Any]") -> None:
+        if future.cancelled():
+            self._queued.dec()
+        self._slots.release()
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False)
+
+
+@lru_cache()
+def _executors() -> Dict[str, BackendExecutor]:
+    settings = get_settings()
+    return {
+        name: BackendExecutor(name, max_workers, settings.executor_max_queue)
+        for name, max_workers in (
+            (MYSQL, settings.executor_mysql_workers),
+            (LDAP, settings.executor_ldap_workers),
+            (HTTP, settings.executor_http_workers),
+            (CELERY, settings.executor_celery_workers),
+        )
+    }
+
+
+def get_executor(backend: str) -> BackendExecutor:
+    return _executors()[backend]
+
+
+async def run_in_backend(
+    backend: str, fn: Callable[..., T], *args: Any, **kwargs: Any
+) -> T:
+    """Run a blocking call in `backend`'s thread pool and await its result."""
+    future = get_executor(backend).submit(partial(fn, *args, **kwargs))
+    return await asyncio.wrap_future(future)
+
+
+async def gather_with_deadline(
+    *aws: Awaitable[Any], timeout: float
+) -> List[Union[Any, BaseException]]:
+    """Await `aws` concurrently, returning their results in order.
+
+    This is for independent calls, like a route's directory lookups, which
+    then take as long as the slowest of them rather than all of them added
+    up. A call that raised gives its exception in place of a result, so
+    callers can check results in the same order (and raise the same error)
+    as they would have done had the calls been made one after another; see
+    result_or_raise. If they haven't all finished within `timeout` seconds,
+    the rest are cancelled (although calls already running in a backend's
+    thread pool carry on) and DeadlineExceededError is raised.
+    """
+    results = asyncio.gather(*aws, return_exceptions=True)
+    try:
+        return await asyncio.wait_for(results, timeout)
+    except asyncio.TimeoutError:
+        raise DeadlineExceededError()
+    except asyncio.CancelledError:
+        # wait_for cancels the gather without retrieving the CancelledError it
+        # ends up holding, which asyncio would then log as never retrieved
+        if results.done() and not results.cancelled():
+            results.exception()
+        raise
+
+
+def result_or_raise(result: Union[T, BaseException]) -> T:
+    """Return a result from gather_with_deadline, or raise its exception."""
+    if isinstance(result, BaseException):
+        raise result
+    return result
+
+
+def shutdown_executors() -> None:
+    if _executors.cache_info().currsize:
+        for executor in _executors().values():
+            executor.shutdown()
+        _executors.cache_clear()
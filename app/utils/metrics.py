@@ -0,0 +1,167 @@
+"""Prometheus metrics for the API.
+
+When running under gunicorn with several workers, set the
+`PROMETHEUS_MULTIPROC_DIR` environment variable to an empty directory so that
+every worker's metrics are aggregated when /metrics is scraped (see
+gunicorn_conf.py). Without it, each worker only reports its own metrics.
+"""
+import os
+import time
+from typing import Any, Hashable
+
+from prometheus_client import (
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
+from prometheus_client.multiprocess import MultiProcessCollector
+from starlette.routing import Match
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+REQUEST_LATENCY = Histogram(
+    "ocfapi_request_duration_seconds",
+    "Time spent handling a request, by route",
+    ["method", "route", "status"],
+)
+
+REQUESTS_IN_PROGRESS = Gauge(
+    "ocfapi_requests_in_progress",
+    "Number of requests currently being handled, by route",
+    ["method", "route"],
+    multiprocess_mode="livesum",
+)
+
+CACHE_LOOKUPS = Counter(
+    "ocfapi_cache_lookups_total",
+    "Cache lookups by function and result (local_hit, hit, miss or error)",
+    ["function", "result"],
+)
+
+TOKEN_CACHE_LOOKUPS = Counter(
+    "ocfapi_token_cache_lookups_total",
+    "Bearer token verifications by whether they were cached (hit or miss)",
+    ["result"],
+)
+
+REDIS_CIRCUIT_OPEN = Gauge(
+    "ocfapi_redis_circuit_open",
+    "Whether the Redis circuit breaker is open (1) or not (0), by worker",
+    multiprocess_mode="liveall",
+)
+
+REDIS_SHORT_CIRCUITS = Counter(
+    "ocfapi_redis_short_circuits_total",
+    "Redis calls skipped because the circuit breaker was open",
+)
+
+EXECUTOR_QUEUED = Gauge(
+    "ocfapi_executor_queued",
+    "Blocking calls waiting for a thread, by backend",
+    ["backend"],
+    multiprocess_mode="livesum",
+)
+
+EXECUTOR_ACTIVE = Gauge(
+    "ocfapi_executor_active",
+    "Blocking calls currently running, by backend",
+    ["backend"],
+    multiprocess_mode="livesum",
+)
+
+EXECUTOR_WAIT = Histogram(
+    "ocfapi_executor_wait_seconds",
+    "Time blocking calls spent waiting for a thread, by backend",
+    ["backend"],
+)
+
+EXECUTOR_REJECTED = Counter(
+    "ocfapi_executor_rejected_total",
+    "Blocking calls rejected because the backend's queue was full",
+    ["backend"],
+)
+
+PERIODIC_DURATION = Histogram(
+    "ocfapi_periodic_function_duration_seconds",
+    "Time spent executing a periodic function",
+    ["function"],
+)
+
+
+def cache_function_label(key: Hashable) -> str:
+    """Return the function name to report metrics for a cache key under.
+
+    Function call keys look like "namespace:version:module#name:digest"; we
+    only use the name, since the arguments would make the label unbounded.
+    """
+    if isinstance(key, str):
+        parts = key.split(":")
+        if len(parts) >= 4:
+            return parts[-2]
+    return "other"
+
+
+def count_cache_lookup(key: Hashable, result: str) -> None:
+    CACHE_LOOKUPS.labels(cache_function_label(key), result).inc()
+
+
+def get_registry() -> Any:
+    """Return the registry to expose, aggregating workers if configured."""
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        MultiProcessCollector(registry)
+        return registry
+    return REGISTRY
+
+
+def generate_metrics() -> bytes:
+    return generate_latest(get_registry())
+
+
+def _route_label(scope: Scope) -> str:
+    """Return the path template (e.g. /lab/hours/{date}) a request matches.
+
+    Using the template rather than the actual path keeps the number of label
+    values bounded.
+    """
+    app = scope.get("app")
+    for route in getattr(app, "routes", []):
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route.path
+    return "unmatched"
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording per-route latency and in-flight requests."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        route = _route_label(scope)
+        status_code = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        in_progress = REQUESTS_IN_PROGRESS.labels(method, route)
+        in_progress.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            REQUEST_LATENCY.labels(method, route, status_code).observe(
+                time.perf_counter() - start
+            )
+            in_progress.dec()
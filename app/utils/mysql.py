@@ -0,0 +1,210 @@
+"""Pooled connections to the OCF's MySQL databases.
+
+Opening a connection costs a TCP and authentication handshake with
+mysql.ocf.berkeley.edu, which is usually slower than the query itself, so
+connections are kept around and reused instead of being opened per
+statement:
+
+    from utils.mysql import OCFSTATS, get_pool
+
+    with get_pool(OCFSTATS).cursor() as c:
+        c.execute("SELECT ...")
+
+Each worker process keeps up to `mysql_pool_size` connections per database.
+A connection that has been idle for more than `mysql_pool_ping_interval`
+seconds is pinged before it's handed out, connections are replaced once
+they're `mysql_pool_recycle` seconds old (before MySQL's wait_timeout can
+close them under us), and a connection that raised a connection error is
+thrown away rather than returned to the pool.
+
+PyMySQL is only imported once the first pool is created, since plenty of
+workers never talk to MySQL directly.
+"""
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from functools import lru_cache, partial
+from typing import TYPE_CHECKING, Any, Callable, Deque, Dict, Generator
+
+from utils.config import get_settings
+
+if TYPE_CHECKING:
+    from pymysql.connections import Connection
+
+OCFSTATS = "ocfstats"
+OCFPRINTING = "ocfprinting"
+OCFMAIL = "ocfmail"
+
+# databases that are used with explicit transactions rather than autocommit
+_TRANSACTIONAL = {OCFMAIL}
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection becomes available in time."""
+
+
+class _PooledConnection:
+    __slots__ = ("connection", "created", "last_used")
+
+    def __init__(self, connection: "Connection") -> None:
+        self.connection = connection
+        self.created = self.last_used = time.monotonic()
+
+
+class ConnectionPool:
+    """A thread-safe pool of at most `max_size` connections."""
+
+    def __init__(
+        self,
+        connect: Callable[[], "Connection"],
+        max_size: int,
+        recycle: float,
+        ping_interval: float,
+        timeout: float,
+    ) -> None:
+        self._connect = connect
+        self.max_size = max_size
+        self.recycle = recycle
+        self.ping_interval = ping_interval
+        self.timeout = timeout
+        self._idle: Deque[_PooledConnection] = deque()
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_size)
+
+    @contextmanager
+    def connection(self) -> Generator["Connection", None, None]:
+        """Check out a connection, returning it to the pool afterwards."""
+        if not self._slots.acquire(timeout=self.timeout):
+            raise PoolTimeout(f"No MySQL connection available after {self.timeout}s")
+
+        try:
+            pooled = self._checkout()
+            try:
+                yield pooled.connection
+            except Exception as e:
+                if _is_connection_error(e) or not _rollback(pooled.connection):
+                    _close(pooled.connection)
+                else:
+                    self._checkin(pooled)
+                raise
+            except BaseException:
+                # e.g. cancelled or abandoned part way through a query, so we
+                # can't tell what state the connection is in
+                _close(pooled.connection)
+                raise
+            else:
+                self._checkin(pooled)
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def cursor(self) -> Generator[Any, None, None]:
+        with self.connection() as connection:
+            with connection.cursor() as c:
+                yield c
+
+    @contextmanager
+    def transaction(self) -> Generator[Any, None, None]:
+        """Yield a cursor, committing if the block succeeds."""
+        with self.connection() as connection:
+            with connection.cursor() as c:
+                yield c
+            connection.commit()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"idle": len(self._idle), "max_size": self.max_size}
+
+    def close(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, deque()
+        for pooled in idle:
+            _close(pooled.connection)
+
+    def _checkout(self) -> _PooledConnection:
+        while True:
+            with self._lock:
+                if not self._idle:
+                    break
+                # reuse the most recently used connection, so that any excess
+                # connections sit idle and eventually get recycled
+                pooled = self._idle.pop()
+
+            now = time.monotonic()
+            if now - pooled.created > self.recycle:
+                _close(pooled.connection)
+                continue
+            if now - pooled.last_used > self.ping_interval:
+                import pymysql
+
+                try:
+                    pooled.connection.ping(reconnect=False)
+                except pymysql.Error:
+                    _close(pooled.connection)
+                    continue
+            return pooled
+
+        return _PooledConnection(self._connect())
+
+    def _checkin(self, pooled: _PooledConnection) -> None:
+        pooled.last_used = time.monotonic()
+        with self._lock:
+            self._idle.append(pooled)
+
+
+def _is_connection_error(e: Exception) -> bool:
+    import pymysql
+
+    return isinstance(e, (pymysql.OperationalError, pymysql.InterfaceError))
+
+
+def _rollback(connection: "Connection") -> bool:
+    """Roll back any open transaction, returning whether the connection's ok."""
+    if connection.get_autocommit():
+        return True
+
+    import pymysql
+
+    try:
+        connection.rollback()
+    except pymysql.Error:
+        return False
+    return True
+
+
+def _close(connection: "Connection") -> None:
+    import pymysql
+
+    try:
+        connection.close()
+    except pymysql.Error:
+        pass
+
+
+@lru_cache()
+def get_pool(database: str) -> ConnectionPool:
+    from ocflib.infra import mysql
+
+    settings = get_settings()
+    connect = partial(
+        mysql.get_connection,
+        user=getattr(settings, f"{database}_user"),
+        password=getattr(settings, f"{database}_password"),
+        db=getattr(settings, f"{database}_db"),
+        autocommit=database not in _TRANSACTIONAL,
+    )
+    return ConnectionPool(
+        connect,
+        max_size=settings.mysql_pool_size,
+        recycle=settings.mysql_pool_recycle,
+        ping_interval=settings.mysql_pool_ping_interval,
+        timeout=settings.mysql_pool_timeout,
+    )
+
+
+def close_pools() -> None:
+    if get_pool.cache_info().currsize:
+        for database in (OCFSTATS, OCFPRINTING, OCFMAIL):
+            get_pool(database).close()
+        get_pool.cache_clear()
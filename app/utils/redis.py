@@ -1,16 +1,253 @@
+import asyncio
+import queue
+import threading
+import time
 from functools import lru_cache
+from typing import Any, Dict, Optional
 
 import redis
+import redis.asyncio
 
 from utils.config import get_settings
+from utils.metrics import REDIS_CIRCUIT_OPEN, REDIS_SHORT_CIRCUITS
+
+
+class CircuitOpenError(redis.ConnectionError):
+    """Raised instead of talking to Redis while the circuit breaker is open."""
+
+
+class PoolExhaustedError(redis.ConnectionError):
+    """Raised when no pooled connection to Redis became free in time.
+
+    This means the worker is busy rather than that Redis is unhealthy, so it
+    doesn't count against the circuit breaker.
+    """
+
+
+class CircuitBreaker:
+    """Stop talking to Redis for a while after it fails repeatedly.
+
+    After `failure_threshold` consecutive connection errors or timeouts, the
+    breaker opens and every call fails immediately with CircuitOpenError for
+    `cooldown` seconds, so callers go straight to their fallback instead of
+    each waiting on a timeout. After the cooldown, a single trial call is let
+    through (the breaker is "half open"); if it succeeds the breaker closes,
+    otherwise it opens for another cooldown.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int, cooldown: float) -> None:
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_progress = False
+        self.short_circuits = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state()
+
+    def _state(self) -> str:
+        if self._failures < self.failure_threshold:
+            return self.CLOSED
+        if time.monotonic() - self._opened_at < self.cooldown:
+            return self.OPEN
+        return self.HALF_OPEN
+
+    def allow(self) -> bool:
+        """Return whether a call to Redis should be attempted right now."""
+        return self.admit() is not None
+
+    def admit(self) -> Optional[bool]:
+        """Admit a call to Redis, if it should be attempted right now.
+
+        Returns None if it shouldn't, otherwise whether it is the half-open
+        trial call.
+        """
+        with self._lock:
+            state = self._state()
+            if state == self.CLOSED:
+                return False
+            if state == self.HALF_OPEN and not self._trial_in_progress:
+                self._trial_in_progress = True
+                return True
+
+            self.short_circuits += 1
+            REDIS_SHORT_CIRCUITS.inc()
+            return None
+
+    def end_trial(self) -> None:
+        """Let another trial call through, whatever became of this one."""
+        with self._lock:
+            self._trial_in_progress = False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._trial_in_progress = False
+        REDIS_CIRCUIT_OPEN.set(0)
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            self._trial_in_progress = False
+            if self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+                REDIS_CIRCUIT_OPEN.set(1)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "state": self._state(),
+                "consecutive_failures": self._failures,
+                "short_circuits": self.short_circuits,
+            }
 
 
 @lru_cache()
-def get_redis_connection():
+def get_circuit_breaker() -> CircuitBreaker:
+    settings = get_settings()
+
+    return CircuitBreaker(
+        failure_threshold=settings.redis_breaker_failure_threshold,
+        cooldown=settings.redis_breaker_cooldown,
+    )
+
+
+# errors which mean Redis itself is unhealthy, as opposed to e.g. a bad command
+_UNHEALTHY_ERRORS = (redis.ConnectionError, redis.TimeoutError)
+
+
+class _BreakerRedis(redis.Redis):
+    """A Redis client which consults the circuit breaker on every command.
+
+    Any reply from Redis, even an error (e.g. NOSCRIPT after a restart),
+    means it is healthy. Commands which end any other way (e.g. because they
+    were cancelled, or no pooled connection was free) count as neither, but
+    if they were the half-open trial they still end it, so the breaker can't
+    get stuck open.
+    """
+
+    def execute_command(self, *args: Any, **options: Any) -> Any:
+        breaker = get_circuit_breaker()
+        trial = breaker.admit()
+        if trial is None:
+            raise CircuitOpenError("Redis circuit breaker is open")
+
+        try:
+            result = super().execute_command(*args, **options)
+        except PoolExhaustedError:
+            if trial:
+                breaker.end_trial()
+            raise
+        except _UNHEALTHY_ERRORS:
+            breaker.record_failure()
+            raise
+        except redis.ResponseError:
+            breaker.record_success()
+            raise
+        except BaseException:
+            if trial:
+                breaker.end_trial()
+            raise
+        else:
+            breaker.record_success()
+            return result
+
+
+class _AsyncBreakerRedis(redis.asyncio.Redis):
+    """An asyncio Redis client which consults the circuit breaker."""
+
+    async def execute_command(self, *args: Any, **options: Any) -> Any:
+        breaker = get_circuit_breaker()
+        trial = breaker.admit()
+        if trial is None:
+            raise CircuitOpenError("Redis circuit breaker is open")
+
+        try:
+            result = await super().execute_command(*args, **options)
+        except PoolExhaustedError:
+            if trial:
+                breaker.end_trial()
+            raise
+        except _UNHEALTHY_ERRORS:
+            breaker.record_failure()
+            raise
+        except redis.ResponseError:
+            breaker.record_success()
+            raise
+        except BaseException:
+            if trial:
+                breaker.end_trial()
+            raise
+        else:
+            breaker.record_success()
+            return result
+
+
+class _BlockingConnectionPool(redis.BlockingConnectionPool):
+    """A connection pool which raises PoolExhaustedError when empty."""
+
+    def get_connection(self, command_name: str, *keys: Any, **options: Any) -> Any:
+        try:
+            return super().get_connection(command_name, *keys, **options)
+        except redis.ConnectionError as e:
+            # redis-py raises a plain ConnectionError while handling Empty
+            if isinstance(e.__context__, queue.Empty):
+                raise PoolExhaustedError(*e.args) from e
+            raise
+
+
+class _AsyncBlockingConnectionPool(redis.asyncio.BlockingConnectionPool):
+    """An asyncio connection pool which raises PoolExhaustedError when empty."""
+
+    async def get_connection(
+        self, command_name: str, *keys: Any, **options: Any
+    ) -> Any:
+        try:
+            return await super().get_connection(command_name, *keys, **options)
+        except redis.ConnectionError as e:
+            if isinstance(e.__context__, (asyncio.QueueEmpty, asyncio.TimeoutError)):
+                raise PoolExhaustedError(*e.args) from e
+            raise
+
+
+def _connection_kwargs() -> Dict[str, Any]:
     settings = get_settings()
 
-    return redis.Redis(
-        host=settings.redis_host,
-        port=settings.redis_port,
-        password=settings.redis_password,
+    return {
+        "host": settings.redis_host,
+        "port": settings.redis_port,
+        "password": settings.redis_password,
+        "socket_connect_timeout": settings.redis_connect_timeout,
+        "socket_timeout": settings.redis_socket_timeout,
+        "health_check_interval": settings.redis_health_check_interval,
+        "max_connections": settings.redis_max_connections,
+        # how long to wait for a free connection when the pool is exhausted
+        "timeout": settings.redis_pool_timeout,
+    }
+
+
+@lru_cache()
+def get_redis_connection():
+    return _BreakerRedis(
+        connection_pool=_BlockingConnectionPool(**_connection_kwargs()),
+    )
+
+
+@lru_cache()
+def get_async_redis_connection():
+    """Return an asyncio Redis client, for use from `async def` routes.
+
+    The client keeps a pool of connections, so it is shared by every task
+    in the worker's event loop.
+    """
+    return _AsyncBreakerRedis(
+        connection_pool=_AsyncBlockingConnectionPool(**_connection_kwargs()),
     )
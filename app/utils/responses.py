@@ -0,0 +1,181 @@
+"""Responses whose JSON body is rendered ahead of time.
+
+Public read endpoints serve the same data to everyone until it's next
+refreshed, so rather than having FastAPI validate and encode it on every
+request, their periodic functions return the encoded body and the route
+just sends those bytes:
+
+    @async_periodic(60, stale_while_revalidate=True)
+    def _get_things_body() -> bytes:
+        return render_json({"things": get_things()}, ThingsOutput)
+
+    @router.get("/things", response_model=ThingsOutput)
+    async def get_things():
+        return PrerenderedJSONResponse(await _get_things_body())
+
+The route's response_model is still used to document it, but isn't applied
+to the response, so render_json is where the output is validated.
+
+Routes which build their output per request can still skip re-validating
+it by returning a TrustedJSONResponse.
+
+Prerendered responses carry a strong ETag derived from their body, and
+optionally a Cache-Control max-age (normally the period of the periodic
+function behind them). ConditionalGetMiddleware then answers requests whose
+If-None-Match matches the ETag with an empty 304, so clients polling these
+endpoints only download anything when it has actually changed.
+"""
+from hashlib import blake2b
+from typing import Any, List, Optional, Tuple, Type
+
+import orjson
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response
+from pydantic import BaseModel
+
+# for things which will never change (browsers cap max-age at a year)
+_IMMUTABLE_CACHE_CONTROL = f"public, max-age={365 * 24 * 60 * 60}, immutable"
+
+# headers which a 304 response should repeat from the 200 it stands in for,
+# including the CORS ones, without which browsers won't let scripts see it
+_NOT_MODIFIED_HEADERS = {b"cache-control", b"etag", b"expires", b"vary"}
+_NOT_MODIFIED_HEADER_PREFIXES = (b"access-control-",)
+
+
+def dumps(content: Any) -> bytes:
+    """Encode `content` as JSON with orjson.
+
+    Anything orjson doesn't support natively (e.g. pydantic models, sets or
+    namedtuples) is converted by FastAPI's jsonable_encoder first.
+    """
+    return orjson.dumps(
+        content, default=jsonable_encoder, option=orjson.OPT_NON_STR_KEYS
+    )
+
+
+def render_json(content: Any, model: Optional[Type[BaseModel]] = None) -> bytes:
+    """Return the JSON body FastAPI would send for `content`.
+
+    If given, `content` is validated against `model` first, just like it
+    would be if `model` were a route's response_model. Leave it out for
+    content we've built ourselves and so already trust to match the model.
+    """
+    if model is not None:
+        content = model.parse_obj(content)
+    return dumps(content)
+
+
+class TrustedJSONResponse(JSONResponse):
+    """A JSON response for content built by the route itself.
+
+    FastAPI validates whatever a route returns against its response_model
+    (and then runs it through jsonable_encoder), which for big lists of
+    nested models costs far more than encoding it. Returning this instead
+    skips both, and encodes the content directly with orjson; the route's
+    response_model is still used to document it.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def make_etag(body: bytes) -> str:
+    return '"{}"'.format(blake2b(body, digest_size=16).hexdigest())
+
+
+class PrerenderedJSONResponse(Response):
+    """A response for a body returned by render_json.
+
+    With `max_age`, clients and proxies may reuse the response for that many
+    seconds; with `immutable`, they may reuse it forever.
+    """
+
+    media_type = "application/json"
+
+    def __init__(
+        self,
+        content: bytes,
+        max_age: Optional[float] = None,
+        immutable: bool = False,
+        **kwargs: Any,
+    ) -> None:
+        super().__init__(content, **kwargs)
+        self.headers["ETag"] = make_etag(content)
+        if immutable:
+            self.headers["Cache-Control"] = _IMMUTABLE_CACHE_CONTROL
+        elif max_age is not None:
+            self.headers["Cache-Control"] = f"public, max-age={int(max_age)}"
+
+
+def _etag_matches(etag: str, if_none_match: str) -> bool:
+    """Whether an If-None-Match header matches an ETag (weakly, per RFC 7232)."""
+    if if_none_match.strip() == "*":
+        return True
+    etag = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+class ConditionalGetMiddleware:
+    """ASGI middleware answering conditional GETs with 304 Not Modified.
+
+    Only responses which already have an ETag (e.g. PrerenderedJSONResponse)
+    are affected; the route still runs, but its body isn't sent.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] not in ("GET", "HEAD"):
+            await self.app(scope, receive, send)
+            return
+
+        if_none_match = Headers(scope=scope).get("if-none-match")
+        if if_none_match is None:
+            await self.app(scope, receive, send)
+            return
+
+        not_modified = False
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal not_modified
+            if message["type"] == "http.response.start":
+                etag = Headers(raw=message["headers"]).get("etag")
+                if (
+                    message["status"] == 200
+                    and etag is not None
+                    and _etag_matches(etag, if_none_match)
+                ):
+                    not_modified = True
+                    message = {
+                        "type": "http.response.start",
+                        "status": 304,
+                        "headers": _not_modified_headers(message["headers"]),
+                    }
+            elif message["type"] == "http.response.body" and not_modified:
+                if message.get("more_body", False):
+                    return
+                message = {"type": "http.response.body", "body": b""}
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+
+def _not_modified_headers(
+    headers: List[Tuple[bytes, bytes]]
+) -> List[Tuple[bytes, bytes]]:
+    return [
+        (k, v)
+        for k, v in headers
+        if k.lower() in _NOT_MODIFIED_HEADERS
+        or k.lower().startswith(_NOT_MODIFIED_HEADER_PREFIXES)
+    ]
@@ -0,0 +1,95 @@
+"""Background refresher for @periodic functions and write-behind buffers.
+
+Every worker runs one asyncio task per registered periodic function, which
+refreshes it whenever its period elapses (in a thread, unless it's an
+@async_periodic function). The Redis lock taken
+in `PeriodicFunction.refresh_if_due` keeps workers from duplicating work, so
+requests almost always find a warm cache instead of running the function
+synchronously.
+
+Write-behind buffers are flushed every `interval` seconds in their backend's
+executor, and once more when the app shuts down.
+"""
+import asyncio
+import logging
+from typing import List
+
+from utils.cache import AsyncPeriodicFunction, PeriodicFunction, periodic_functions
+from utils.config import get_settings
+from utils.executors import run_in_backend
+from utils.write_behind import WriteBehindBuffer, write_behind_buffers
+
+_logger = logging.getLogger(__name__)
+
+# don't spin if a function keeps asking to be refreshed immediately
+_MIN_SLEEP = 1.0
+
+_tasks: List["asyncio.Task[None]"] = []
+_flush_tasks: List["asyncio.Task[None]"] = []
+
+
+async def _refresh_forever(pf: PeriodicFunction) -> None:
+    loop = asyncio.get_running_loop()
+    max_sleep = get_settings().periodic_max_sleep
+
+    while True:
+        try:
+            if isinstance(pf, AsyncPeriodicFunction):
+                delay = await pf.refresh_if_due()
+            else:
+                delay = await loop.run_in_executor(None, pf.refresh_if_due)
+        except Exception:
+            _logger.exception(f"Failed to refresh {pf}")
+            delay = pf.period
+
+        await asyncio.sleep(min(max(delay, _MIN_SLEEP), max_sleep))
+
+
+def start_periodic_refresher() -> None:
+    """Start refreshing every registered periodic function in the background."""
+    if _tasks:
+        return
+
+    for pf in periodic_functions:
+        _tasks.append(asyncio.ensure_future(_refresh_forever(pf)))
+    _logger.info(f"Started background refresh of {len(_tasks)} periodic functions")
+
+
+async def stop_periodic_refresher() -> None:
+    """Cancel the background refresh tasks and wait for them to finish."""
+    for task in _tasks:
+        task.cancel()
+    await asyncio.gather(*_tasks, return_exceptions=True)
+    _tasks.clear()
+
+
+async def _flush(buffer: WriteBehindBuffer) -> None:
+    try:
+        await run_in_backend(buffer.backend, buffer.flush)
+    except Exception:
+        _logger.exception(f"Failed to flush {buffer}")
+
+
+async def _flush_forever(buffer: WriteBehindBuffer) -> None:
+    while True:
+        await asyncio.sleep(buffer.interval)
+        await _flush(buffer)
+
+
+def start_write_behind_flusher() -> None:
+    """Start flushing every registered write-behind buffer in the background."""
+    if _flush_tasks:
+        return
+
+    for buffer in write_behind_buffers:
+        _flush_tasks.append(asyncio.ensure_future(_flush_forever(buffer)))
+
+
+async def stop_write_behind_flusher() -> None:
+    """Stop the flush tasks, then flush whatever is still buffered."""
+    for task in _flush_tasks:
+        task.cancel()
+    await asyncio.gather(*_flush_tasks, return_exceptions=True)
+    _flush_tasks.clear()
+
+    await asyncio.gather(*(_flush(buffer) for buffer in write_behind_buffers))
@@ -2,16 +2,18 @@ import logging
 
 from typing_extensions import Literal
 
-from ocflib.account.search import user_is_group
-
 from fastapi import Depends, HTTPException, status
 
-from utils.auth import UserToken, decode_token, oauth2_scheme
+from utils.auth import UserToken, get_cached_token, oauth2_scheme, verify_token
+from utils.executors import HTTP, LDAP, run_in_backend
 
 
 async def get_current_user(token: str = Depends(oauth2_scheme)) -> UserToken:
     try:
-        return decode_token(token)
+        # verifying a token is slow, and may mean fetching keycloak's keys
+        return get_cached_token(token) or await run_in_backend(
+            HTTP, verify_token, token
+        )
     except HTTPException:
         raise
     except Exception as e:
@@ -43,10 +45,16 @@ def depends_get_current_user_with_group(
 async def get_current_group_user(
     user_token: UserToken = Depends(get_current_user),
 ) -> UserToken:
-    if not user_is_group(user_token.username):
+    if not await run_in_backend(LDAP, is_group_account, user_token.username):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Account is not a group",
         )
 
     return user_token
+
+
+def is_group_account(username: str) -> bool:
+    from ocflib.account.search import user_is_group
+
+    return user_is_group(username)
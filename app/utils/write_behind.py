@@ -0,0 +1,84 @@
+"""Buffers that collapse repeated writes and apply them in batches.
+
+Some endpoints are hit constantly with writes that only matter in
+aggregate, like desktops reporting that a session is still active. Rather
+than writing each one through, they can be put in a WriteBehindBuffer keyed
+by what they update; later writes to the same key replace earlier ones, and
+the buffer is periodically drained and handed to its `flush` function as a
+single batch. Call `register()` on a buffer to have utils/scheduler.py
+flush it in the background, and once more on shutdown.
+
+Buffers are per-worker and in memory, so anything written to one must be
+safe to lose or apply late.
+"""
+import threading
+from typing import Callable, Dict, Generic, Hashable, List, TypeVar
+
+from utils.executors import MYSQL
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class WriteBehindBuffer(Generic[K, V]):
+    def __init__(
+        self,
+        name: str,
+        flush: Callable[[Dict[K, V]], None],
+        interval: float,
+        backend: str = MYSQL,
+    ) -> None:
+        self.name = name
+        self.interval = interval
+        self.backend = backend
+        self._flush = flush
+        self._pending: Dict[K, V] = {}
+        self._lock = threading.Lock()
+
+    def register(self) -> "WriteBehindBuffer[K, V]":
+        """Have this buffer flushed in the background, returning it."""
+        write_behind_buffers.append(self)
+        return self
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def put(self, key: K, value: V) -> None:
+        with self._lock:
+            self._pending[key] = value
+
+    def get(self, key: K) -> V:
+        with self._lock:
+            return self._pending[key]
+
+    def discard(self, key: K) -> None:
+        """Drop a pending write, e.g. because it has been superseded."""
+        with self._lock:
+            self._pending.pop(key, None)
+
+    def flush(self) -> int:
+        """Apply all pending writes, returning how many there were.
+
+        If applying them fails, they're put back in the buffer (unless newer
+        writes for the same keys have arrived since) to be retried next time.
+        """
+        with self._lock:
+            batch, self._pending = self._pending, {}
+        if not batch:
+            return 0
+
+        try:
+            self._flush(batch)
+        except Exception:
+            with self._lock:
+                batch.update(self._pending)
+                self._pending = batch
+            raise
+        return len(batch)
+
+    def __repr__(self) -> str:
+        return f"WriteBehindBuffer({self.name!r})"
+
+
+write_behind_buffers: List[WriteBehindBuffer] = []